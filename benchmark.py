@@ -0,0 +1,396 @@
+"""Benchmark the cpu_monitor collectors against synthetic /proc and /sys trees.
+
+Generates a fake root with the requested number of CPUs, hwmon chips and
+thermal zones, points cpu_monitor at it with set_root() and reports
+per-collector latency and peak allocation for each scale:
+
+    python3 benchmark.py                          # default scales
+    python3 benchmark.py --scale 512,40,200       # CPUs,hwmon chips,thermal zones
+    python3 benchmark.py --json results.json
+    python3 benchmark.py --compare results.json   # show change against an earlier run
+"""
+import argparse
+import io
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cpu_monitor
+
+# (CPUs, hwmon chips, thermal zones)
+DEFAULT_SCALES = ((16, 4, 2), (128, 12, 40), (512, 40, 200))
+
+CPUINFO_FLAGS = ' '.join(f'flag{i}' for i in range(180))
+
+# Attributes per synthetic hwmon chip, modelled on an nct67xx Super I/O
+HWMON_TEMPS = 8
+HWMON_FANS = 7
+HWMON_VOLTAGES = 18
+
+# Synthetic cgroup v2 tree size, roughly a container host
+CGROUPS_PER_CPU = 8
+
+def _write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(text)
+
+def render_interrupt_rows(rows):
+    """/proc/interrupts body lines for (label, per-CPU counts, description) rows, in the kernel's layout"""
+    return ''.join(f"{label:>4}: " + ''.join(f"{count:10d} " for count in counts) + f" {description}\n"
+                   for label, counts, description in rows)
+
+def generate_tree(root, cpus, hwmon_chips, thermal_zones, seed=0):
+    """Write a synthetic /proc and /sys tree under root"""
+    rng = random.Random(seed)
+
+    cpuinfo = []
+    for cpu in range(cpus):
+        cpuinfo.append(
+            f"processor\t: {cpu}\nvendor_id\t: AuthenticAMD\ncpu family\t: 26\nmodel\t\t: 68\n"
+            f"model name\t: Synthetic 512-Core Processor\nstepping\t: 0\n"
+            f"cpu MHz\t\t: {rng.uniform(600, 5700):.3f}\ncache size\t: 1024 KB\n"
+            f"physical id\t: {cpu // 128}\nsiblings\t: 128\ncore id\t\t: {cpu % 64}\ncpu cores\t: 64\n"
+            f"flags\t\t: {CPUINFO_FLAGS}\nbogomips\t: 8584.00\n\n")
+    _write(os.path.join(root, 'proc/cpuinfo'), ''.join(cpuinfo))
+
+    stat = [f"cpu  {' '.join(str(rng.randrange(10**9)) for _ in range(10))}\n"]
+    for cpu in range(cpus):
+        stat.append(f"cpu{cpu} {' '.join(str(rng.randrange(10**7)) for _ in range(8))} 0 0\n")
+    stat.append(f"intr {' '.join('0' for _ in range(512))}\nctxt 123456789\nbtime 1700000000\n"
+                "processes 123456\nprocs_running 3\nprocs_blocked 0\n")
+    _write(os.path.join(root, 'proc/stat'), ''.join(stat))
+
+    # /proc/interrupts: a few legacy lines, one MSI-X vector per CPU per queue pair, then the arch rows
+    header = ' ' * 11 + ''.join(f"{'CPU' + str(cpu):<11}" for cpu in range(cpus)) + "\n"
+    rows = [(str(irq), [rng.randrange(10**6) for _ in range(cpus)],
+             f"IR-PCI-MSIX-0000:41:00.0 {irq}-edge      eth0-TxRx-{irq}") for irq in range(24 + 2 * cpus)]
+    for label, text in (('NMI', 'Non-maskable interrupts'), ('LOC', 'Local timer interrupts'),
+                        ('RES', 'Rescheduling interrupts'), ('CAL', 'Function call interrupts')):
+        rows.append((label, [rng.randrange(10**8) for _ in range(cpus)], text))
+    _write(os.path.join(root, 'proc/interrupts'),
+           header + render_interrupt_rows(rows) + " ERR:          0\n MIS:          0\n")
+    softirqs = [' ' * 20 + ''.join(f"{'CPU' + str(cpu):<11}" for cpu in range(cpus)) + "\n"]
+    for name in ('HI', 'TIMER', 'NET_TX', 'NET_RX', 'BLOCK', 'IRQ_POLL', 'TASKLET', 'SCHED', 'HRTIMER', 'RCU'):
+        softirqs.append(f"{name + ':':>12}" + ''.join(f" {rng.randrange(10**8):10d}" for _ in range(cpus)) + "\n")
+    _write(os.path.join(root, 'proc/softirqs'), ''.join(softirqs))
+
+    cpu_path = os.path.join(root, 'sys/devices/system/cpu')
+    for cpu in range(cpus):
+        _write(os.path.join(cpu_path, f'cpu{cpu}/cpufreq/scaling_cur_freq'), f"{rng.randrange(600000, 5700000)}\n")
+    _write(os.path.join(cpu_path, 'cpu0/cpufreq/cpuinfo_max_freq'), "5700000\n")
+
+    # Two SMT threads per core, 8-core clusters, 64-core packages, one NUMA node per package
+    cores = max(1, cpus // 2)
+    for cpu in range(cpus):
+        core = cpu % cores
+        topology = os.path.join(cpu_path, f'cpu{cpu}/topology')
+        _write(os.path.join(topology, 'physical_package_id'), f"{core // 64}\n")
+        _write(os.path.join(topology, 'die_id'), "0\n")
+        _write(os.path.join(topology, 'cluster_id'), f"{core // 8}\n")
+        _write(os.path.join(topology, 'core_id'), f"{core % 64}\n")
+    for package in range((cores + 63) // 64):
+        node_cpus = [cpu for cpu in range(cpus) if (cpu % cores) // 64 == package]
+        _write(os.path.join(root, f'sys/devices/system/node/node{package}/cpulist'),
+               ','.join(map(str, node_cpus)) + "\n")
+
+    hwmon_path = os.path.join(root, 'sys/class/hwmon')
+    os.makedirs(hwmon_path, exist_ok=True)
+    for chip in range(hwmon_chips):
+        chip_dir = os.path.join(hwmon_path, f'hwmon{chip}')
+        _write(os.path.join(chip_dir, 'name'), f"nct{6700 + chip}\n")
+        for i in range(1, HWMON_TEMPS + 1):
+            _write(os.path.join(chip_dir, f'temp{i}_input'), f"{rng.randrange(20000, 90000)}\n")
+            _write(os.path.join(chip_dir, f'temp{i}_label'), f"SYSTIN{i}\n")
+        for i in range(1, HWMON_FANS + 1):
+            _write(os.path.join(chip_dir, f'fan{i}_input'), f"{rng.randrange(0, 3000)}\n")
+            _write(os.path.join(chip_dir, f'pwm{i}'), f"{rng.randrange(0, 256)}\n")
+        for i in range(HWMON_VOLTAGES):
+            _write(os.path.join(chip_dir, f'in{i}_input'), f"{rng.randrange(500, 3500)}\n")
+        _write(os.path.join(chip_dir, 'power1_input'), f"{rng.randrange(10**6, 300 * 10**6)}\n")
+
+    # RAPL: one package zone per package with core and DRAM subzones
+    powercap_path = os.path.join(root, 'sys/class/powercap')
+    for package in range((cores + 63) // 64):
+        for zone, name in ((f'intel-rapl:{package}', f'package-{package}'),
+                           (f'intel-rapl:{package}:0', 'core'), (f'intel-rapl:{package}:1', 'dram')):
+            zone_dir = os.path.join(powercap_path, zone)
+            _write(os.path.join(zone_dir, 'name'), f"{name}\n")
+            _write(os.path.join(zone_dir, 'energy_uj'), f"{rng.randrange(10**11)}\n")
+            _write(os.path.join(zone_dir, 'max_energy_range_uj'), "262143328850\n")
+
+    thermal_path = os.path.join(root, 'sys/class/thermal')
+    os.makedirs(thermal_path, exist_ok=True)
+    for zone in range(thermal_zones):
+        zone_dir = os.path.join(thermal_path, f'thermal_zone{zone}')
+        _write(os.path.join(zone_dir, 'type'), f"zone{zone}\n")
+        _write(os.path.join(zone_dir, 'temp'), f"{rng.randrange(20000, 90000)}\n")
+
+    generate_cgroups(root, cpus, rng)
+
+def cgroup_stat_text(usage, nr_throttled=0):
+    return (f"usage_usec {usage}\nuser_usec {usage * 2 // 3}\nsystem_usec {usage // 3}\n"
+            f"nr_periods {nr_throttled * 10}\nnr_throttled {nr_throttled}\nthrottled_usec {nr_throttled * 900}\n")
+
+def generate_cgroups(root, cpus, rng):
+    """A cgroup v2 tree with about CGROUPS_PER_CPU cgroups per CPU, mostly kubepods/pod/container"""
+    cgroup_root = os.path.join(root, 'sys/fs/cgroup')
+    _write(os.path.join(cgroup_root, 'cgroup.controllers'), "cpuset cpu io memory pids\n")
+    leaves = [f"system.slice/svc{i}.service" for i in range(32)]
+    leaves += [f"kubepods.slice/pod{pod}/ctr{ctr}"
+               for pod in range(max(1, cpus * CGROUPS_PER_CPU // 4)) for ctr in range(3)]
+    usage = {'': 0}
+    for leaf in leaves:
+        value = rng.randrange(10**9)
+        parts = leaf.split('/')
+        for depth in range(len(parts) + 1):
+            path = '/'.join(parts[:depth])
+            usage[path] = usage.get(path, 0) + value
+    descendants = dict.fromkeys(usage, 0)
+    for path in usage:
+        while path:
+            path = path.rpartition('/')[0]
+            descendants[path] += 1
+    for path, value in usage.items():
+        directory = os.path.join(cgroup_root, path)
+        _write(os.path.join(directory, 'cgroup.stat'), f"nr_descendants {descendants[path]}\nnr_dying_descendants 0\n")
+        _write(os.path.join(directory, 'cpu.stat'), cgroup_stat_text(value, rng.randrange(100)))
+        _write(os.path.join(directory, 'cpu.pressure'),
+               "some avg10=1.25 avg60=0.80 avg300=0.40 total=123456\nfull avg10=0.00 avg60=0.00 avg300=0.00 total=0\n")
+
+def collectors():
+    """(name, setup) pairs; setup returns the zero-argument callable to time"""
+    def stat_breakdown():
+        prev = cpu_monitor.parse_cpu_stat_matrix()
+        return lambda: cpu_monitor.calculate_cpu_breakdown(prev, cpu_monitor.parse_cpu_stat_matrix())
+
+    def stat_legacy():
+        prev = cpu_monitor.parse_cpu_stats()
+        return lambda: cpu_monitor.calculate_cpu_usage(prev, cpu_monitor.parse_cpu_stats())
+
+    def cpufreq_backend():
+        backend = cpu_monitor.CpufreqFrequencyBackend()
+        return backend.read
+
+    def topology_groups():
+        topology = cpu_monitor.CpuTopology.read()
+        cpu_ids = sorted(topology.placements)
+        return lambda: topology.groups('cluster', cpu_ids)
+
+    def interrupts_idle():
+        scanner = cpu_monitor.InterruptScanner(interval=0)
+        scanner.enabled = True
+        scanner.scan()
+        return scanner.scan
+
+    def interrupts_changing(pinned):
+        """Alternate between two readings: every counter differs, or (pinned) one CPU per MSI vector"""
+        paths = (cpu_monitor.host_path('/proc/interrupts'), cpu_monitor.host_path('/proc/interrupts') + '.next')
+        table = cpu_monitor.CounterRows()
+        with open(paths[0], 'rb') as f:
+            header = f.readline()
+            f.seek(0)
+            table.update(f.read())
+        rows = [(label.decode(), list(table._rows[label].counts), table.description(label))
+                for label in table.labels()]
+        with open(paths[0], 'w') as f:
+            f.write(header.decode() + render_interrupt_rows(rows))
+        for i, (label, counts, _) in enumerate(rows):
+            columns = [i % len(counts)] if pinned and label.isdigit() else range(len(counts))
+            for j in columns:
+                counts[j] += 7
+        with open(paths[1], 'w') as f:
+            f.write(header.decode() + render_interrupt_rows(rows))
+        fds = [os.open(path, os.O_RDONLY) for path in paths]
+        scanner = cpu_monitor.InterruptScanner(interval=0)
+        scanner.enabled = True
+        scanner.scan()
+        flip = [0]
+        def scan():
+            flip[0] ^= 1
+            scanner._fds[0] = fds[flip[0]]
+            return scanner.scan()
+        return scan
+
+    def interrupts_split_baseline():
+        """Plain split()+map(int) of every row, what the dense path must not be slower than"""
+        paths = (cpu_monitor.host_path('/proc/interrupts'), cpu_monitor.host_path('/proc/interrupts') + '.next')
+        readings = []
+        for path in paths:
+            with open(path, 'rb') as f:
+                readings.append(f.read())
+        ncpus = len(readings[0].split(b'\n', 1)[0].split())
+        flip = [0]
+        def parse():
+            flip[0] ^= 1
+            for line in readings[flip[0]].split(b'\n')[1:]:
+                parts = line.partition(b':')[2].split(None, ncpus)[:ncpus]
+                try:
+                    list(map(int, parts))
+                except ValueError:
+                    pass
+        return parse
+
+    def stream_format(fmt):
+        collector = cpu_monitor.SampleCollector(interval=1.0)
+        collector.sample()
+        snapshot = collector.sample()
+        writer = cpu_monitor.StreamWriter(io.StringIO(), snapshot, fmt)
+        return lambda: writer.format(snapshot)
+
+    def cgroups_scan(busy_fraction):
+        """Alternate between two cpu.stat readings where `busy_fraction` of the leaf cgroups used CPU"""
+        scanner = cpu_monitor.CgroupScanner(interval=0)
+        scanner.enabled = True
+        scanner.scan()
+        nodes = {}
+        stack = [scanner._root]
+        while stack:
+            node = stack.pop()
+            nodes[node.name] = node
+            stack.extend(node.children.values())
+        leaf_names = sorted(name for name, node in nodes.items() if not node.children)
+        busy = random.Random(2).sample(leaf_names, int(len(leaf_names) * busy_fraction))
+        changed = set()
+        for leaf in busy:
+            parts = leaf.split('/')
+            changed.update('/'.join(parts[:depth]) for depth in range(len(parts) + 1))
+        flips = []
+        for name in changed:
+            node = nodes[name]
+            with open(os.path.join(node.path, 'cpu.stat')) as f:
+                current = int(f.read().split()[1])
+            next_path = os.path.join(node.path, 'cpu.stat.next')
+            _write(next_path, cgroup_stat_text(current + 5000))
+            flips.append((node, [node.fd, os.open(next_path, os.O_RDONLY)]))
+        flip = [0]
+        def scan():
+            flip[0] ^= 1
+            for node, fds in flips:
+                node.fd = fds[flip[0]]
+            return scanner.scan()
+        return scan
+
+    def cgroups_full_walk():
+        """Baseline: list the whole tree and read every cpu.stat"""
+        cgroup_root = cpu_monitor.host_path('/sys/fs/cgroup')
+        def walk():
+            for directory, _, _ in os.walk(cgroup_root):
+                with open(os.path.join(directory, 'cpu.stat'), 'rb') as f:
+                    f.read()
+        return walk
+
+    def essential_temps():
+        sensors = cpu_monitor.read_thermal_zones(cpu_monitor.read_sensors())
+        return lambda: cpu_monitor.essential_temperatures(sensors)
+
+    return (
+        ('parse_cpu_frequencies', lambda: cpu_monitor.parse_cpu_frequencies),
+        ('freq backend: cpufreq', cpufreq_backend),
+        ('parse_cpu_stats+usage', stat_legacy),
+        ('parse_cpu_stat_matrix+breakdown', stat_breakdown),
+        ('read_sensors', lambda: cpu_monitor.read_sensors),
+        ('read_thermal_zones', lambda: cpu_monitor.read_thermal_zones),
+        ('essential_temperatures', essential_temps),
+        ('InterruptScanner.scan (idle)', interrupts_idle),
+        ('InterruptScanner.scan (pinned)', lambda: interrupts_changing(True)),
+        ('InterruptScanner.scan (all cells)', lambda: interrupts_changing(False)),
+        ('interrupts split+int (baseline)', interrupts_split_baseline),
+        ('StreamWriter.format (json)', lambda: stream_format('json')),
+        ('StreamWriter.format (csv)', lambda: stream_format('csv')),
+        ('CgroupScanner.scan (idle)', lambda: cgroups_scan(0)),
+        ('CgroupScanner.scan (5% busy)', lambda: cgroups_scan(0.05)),
+        ('cgroup full walk (baseline)', cgroups_full_walk),
+        ('CpuTopology.read', lambda: cpu_monitor.CpuTopology.read),
+        ('topology groups (cached)', topology_groups),
+    )
+
+def measure(func, iterations):
+    """Return latency percentiles (microseconds) and peak traced allocation (bytes) per call"""
+    func()  # warm up caches and open descriptors
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        durations.append((time.perf_counter() - start) * 1e6)
+    durations.sort()
+
+    tracemalloc.start()
+    peaks = []
+    for _ in range(min(iterations, 20)):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        func()
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+
+    return {
+        'mean_us': statistics.fmean(durations),
+        'p50_us': durations[len(durations) // 2],
+        'p99_us': durations[min(len(durations) - 1, int(len(durations) * 0.99))],
+        'peak_alloc_bytes': max(peaks),
+    }
+
+def run_scale(cpus, hwmon_chips, thermal_zones, iterations):
+    root = tempfile.mkdtemp(prefix='cpu_monitor_bench_')
+    try:
+        generate_tree(root, cpus, hwmon_chips, thermal_zones)
+        cpu_monitor.set_root(root)
+        results = {}
+        for name, setup in collectors():
+            results[name] = measure(setup(), iterations)
+        return results
+    finally:
+        cpu_monitor.set_root('/')
+        shutil.rmtree(root, ignore_errors=True)
+
+def scale_arg(value):
+    try:
+        cpus, hwmon_chips, thermal_zones = (int(part) for part in value.split(','))
+    except ValueError:
+        raise argparse.ArgumentTypeError("scale must be CPUS,HWMON_CHIPS,THERMAL_ZONES")
+    return cpus, hwmon_chips, thermal_zones
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cpu_monitor collectors on synthetic trees")
+    parser.add_argument('--scale', type=scale_arg, action='append', metavar='CPUS,HWMON,THERMAL',
+                        help="scale to benchmark; may be repeated (default: 16,4,2 128,12,40 512,40,200)")
+    parser.add_argument('--iterations', type=int, default=200, help="timed calls per collector (default: 200)")
+    parser.add_argument('--json', metavar='FILE', help="write results as JSON")
+    parser.add_argument('--compare', metavar='FILE', help="show the change against an earlier --json run")
+    args = parser.parse_args()
+    # Same descriptor budgets as the monitor itself
+    cpu_monitor.raise_fd_limit()
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    all_results = {}
+    for cpus, hwmon_chips, thermal_zones in args.scale or DEFAULT_SCALES:
+        key = f"{cpus},{hwmon_chips},{thermal_zones}"
+        results = all_results[key] = run_scale(cpus, hwmon_chips, thermal_zones, args.iterations)
+        print(f"\n{cpus} CPUs, {hwmon_chips} hwmon chips, {thermal_zones} thermal zones")
+        print(f"  {'collector':34} {'mean us':>10} {'p50 us':>10} {'p99 us':>10} {'peak KiB':>10}")
+        for name, result in results.items():
+            line = (f"  {name:34} {result['mean_us']:10.1f} {result['p50_us']:10.1f}"
+                    f" {result['p99_us']:10.1f} {result['peak_alloc_bytes'] / 1024:10.1f}")
+            previous = baseline.get(key, {}).get(name)
+            if previous and previous['p50_us']:
+                line += f"  ({(result['p50_us'] / previous['p50_us'] - 1) * 100:+.0f}% p50)"
+            print(line)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(all_results, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,37 +1,286 @@
-import curses
-import subprocess
+import argparse
 import re
 import os
+import errno
+import fcntl
+import sys
 import time
+import threading
+import functools
+import heapq
+import io
+import operator
+import json
+import math
+import mmap
+import resource
+import signal
+import socket
+import struct
+import tempfile
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait as futures_wait
+from contextlib import contextmanager, nullcontext
+
+# Imported by load_curses() so headless modes never load curses
+curses = None
 
 # Mouse/scroll event codes (may vary by terminal; update as needed)
-MOUSE_SCROLL_CODES = (curses.KEY_MOUSE, 410, 411, 412, 413, 414, 415)
+MOUSE_SCROLL_CODES = ()
 
-def get_lscpu_info():
+def load_curses():
+    """Import curses for the interactive modes"""
+    global curses, MOUSE_SCROLL_CODES
+    if curses is None:
+        import curses as curses_module
+        curses = curses_module
+        MOUSE_SCROLL_CODES = (curses.KEY_MOUSE, 410, 411, 412, 413, 414, 415)
+    return curses
+
+# Filesystem root that /proc, /sys and /dev paths are resolved against (see --root)
+ROOT = '/'
+
+def host_path(path):
+    """Resolve an absolute /proc, /sys or /dev path against ROOT"""
+    return path if ROOT == '/' else os.path.join(ROOT, path.lstrip('/'))
+
+def set_root(root):
+    """Point every collector at another root, e.g. a synthetic tree for benchmarks"""
+    global ROOT, _sensor_registry
+    ROOT = root
+    if _sensor_registry is not None:
+        _sensor_registry.close()
+        _sensor_registry = None
+
+class StageStats:
+    """Rolling durations and I/O counts for one instrumented stage"""
+
+    __slots__ = ('durations', 'calls', 'total_time', 'opens', 'reads')
+
+    def __init__(self, window):
+        self.durations = deque(maxlen=window)
+        self.calls = 0
+        self.total_time = 0.0
+        self.opens = 0
+        self.reads = 0
+
+    def percentiles(self):
+        """Return (p50, p99) in seconds over the rolling window"""
+        ordered = sorted(self.durations)
+        if not ordered:
+            return 0.0, 0.0
+        return ordered[len(ordered) // 2], ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+
+class Instrumentation:
+    """Timing hooks for the monitor's own collectors and render phase.
+
+    Each stage keeps a rolling window of durations (for p50/p99) plus file
+    open and read counts. The collectors report their own I/O through
+    count_open() and count_read(), which charge whichever stage is active
+    on the calling thread and do nothing outside a stage. Opens are counted
+    per attempt, so probes of optional files that do not exist show up too.
+    Reads are the pread() calls on cached descriptors plus one per file
+    opened and read whole.
+    """
+
+    def __init__(self, window=512):
+        self.window = window
+        self.stages = {}
+        self._local = threading.local()
+
+    def count_open(self, reads=0):
+        """Charge one open attempt, plus `reads` reads of the file, to the active stage"""
+        stats = getattr(self._local, 'stats', None)
+        if stats is not None:
+            stats.opens += 1
+            stats.reads += reads
+
+    def count_read(self, n=1):
+        stats = getattr(self._local, 'stats', None)
+        if stats is not None:
+            stats.reads += n
+
+    @contextmanager
+    def stage(self, name):
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = StageStats(self.window)
+        outer = getattr(self._local, 'stats', None)
+        self._local.stats = stats
+        start = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            elapsed = time.perf_counter() - start
+            self._local.stats = outer
+            stats.durations.append(elapsed)
+            stats.calls += 1
+            stats.total_time += elapsed
+
+    def instrumented(self, name):
+        """Decorator form of stage()"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def summary(self):
+        """[(stage, calls, p50 s, p99 s, opens, reads)] in first-seen order"""
+        rows = []
+        for name, stats in list(self.stages.items()):
+            p50, p99 = stats.percentiles()
+            rows.append((name, stats.calls, p50, p99, stats.opens, stats.reads))
+        return rows
+
+    def format_lines(self):
+        lines = [f"{'stage':22} {'calls':>7} {'p50 ms':>8} {'p99 ms':>8} {'opens':>7} {'reads':>8}"]
+        for name, calls, p50, p99, opens, reads in self.summary():
+            lines.append(f"{name:22} {calls:7d} {p50 * 1000:8.3f} {p99 * 1000:8.3f} {opens:7d} {reads:8d}")
+        return lines
+
+INSTRUMENTATION = Instrumentation()
+
+# Static CPU info is cached per boot: model, stepping and topology cannot change without a reboot
+CPU_INFO_CACHE_VERSION = 1
+
+def cpu_info_cache_path():
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'cpu_monitor', 'cpu-info.json')
+
+def read_static_cpu_info():
+    """lscpu-style fields read straight from /proc/cpuinfo and sysfs (no subprocess)"""
+    info = {}
+    first = {}
+    physical_ids = set()
     try:
-        result = subprocess.run(['lscpu'], capture_output=True, text=True, check=True)
-        info = {}
-        for line in result.stdout.splitlines():
-            if ':' in line:
-                key, val = map(str.strip, line.split(':', 1))
-                info[key] = val
-        return info
-    except Exception as e:
-        import sys
-        print(f"Error in get_lscpu_info: {e}", file=sys.stderr)
-        return {}
+        INSTRUMENTATION.count_open(reads=1)
+        with open(host_path('/proc/cpuinfo')) as f:
+            for line in f:
+                key, sep, val = line.partition(':')
+                if not sep:
+                    continue
+                key = key.strip()
+                if key == 'physical id':
+                    physical_ids.add(val.strip())
+                first.setdefault(key, val.strip())
+    except OSError as e:
+        print(f"Error reading /proc/cpuinfo: {e}", file=sys.stderr)
+
+    # x86 has 'model name'; ARM boards only name the machine ('Model') or the part
+    model = first.get('model name') or first.get('Model') or first.get('Hardware')
+    if model:
+        info['Model name'] = model
+    if 'stepping' in first:
+        info['Stepping'] = first['stepping']
+    elif 'CPU revision' in first:
+        info['Stepping'] = f"r{first.get('CPU variant', '0x0')[2:] or 0}p{first['CPU revision']}"
+
+    cpu_path = host_path('/sys/devices/system/cpu')
+    siblings = _read_text(os.path.join(cpu_path, 'cpu0/topology/thread_siblings_list'))
+    if siblings:
+        info['Thread(s) per core'] = str(len(parse_cpu_list(siblings)))
+    if 'cpu cores' in first:
+        info['Core(s) per socket'] = first['cpu cores']
+    elif siblings:
+        online = _read_text(os.path.join(cpu_path, 'online'))
+        if online:
+            sockets = max(len(physical_ids), 1)
+            info['Core(s) per socket'] = str(len(parse_cpu_list(online)) // sockets // len(parse_cpu_list(siblings)))
+
+    boost = _read_text(os.path.join(cpu_path, 'cpufreq/boost'))
+    no_turbo = _read_text(os.path.join(cpu_path, 'intel_pstate/no_turbo'))
+    if boost in ('0', '1'):
+        info['Frequency boost'] = 'enabled' if boost == '1' else 'disabled'
+    elif no_turbo in ('0', '1'):
+        info['Frequency boost'] = 'enabled' if no_turbo == '0' else 'disabled'
+
+    max_khz, min_khz = [], []
+    for cpufreq_dir in _cpufreq_dirs(cpu_path):
+        for name, values in (('cpuinfo_max_freq', max_khz), ('cpuinfo_min_freq', min_khz)):
+            text = _read_text(os.path.join(cpufreq_dir, name))
+            if text and text.isdigit():
+                values.append(int(text))
+    if max_khz:
+        info['CPU max MHz'] = f"{max(max_khz) / 1000:.4f}"
+    if min_khz:
+        info['CPU min MHz'] = f"{min(min_khz) / 1000:.4f}"
+    return info
+
+def _cpufreq_dirs(cpu_path):
+    """One cpufreq directory per policy (far fewer than CPUs on large machines)"""
+    policy_path = os.path.join(cpu_path, 'cpufreq')
+    try:
+        policies = sorted(entry for entry in os.listdir(policy_path) if entry.startswith('policy'))
+    except OSError:
+        policies = []
+    if policies:
+        return [os.path.join(policy_path, entry) for entry in policies]
+    return [os.path.join(cpu_path, 'cpu0/cpufreq')]
+
+def read_scaling_percent():
+    """Current frequency as a share of maximum across cpufreq policies, like lscpu's 'CPU(s) scaling MHz'"""
+    cur_total = max_total = 0
+    for cpufreq_dir in _cpufreq_dirs(host_path('/sys/devices/system/cpu')):
+        cur = _read_text(os.path.join(cpufreq_dir, 'scaling_cur_freq'))
+        top = _read_text(os.path.join(cpufreq_dir, 'cpuinfo_max_freq'))
+        if cur and top and cur.isdigit() and top.isdigit():
+            cur_total += int(cur)
+            max_total += int(top)
+    return f"{cur_total * 100 // max_total}%" if max_total else None
+
+@INSTRUMENTATION.instrumented('get_lscpu_info')
+def get_lscpu_info():
+    """Static CPU info with lscpu's field names, cached on disk per boot ID"""
+    boot_id = _read_text(host_path('/proc/sys/kernel/random/boot_id'))
+    cache_path = cpu_info_cache_path()
+    key = [CPU_INFO_CACHE_VERSION, boot_id, ROOT]
+    info = None
+    if boot_id:
+        try:
+            INSTRUMENTATION.count_open(reads=1)
+            with open(cache_path) as f:
+                cached = json.load(f)
+            if cached.get('key') == key:
+                info = cached['info']
+        except (OSError, ValueError, KeyError, AttributeError):
+            pass
+    if info is None:
+        info = read_static_cpu_info()
+        if boot_id:
+            try:
+                os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+                tmp_path = f"{cache_path}.{os.getpid()}"
+                INSTRUMENTATION.count_open()
+                with open(tmp_path, 'w') as f:
+                    json.dump({'key': key, 'info': info}, f)
+                os.replace(tmp_path, cache_path)
+            except OSError:
+                pass  # Read-only home or similar: just skip the cache
+
+    # Scaling is live, never cached
+    scaling = read_scaling_percent()
+    if scaling:
+        info = dict(info, **{'CPU(s) scaling MHz': scaling})
+    return info
 
 def get_base_frequency():
     """Get base CPU frequency from ACPI CPPC or CPUfreq sysfs interface"""
     try:
         # Try ACPI CPPC nominal frequency first (more accurate for AMD)
-        with open('/sys/devices/system/cpu/cpu0/acpi_cppc/nominal_freq', 'r') as f:
+        INSTRUMENTATION.count_open(reads=1)
+        with open(host_path('/sys/devices/system/cpu/cpu0/acpi_cppc/nominal_freq'), 'r') as f:
             base_freq_mhz = int(f.read().strip())
             return f"{base_freq_mhz:.4f}"
     except (OSError, ValueError):
         try:
             # Fallback to CPUfreq max frequency
-            with open('/sys/devices/system/cpu/cpu0/cpufreq/cpuinfo_max_freq', 'r') as f:
+            INSTRUMENTATION.count_open(reads=1)
+            with open(host_path('/sys/devices/system/cpu/cpu0/cpufreq/cpuinfo_max_freq'), 'r') as f:
                 base_freq_khz = int(f.read().strip())
                 # Convert kHz to MHz
                 base_freq_mhz = base_freq_khz / 1000
@@ -39,11 +288,40 @@ def get_base_frequency():
         except (OSError, ValueError):
             return None
 
+def get_nominal_frequency():
+    """Nominal frequency in MHz, the rate MPERF counts at, or None if unknown.
+
+    Unlike get_base_frequency() this never falls back to cpuinfo_max_freq,
+    which is the maximum turbo frequency under intel_pstate.
+    """
+    cpu0 = host_path('/sys/devices/system/cpu/cpu0')
+    for name, per_mhz in (('acpi_cppc/nominal_freq', 1), ('cpufreq/base_frequency', 1000)):
+        try:
+            INSTRUMENTATION.count_open(reads=1)
+            with open(os.path.join(cpu0, name), 'r') as f:
+                mhz = int(f.read().strip()) / per_mhz
+        except (OSError, ValueError):
+            continue
+        if mhz > 0:
+            return mhz
+    # Intel brand strings carry the nominal frequency ("... CPU @ 2.10GHz")
+    try:
+        INSTRUMENTATION.count_open(reads=1)
+        with open(host_path('/proc/cpuinfo'), 'r') as f:
+            for line in f:
+                if line.startswith('model name'):
+                    match = re.search(r'@\s*([0-9.]+)\s*GHz', line)
+                    return float(match.group(1)) * 1000 if match else None
+    except (OSError, ValueError):
+        pass
+    return None
+
 def parse_cpu_frequencies():
     freqs = {}
     cpu_id = None
     try:
-        with open('/proc/cpuinfo', 'r') as f:
+        INSTRUMENTATION.count_open(reads=1)
+        with open(host_path('/proc/cpuinfo'), 'r') as f:
             for line in f:
                 if line.startswith('processor'):
                     cpu_id = int(line.split(':')[1].strip())
@@ -51,273 +329,3455 @@ def parse_cpu_frequencies():
                     freq = float(line.split(':')[1].strip())
                     freqs[cpu_id] = freq
     except OSError as e:
-        print(f"Error reading /proc/cpuinfo: {e}")
+        print(f"Error reading /proc/cpuinfo: {e}", file=sys.stderr)
     except Exception as e:
-        print(f"Unexpected error in parse_cpu_frequencies: {e}")
+        print(f"Unexpected error in parse_cpu_frequencies: {e}", file=sys.stderr)
     
     # Fallback for ARM systems where /proc/cpuinfo doesn't include MHz
     if not freqs:
         try:
-            cpu_dirs = [d for d in os.listdir('/sys/devices/system/cpu/') if d.startswith('cpu') and d[3:].isdigit()]
-            for cpu_dir in sorted(cpu_dirs):
-                cpu_num = int(cpu_dir[3:])
-                freq_path = f'/sys/devices/system/cpu/{cpu_dir}/cpufreq/scaling_cur_freq'
-                if os.path.exists(freq_path):
-                    with open(freq_path, 'r') as f:
-                        freq_khz = int(f.read().strip())
-                        freqs[cpu_num] = freq_khz / 1000  # Convert kHz to MHz
-        except Exception as e:
-            print(f"Error reading cpufreq: {e}")
-    
-    return freqs
+            cpu_path = host_path('/sys/devices/system/cpu')
+            cpu_dirs = [d for d in os.listdir(cpu_path) if d.startswith('cpu') and d[3:].isdigit()]
+            for cpu_dir in sorted(cpu_dirs):
+                cpu_num = int(cpu_dir[3:])
+                freq_path = f'{cpu_path}/{cpu_dir}/cpufreq/scaling_cur_freq'
+                if os.path.exists(freq_path):
+                    INSTRUMENTATION.count_open(reads=1)
+                    with open(freq_path, 'r') as f:
+                        freq_khz = int(f.read().strip())
+                        freqs[cpu_num] = freq_khz / 1000  # Convert kHz to MHz
+        except Exception as e:
+            print(f"Error reading cpufreq: {e}", file=sys.stderr)
+    
+    return freqs
+
+class FrequencyBackend:
+    """Base class for per-core frequency sources; tracks its own read cost"""
+
+    name = None
+
+    def __init__(self):
+        self.reads = 0
+        self.total_time = 0.0
+        self.last_cost = 0.0
+
+    @property
+    def cost(self):
+        """Average seconds per read so far"""
+        return self.total_time / self.reads if self.reads else 0.0
+
+    def available(self):
+        return True
+
+    def read(self):
+        start = time.perf_counter()
+        try:
+            freqs = self._read()
+        except OSError:
+            freqs = {}
+        self.last_cost = time.perf_counter() - start
+        self.total_time += self.last_cost
+        self.reads += 1
+        return freqs
+
+    def _read(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class CpuinfoFrequencyBackend(FrequencyBackend):
+    """Full /proc/cpuinfo scan (with the cpufreq fallback for ARM)"""
+
+    name = 'cpuinfo'
+
+    def _read(self):
+        return parse_cpu_frequencies()
+
+class _PerCpuFileBackend(FrequencyBackend):
+    """Keeps one open descriptor per CPU for a per-CPU file"""
+
+    def __init__(self):
+        super().__init__()
+        self.cpu_path = host_path('/sys/devices/system/cpu')
+        self._fds = None  # [(cpu_id, fd)]
+
+    def _cpu_file(self, cpu_id):
+        raise NotImplementedError
+
+    def _open(self):
+        self.close()
+        fds = []
+        try:
+            cpu_dirs = [d for d in os.listdir(self.cpu_path) if d.startswith('cpu') and d[3:].isdigit()]
+        except OSError:
+            cpu_dirs = []
+        for cpu_id in sorted(int(d[3:]) for d in cpu_dirs):
+            try:
+                INSTRUMENTATION.count_open()
+                fds.append((cpu_id, os.open(self._cpu_file(cpu_id), os.O_RDONLY)))
+            except OSError:
+                continue
+        self._fds = fds
+
+    def available(self):
+        if self._fds is None:
+            self._open()
+        return bool(self._fds)
+
+    def close(self):
+        for _, fd in self._fds or ():
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        self._fds = None
+
+class CpufreqFrequencyBackend(_PerCpuFileBackend):
+    """Cached scaling_cur_freq descriptors re-read with pread"""
+
+    name = 'cpufreq'
+
+    def _cpu_file(self, cpu_id):
+        return f'{self.cpu_path}/cpu{cpu_id}/cpufreq/scaling_cur_freq'
+
+    def _read(self):
+        if self._fds is None:
+            self._open()
+        freqs = {}
+        stale = False
+        for cpu_id, fd in self._fds:
+            try:
+                freqs[cpu_id] = _pread_int(fd) / 1000  # Convert kHz to MHz
+            except ValueError:
+                continue
+            except OSError:
+                stale = True
+        if stale:
+            # A CPU went offline; rediscover on the next read
+            self.close()
+        return freqs
+
+class MsrFrequencyBackend(_PerCpuFileBackend):
+    """Effective frequency from APERF/MPERF deltas read through /dev/cpu/*/msr (x86, root)"""
+
+    name = 'msr'
+    MSR_MPERF = 0xE7
+    MSR_APERF = 0xE8
+
+    def __init__(self, base_mhz=None):
+        super().__init__()
+        self.msr_path = host_path('/dev/cpu')
+        self.base_mhz = base_mhz
+        self._prev = {}
+        self._freqs = {}
+
+    def _cpu_file(self, cpu_id):
+        return f'{self.msr_path}/{cpu_id}/msr'
+
+    def available(self):
+        if self.base_mhz is None:
+            # Without the true nominal frequency the APERF/MPERF ratio cannot be scaled
+            self.base_mhz = get_nominal_frequency()
+        if self.base_mhz is None or not super().available():
+            return False
+        # Prime the counters so the first real read already has a delta
+        self.read()
+        return bool(self._prev)
+
+    def _read(self):
+        if self._fds is None:
+            self._open()
+        for cpu_id, fd in self._fds:
+            mperf = int.from_bytes(os.pread(fd, 8, self.MSR_MPERF), 'little')
+            aperf = int.from_bytes(os.pread(fd, 8, self.MSR_APERF), 'little')
+            INSTRUMENTATION.count_read(2)
+            prev = self._prev.get(cpu_id)
+            self._prev[cpu_id] = (mperf, aperf)
+            if prev is None:
+                continue
+            mperf_delta = mperf - prev[0]
+            # Both counters only tick in C0; keep the last value for fully idle cores
+            if mperf_delta > 0:
+                self._freqs[cpu_id] = self.base_mhz * (aperf - prev[1]) / mperf_delta
+        return dict(self._freqs)
+
+# Default fallback order, most precise first; 'cpuinfo' is the last resort
+FREQUENCY_BACKENDS = {
+    'msr': MsrFrequencyBackend,
+    'cpufreq': CpufreqFrequencyBackend,
+    'cpuinfo': CpuinfoFrequencyBackend,
+}
+
+class FrequencyReader:
+    """Read per-core frequencies from a preferred backend with automatic fallback.
+
+    With preference 'auto', the chain starts in FREQUENCY_BACKENDS order and
+    every available backend is probed lazily, one read each: a read that
+    reaches no unmeasured backend through the chain probes one more.
+    Once all are measured the chain is reordered by cost, preferring
+    backends that cover the most CPUs. Nothing is read before the first
+    sample.
+    """
+
+    def __init__(self, preference='auto'):
+        self.preference = preference
+        self.backends = []
+        self._coverage = None  # backend name -> CPUs covered by its probe read, while probing
+        candidates = []
+        for name, backend_cls in FREQUENCY_BACKENDS.items():
+            backend = backend_cls()
+            if backend.available():
+                candidates.append(backend)
+            else:
+                backend.close()
+
+        if preference == 'auto':
+            self._coverage = {}
+        else:
+            if preference not in FREQUENCY_BACKENDS:
+                raise ValueError(f"Unknown frequency backend: {preference}")
+            candidates.sort(key=lambda b: b.name != preference)
+        self.backends = candidates
+        self.active = candidates[0] if candidates else None
+
+    def read(self):
+        result = {}
+        measured = len(self._coverage) if self._coverage is not None else 0
+        for backend in self.backends:
+            freqs = backend.read()
+            if self._coverage is not None:
+                self._coverage.setdefault(backend.name, len(freqs))
+            if freqs:
+                self.active = backend
+                result = freqs
+                break
+        if self._coverage is not None:
+            self._probe_next(len(self._coverage) == measured)
+        return result
+
+    def _probe_next(self, probe):
+        """Probe one unmeasured backend if `probe`; rank the chain once every backend has been read"""
+        pending = [backend for backend in self.backends if backend.name not in self._coverage]
+        if probe and pending:
+            self._coverage[pending[0].name] = len(pending[0].read())
+            del pending[0]
+        if pending:
+            return
+        coverage = self._coverage
+        best = max(coverage.values(), default=0)
+        self.backends.sort(key=lambda b: (coverage[b.name] < best, b.cost))
+        self._coverage = None
+
+    def costs(self):
+        """Average read cost in seconds per backend that has been read"""
+        return {backend.name: backend.cost for backend in self.backends if backend.reads}
+
+    def close(self):
+        for backend in self.backends:
+            backend.close()
+
+def parse_cpu_stats():
+    """Parse CPU usage statistics from /proc/stat"""
+    stats = {}
+    try:
+        INSTRUMENTATION.count_open(reads=1)
+        with open(host_path('/proc/stat'), 'r') as f:
+            for line in f:
+                if line.startswith('cpu') and line[3:4].isdigit():
+                    parts = line.split()
+                    cpu_id = int(parts[0][3:])  # Extract number from 'cpu0', 'cpu1', etc.
+                    times = [int(x) for x in parts[1:]]
+                    stats[cpu_id] = times
+    except (OSError, ValueError, IndexError) as e:
+        print(f"Error reading /proc/stat: {e}", file=sys.stderr)
+    return stats
+
+def calculate_cpu_usage(prev_stats, curr_stats):
+    """Calculate CPU usage percentage for each core"""
+    usage = {}
+    for cpu_id in curr_stats:
+        if cpu_id not in prev_stats:
+            continue
+
+        prev_times = prev_stats[cpu_id]
+        curr_times = curr_stats[cpu_id]
+
+        # Calculate deltas
+        prev_total = sum(prev_times)
+        curr_total = sum(curr_times)
+
+        prev_idle = prev_times[3]  # idle is the 4th field (index 3)
+        curr_idle = curr_times[3]
+
+        total_delta = curr_total - prev_total
+        idle_delta = curr_idle - prev_idle
+
+        if total_delta > 0:
+            usage_percent = ((total_delta - idle_delta) / total_delta) * 100
+            usage[cpu_id] = max(0, min(100, usage_percent))  # Clamp between 0-100
+        else:
+            usage[cpu_id] = 0
+
+    return usage
+
+# Per-state columns of a /proc/stat cpuN line; guest time is already counted in user/nice
+CPU_STAT_FIELDS = ('user', 'nice', 'system', 'idle', 'iowait', 'irq', 'softirq', 'steal')
+
+# All cpuN rows of /proc/stat as one row-major array of ncols counters per CPU
+CpuStatMatrix = namedtuple('CpuStatMatrix', ['cpu_ids', 'ncols', 'values'])
+
+# Per-core busy percentage plus per-state percentages, each a list aligned with cpu_ids
+CpuBreakdown = namedtuple('CpuBreakdown', ['cpu_ids', 'usage', 'states'])
+
+def parse_cpu_stat_matrix(stat_path=None):
+    """Parse every cpuN line of /proc/stat in one pass into a CpuStatMatrix"""
+    try:
+        INSTRUMENTATION.count_open(reads=1)
+        with open(stat_path or host_path('/proc/stat'), 'rb') as f:
+            data = f.read()
+    except OSError as e:
+        print(f"Error reading /proc/stat: {e}", file=sys.stderr)
+        return None
+
+    # Per-CPU lines form one contiguous block right after the aggregate 'cpu ' line
+    start = data.find(b'\ncpu0')
+    if start < 0:
+        return None
+    end = data.find(b'\n', start + 1)
+    # The last cpuN line may end the buffer without a newline (find() returns -1)
+    while end >= 0 and data.startswith(b'cpu', end + 1):
+        end = data.find(b'\n', end + 1)
+    if end < 0:
+        end = len(data)
+    block = data[start + 1:end]
+
+    width = block.find(b'\n')
+    width = len((block[:width] if width >= 0 else block).split())
+    tokens = block.split()
+    if width < 2 or len(tokens) % width:
+        return None
+    labels = tokens[::width]
+    del tokens[::width]
+    try:
+        cpu_ids = tuple(int(label[3:]) for label in labels)
+        # Building from a list takes array's bulk path rather than per-item appends
+        values = array('q', list(map(int, tokens)))
+    except ValueError as e:
+        print(f"Error reading /proc/stat: {e}", file=sys.stderr)
+        return None
+    return CpuStatMatrix(cpu_ids, width - 1, values)
+
+def _align_cpu_stat_matrix(prev, curr):
+    """Return prev's counters reordered to curr's rows (CPUs that came online get a zero delta)"""
+    ncols = curr.ncols
+    rows = {cpu_id: i for i, cpu_id in enumerate(prev.cpu_ids)}
+    aligned = array('q')
+    for i, cpu_id in enumerate(curr.cpu_ids):
+        j = rows.get(cpu_id)
+        if j is not None and prev.ncols == ncols:
+            aligned.extend(prev.values[j * ncols:(j + 1) * ncols])
+        else:
+            aligned.extend(curr.values[i * ncols:(i + 1) * ncols])
+    return aligned
+
+def since_boot_baseline(curr):
+    """All-zero counters shaped like curr; deltas against it are since-boot totals"""
+    if curr is None:
+        return None
+    return CpuStatMatrix(curr.cpu_ids, curr.ncols, array('q', bytes(8 * len(curr.values))))
+
+def calculate_cpu_breakdown(prev, curr):
+    """Calculate busy and per-state percentages for all cores from two CpuStatMatrix samples.
+
+    There is no Python loop per core and state: one delta list, one strided
+    slice per state column, and map()/zip() passes to total, scale and clamp
+    them. The slices are kept because they become the per-state output lists;
+    this measured faster than strided array arithmetic or per-row sums
+    (about 0.4 ms for 256 CPUs).
+    """
+    if prev is None or curr is None:
+        return None
+    prev_values = prev.values
+    if prev.cpu_ids != curr.cpu_ids or prev.ncols != curr.ncols:
+        prev_values = _align_cpu_stat_matrix(prev, curr)
+    ncols = curr.ncols
+    deltas = list(map(operator.sub, curr.values, prev_values))
+
+    nstates = min(ncols, len(CPU_STAT_FIELDS))
+    columns = [deltas[j::ncols] for j in range(nstates)]
+    totals = map(sum, zip(*columns))
+    scale = [100.0 / total if total > 0 else 0.0 for total in totals]
+
+    states = {}
+    for name, column in zip(CPU_STAT_FIELDS, columns):
+        states[name] = list(map(operator.mul, column, scale))
+    usage = [min(100.0, max(0.0, 100.0 - pct)) if factor else 0.0
+             for pct, factor in zip(states['idle'], scale)]
+    return CpuBreakdown(curr.cpu_ids, usage, states)
+
+# Grouping levels for the topology views, coarsest first
+TOPOLOGY_LEVELS = ('package', 'die', 'node', 'cluster', 'core')
+
+CpuPlacement = namedtuple('CpuPlacement', ['package', 'die', 'cluster', 'core', 'node'])
+
+def parse_cpu_list(text):
+    """Parse a kernel CPU list such as '0-3,8,10-11' into a list of ints"""
+    cpus = []
+    for part in text.strip().split(','):
+        if not part:
+            continue
+        first, _, last = part.partition('-')
+        cpus.extend(range(int(first), int(last or first) + 1))
+    return cpus
+
+def _read_topology_id(cpu_dir, *names):
+    """First readable non-negative id among the given files under cpu_dir"""
+    for name in names:
+        text = _read_text(os.path.join(cpu_dir, name))
+        if text and text.lstrip('-').isdigit() and int(text) >= 0:
+            return int(text)
+    return 0
+
+class CpuTopology:
+    """Package/die/cluster/core/NUMA placement of each CPU, read once from sysfs.
+
+    Clusters fall back to the L3 cache id where the kernel has no cluster_id,
+    which matches CCXs on AMD parts.
+    """
+
+    def __init__(self, placements):
+        self.placements = placements
+        self._groups = {}
+
+    @classmethod
+    def read(cls):
+        cpu_path = host_path('/sys/devices/system/cpu')
+        node_of = {}
+        node_path = host_path('/sys/devices/system/node')
+        try:
+            for entry in os.listdir(node_path):
+                if entry.startswith('node') and entry[4:].isdigit():
+                    try:
+                        cpus = parse_cpu_list(_read_text(os.path.join(node_path, entry, 'cpulist')) or '')
+                    except ValueError:
+                        continue
+                    for cpu_id in cpus:
+                        node_of[cpu_id] = int(entry[4:])
+        except OSError:
+            pass
+        placements = {}
+        try:
+            entries = os.listdir(cpu_path)
+        except OSError:
+            entries = []
+        for entry in entries:
+            if not (entry.startswith('cpu') and entry[3:].isdigit()):
+                continue
+            cpu_id = int(entry[3:])
+            cpu_dir = os.path.join(cpu_path, entry)
+            placements[cpu_id] = CpuPlacement(
+                package=_read_topology_id(cpu_dir, 'topology/physical_package_id'),
+                die=_read_topology_id(cpu_dir, 'topology/die_id'),
+                cluster=_read_topology_id(cpu_dir, 'topology/cluster_id', 'cache/index3/id'),
+                core=_read_topology_id(cpu_dir, 'topology/core_id'),
+                node=node_of.get(cpu_id, 0))
+        return cls(placements)
+
+    def placement(self, cpu_id):
+        return self.placements.get(cpu_id) or CpuPlacement(0, 0, 0, cpu_id, 0)
+
+    @staticmethod
+    def group_key(placement, level):
+        if level == 'package':
+            return (placement.package,)
+        if level == 'die':
+            return (placement.package, placement.die)
+        if level == 'node':
+            return (placement.node,)
+        if level == 'cluster':
+            return (placement.package, placement.die, placement.cluster)
+        return (placement.package, placement.die, placement.cluster, placement.core)
+
+    @staticmethod
+    def group_label(key, level):
+        if level == 'package':
+            return f"pkg{key[0]}"
+        if level == 'die':
+            return f"pkg{key[0]}/die{key[1]}"
+        if level == 'node':
+            return f"node{key[0]}"
+        if level == 'cluster':
+            return f"pkg{key[0]}/die{key[1]}/cl{key[2]}"
+        return f"pkg{key[0]}/die{key[1]}/core{key[3]}"
+
+    def groups(self, level, cpu_ids):
+        """[(key, label, member cpu ids)] with SMT siblings adjacent; cached per CPU set"""
+        cache_key = (level, tuple(cpu_ids))
+        cached = self._groups.get(cache_key)
+        if cached is not None:
+            return cached
+        members = {}
+        for cpu_id in cpu_ids:
+            placement = self.placement(cpu_id)
+            members.setdefault(self.group_key(placement, level), []).append(cpu_id)
+        groups = []
+        for key in sorted(members):
+            cpus = sorted(members[key], key=lambda cpu_id: (self.placement(cpu_id).core, cpu_id))
+            groups.append((key, self.group_label(key, level), cpus))
+        if len(self._groups) > 16:
+            self._groups.clear()
+        self._groups[cache_key] = groups
+        return groups
+
+# hwmon attribute prefix -> (sensors category, value conversion)
+HWMON_INPUT_TYPES = (
+    ('temp', 'temps', lambda raw: raw / 1000),
+    ('fan', 'fans', lambda raw: raw),
+    ('in', 'voltages', lambda raw: raw / 1000),
+    ('power', 'power', lambda raw: raw / 1000000),
+)
+
+def _pread_int(fd):
+    """Re-read a sysfs attribute from offset 0 through an already open descriptor"""
+    INSTRUMENTATION.count_read()
+    return int(os.pread(fd, 64, 0))
+
+def _read_text(path):
+    try:
+        INSTRUMENTATION.count_open(reads=1)
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+SENSOR_CATEGORIES = ('temps', 'fans', 'voltages', 'power', 'pwm')
+
+# Essential temperature sensors kept in the main temperature section
+ESSENTIAL_TEMP_KEYWORDS = ('k10temp', 'nvme', 'amdgpu', 'spd5118', 'r8169', 'coretemp',
+                           'systin', 'cputin', 'tsi0_temp', 'smbusmaster', 'auxtin', 'thermal_cpu')
+
+# Everything about a sensor that is fixed once it is discovered; key is the (category, name) history key
+SensorInfo = namedtuple('SensorInfo', ['id', 'category', 'name', 'key', 'essential'])
+
+class SensorCatalog:
+    """Intern sensors as stable integer IDs with their display metadata.
+
+    A sensor keeps its ID for the life of the catalog, also when its device
+    disappears and comes back. Display order (alphanumeric by name), the
+    essential-temperature flag and fan/PWM pairing are worked out when a
+    sensor is first interned, never per tick. Cores need no interning:
+    their CPU number already is a stable integer ID.
+    """
+
+    def __init__(self):
+        self.infos = []
+        self._ids = {}
+        self._order = None
+        self._fan_rows = None
+
+    def __len__(self):
+        return len(self.infos)
+
+    def intern(self, category, name):
+        """Return the ID for (category, name), assigning the next one if it is new"""
+        key = (category, name)
+        sensor_id = self._ids.get(key)
+        if sensor_id is None:
+            sensor_id = self._ids[key] = len(self.infos)
+            lowered = name.lower()
+            essential = category == 'temps' and any(keyword in lowered for keyword in ESSENTIAL_TEMP_KEYWORDS)
+            self.infos.append(SensorInfo(sensor_id, category, name, key, essential))
+            # Published by assignment, so a reader on another thread sees the old or the new tables
+            self._order = None
+            self._fan_rows = None
+        return sensor_id
+
+    def lookup(self, category, name):
+        return self._ids.get((category, name))
+
+    def order(self, category):
+        """SensorInfos of one category in display order"""
+        order = self._order
+        if order is None:
+            order = {}
+            for info in sorted(self.infos, key=lambda info: alphanum_sort_key(info.name)):
+                order.setdefault(info.category, []).append(info)
+            self._order = order
+        return order.get(category, ())
+
+    def fan_rows(self):
+        """[(fan SensorInfo, PWM sensor ID or None, display label)] grouped by device.
+
+        Fans are paired with the PWM output of the same number on the same
+        chip ('nct6799_fan2' with 'nct6799_pwm2').
+        """
+        rows = self._fan_rows
+        if rows is None:
+            devices = {}
+            for info in self.infos:
+                if info.category == 'fans' and '_fan' in info.name:
+                    device_name, _, fan_id = info.name.partition('_fan')
+                    devices.setdefault(device_name, []).append((f"Fan{fan_id}", info, fan_id))
+            rows = []
+            for device_name, fans in devices.items():
+                for label, info, fan_id in sorted(fans):
+                    rows.append((info, self.lookup('pwm', f"{device_name}_pwm{fan_id}"), label))
+            self._fan_rows = rows
+        return rows
+
+class SensorValues:
+    """One tick of sensor readings as a float vector indexed by SensorCatalog ID.
+
+    Missing sensors are NaN. sensors[category] still returns a {name: value}
+    dict in display order for the exporters and remote views; it is built on
+    first use only, so the sampler and the TUI never pay for it.
+    """
+
+    __slots__ = ('catalog', 'values', '_views')
+
+    def __init__(self, catalog, values=None):
+        self.catalog = catalog
+        self.values = values if values is not None else array('d', [math.nan]) * len(catalog)
+        self._views = None
+
+    @classmethod
+    def from_dicts(cls, catalog, sensors):
+        """Intern {category: {name: value}} into `catalog` and vectorize it"""
+        ids = [(catalog.intern(category, name), value)
+               for category, values in sensors.items() for name, value in values.items()]
+        vector = cls(catalog)
+        for sensor_id, value in ids:
+            vector.values[sensor_id] = value
+        return vector
+
+    def value(self, sensor_id):
+        """Reading for `sensor_id`, or None when it is missing this tick"""
+        if sensor_id is None or sensor_id >= len(self.values):
+            return None
+        value = self.values[sensor_id]
+        return None if value != value else value
+
+    def present(self, category):
+        """(SensorInfo, value) for the category's sensors with a reading, in display order"""
+        values = self.values
+        size = len(values)
+        return [(info, values[info.id]) for info in self.catalog.order(category)
+                if info.id < size and values[info.id] == values[info.id]]
+
+    def __getitem__(self, category):
+        views = self._views
+        if views is None:
+            views = self._views = {}
+        view = views.get(category)
+        if view is None:
+            view = views[category] = {info.name: value for info, value in self.present(category)}
+        return view
+
+    def get(self, category, default=None):
+        return self[category] if category in SENSOR_CATEGORIES else default
+
+# Reads slower than this move off the sampler thread onto the sensor worker pool
+SLOW_SENSOR_SECONDS = 0.005
+# How long one tick waits for pooled reads before reporting their last value as stale
+SENSOR_READ_TIMEOUT = 0.05
+SENSOR_WORKERS = 4
+# Slow sensors are polled every ceil(latency / SLOW_SENSOR_SECONDS) ticks, within these bounds
+SLOW_SENSOR_PERIODS = (2, 16)
+
+def _pread_uncached(path, size):
+    """open/read/close for inputs kept without a descriptor (past the registry's budget)"""
+    INSTRUMENTATION.count_open()
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        return os.read(fd, size)
+    finally:
+        os.close(fd)
+
+class _SensorInput:
+    """One open sensor attribute with its measured read latency and poll schedule"""
+
+    __slots__ = ('id', 'category', 'name', 'path', 'fd', 'convert', 'latency', 'slow', 'countdown', 'value', 'future')
+
+    def __init__(self, sensor_id, category, name, path, fd, convert):
+        self.id = sensor_id   # SensorCatalog ID
+        self.category = category
+        self.name = name
+        self.path = path
+        self.fd = fd          # None: opened on every read
+        self.convert = convert
+        self.latency = 0.0    # seconds; rises at once, decays as a moving average
+        self.slow = False     # read on the worker pool
+        self.countdown = 0    # ticks until the next pooled read
+        self.value = None
+        self.future = None    # pending pooled read
+
+    def period(self):
+        low, high = SLOW_SENSOR_PERIODS
+        return min(high, max(low, math.ceil(self.latency / SLOW_SENSOR_SECONDS)))
+
+    def timed_read(self):
+        """pread the value; returns (converted value or None, seconds taken)"""
+        start = time.perf_counter()
+        raw = os.pread(self.fd, 64, 0) if self.fd is not None else _pread_uncached(self.path, 64)
+        elapsed = time.perf_counter() - start
+        INSTRUMENTATION.count_read()
+        try:
+            return self.convert(int(raw)), elapsed
+        except ValueError:
+            return None, elapsed
+
+    def record_latency(self, elapsed):
+        # Rise at once so a single blocking read moves the sensor to the pool
+        latency = self.latency
+        self.latency = latency = elapsed if elapsed > latency else latency * 0.7 + elapsed * 0.3
+        self.slow = latency > SLOW_SENSOR_SECONDS
+        if self.slow:
+            self.countdown = self.period()
+
+# RAPL subzones that are part of their package's energy; DRAM is metered separately
+RAPL_PACKAGE_SUBZONES = ('core', 'uncore')
+
+class _RaplInput:
+    """One powercap zone's open energy_uj counter; power is the delta between two reads"""
+
+    __slots__ = ('id', 'name', 'path', 'fd', 'max_range', 'energy', 'read_at')
+
+    def __init__(self, sensor_id, name, path, fd, max_range):
+        self.id = sensor_id      # SensorCatalog ID
+        self.name = name
+        self.path = path
+        self.fd = fd             # None: opened on every read
+        self.max_range = max_range   # µJ at which energy_uj wraps back to 0
+        self.energy = None       # µJ at the previous read
+        self.read_at = 0.0       # time.monotonic() of the previous read
+
+def total_power(power):
+    """Sum a {name: W} power section without counting RAPL energy twice.
+
+    RAPL core/uncore lie inside their package. The psys (platform) zone covers
+    the packages and DRAM, so when it is present it replaces the other zones.
+    """
+    psys = 'rapl_psys' in power
+    total = 0.0
+    for name, value in power.items():
+        if name.startswith('rapl_'):
+            zone = name[5:]
+            if psys:
+                if zone != 'psys':
+                    continue
+            elif zone.rpartition('_')[2] in RAPL_PACKAGE_SUBZONES and '_' in zone:
+                continue
+        total += value
+    return total
+
+class SensorRegistry:
+    """Discover hwmon and thermal zone sensors once and keep their input files open.
+
+    Labels and device names are resolved at discovery time, so a steady-state
+    read is a single pread() per sensor. The sensor set is rescanned only when
+    a device directory appears or disappears (or a cached descriptor goes stale).
+
+    Every read is timed. Sensors slower than SLOW_SENSOR_SECONDS (SMBus and
+    Super-I/O chips, drivetemp, NVMe behind a busy controller) are read on a
+    small worker pool instead, polled less often the slower they are, and
+    waited for at most SENSOR_READ_TIMEOUT per tick. A slow sensor that was
+    not refreshed in a tick keeps its last value and is listed in `stale`.
+
+    RAPL powercap zones (package, core, uncore, DRAM) join the power
+    category: each tick preads energy_uj and reports the average power since
+    the previous tick, so it follows the sampling rate rather than the
+    hwmon driver's update interval.
+
+    Descriptors are kept open up to fd_budget (an eighth of RLIMIT_NOFILE,
+    next to ProcessScanner's half and CgroupScanner's quarter). Inputs past
+    the budget, or found while the process is out of descriptors, are read
+    with open/read/close instead of being dropped.
+    """
+
+    def __init__(self, hwmon_path=None, thermal_path=None, powercap_path=None):
+        self.hwmon_path = hwmon_path or host_path('/sys/class/hwmon')
+        self.thermal_path = thermal_path or host_path('/sys/class/thermal')
+        self.powercap_path = powercap_path or host_path('/sys/class/powercap')
+        self._hwmon_devices = None
+        self._hwmon_sensors = []
+        self._thermal_zones = None
+        self._thermal_sensors = []
+        self._rapl_zones = None
+        self._rapl_sensors = []
+        soft_limit = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+        if soft_limit == resource.RLIM_INFINITY:
+            soft_limit = 65536
+        self.fd_budget = max(0, soft_limit // 8)
+        self.cached_fds = 0
+        self._fd_shortage = False   # a scan ran out of descriptors and must be retried
+        self._pool = None
+        self.catalog = SensorCatalog()
+        self.stale = frozenset()
+        self._stale_hwmon = frozenset()
+        self._stale_thermal = frozenset()
+
+    def close(self):
+        self._close_inputs(self._hwmon_sensors)
+        self._close_inputs(self._thermal_sensors)
+        self._hwmon_sensors = []
+        self._thermal_sensors = []
+        self._hwmon_devices = None
+        self._thermal_zones = None
+        self._close_rapl()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+    def _close_inputs(self, inputs):
+        for sensor in inputs:
+            if sensor.fd is None:
+                continue
+            self.cached_fds -= 1
+            if sensor.future is not None and not sensor.future.done():
+                # A worker is still blocked in pread(); close after it returns so the fd is not reused early
+                sensor.future.add_done_callback(lambda _, fd=sensor.fd: os.close(fd))
+                continue
+            try:
+                os.close(sensor.fd)
+            except OSError:
+                pass
+
+    def _close_rapl(self):
+        for sensor in self._rapl_sensors:
+            if sensor.fd is None:
+                continue
+            self.cached_fds -= 1
+            try:
+                os.close(sensor.fd)
+            except OSError:
+                pass
+        self._rapl_sensors = []
+        self._rapl_zones = None
+
+    def _open_input(self, path):
+        """Return (fd, readable); fd is None when the input is to be opened on every read"""
+        if self.cached_fds < self.fd_budget:
+            try:
+                INSTRUMENTATION.count_open()
+                fd = os.open(path, os.O_RDONLY)
+            except OSError as e:
+                # Running out of descriptors does not mean the sensor is absent; keep fewer open
+                if e.errno not in (errno.EMFILE, errno.ENFILE):
+                    return None, False
+                self.fd_budget = self.cached_fds // 2
+                self._fd_shortage = True
+            else:
+                self.cached_fds += 1
+                return fd, True
+        return None, os.access(path, os.R_OK)
+
+    def _read_label(self, path):
+        """_read_text() that notes running out of descriptors, so the scan is retried"""
+        try:
+            INSTRUMENTATION.count_open(reads=1)
+            with open(path) as f:
+                return f.read().strip()
+        except OSError as e:
+            if e.errno in (errno.EMFILE, errno.ENFILE):
+                self._fd_shortage = True
+            return None
+
+    def _scan_complete(self):
+        """Whether the scan just run saw every device (False if it ran out of descriptors)"""
+        complete = not self._fd_shortage
+        self._fd_shortage = False
+        return complete
+
+    def _scan_hwmon(self, devices):
+        self._close_inputs(self._hwmon_sensors)
+        self._hwmon_sensors = []
+        self._hwmon_devices = devices
+        for hwmon in devices:
+            hwmon_dir = os.path.join(self.hwmon_path, hwmon)
+            device_name = self._read_label(os.path.join(hwmon_dir, 'name'))
+            if device_name is None:
+                continue
+            try:
+                filenames = os.listdir(hwmon_dir)
+            except OSError as e:
+                if e.errno in (errno.EMFILE, errno.ENFILE):
+                    self._fd_shortage = True
+                continue
+            present = set(filenames)
+            for filename in filenames:
+                if filename.endswith('_input'):
+                    for prefix, category, convert in HWMON_INPUT_TYPES:
+                        sensor_id = filename[len(prefix):-6]
+                        if filename.startswith(prefix) and sensor_id.isdigit():
+                            break
+                    else:
+                        continue
+                    # Fall back to the raw attribute name when there is no usable label
+                    label = None
+                    if f'{prefix}{sensor_id}_label' in present:
+                        label = self._read_label(os.path.join(hwmon_dir, f'{prefix}{sensor_id}_label'))
+                    sensor_name = f"{device_name}_{label}" if label else f"{device_name}_{prefix}{sensor_id}"
+                # PWM sensors (fan speed control), reported as a 0-255 duty cycle
+                elif filename.startswith('pwm') and filename[3:].isdigit():
+                    category = 'pwm'
+                    convert = lambda raw: (raw / 255.0) * 100
+                    sensor_name = f"{device_name}_{filename}"
+                else:
+                    continue
+                path = os.path.join(hwmon_dir, filename)
+                fd, readable = self._open_input(path)
+                if readable:
+                    self._hwmon_sensors.append(_SensorInput(self.catalog.intern(category, sensor_name),
+                                                            category, sensor_name, path, fd, convert))
+        if not self._scan_complete():
+            self._hwmon_devices = None
+
+    def _scan_thermal(self, zones):
+        self._close_inputs(self._thermal_sensors)
+        self._thermal_sensors = []
+        self._thermal_zones = zones
+        for item in zones:
+            zone_path = os.path.join(self.thermal_path, item)
+            zone_type = self._read_label(os.path.join(zone_path, 'type'))
+            if zone_type is None:
+                continue
+            path = os.path.join(zone_path, 'temp')
+            fd, readable = self._open_input(path)
+            if readable:
+                name = f"thermal_{zone_type}"
+                self._thermal_sensors.append(_SensorInput(self.catalog.intern('temps', name), 'temps', name,
+                                                          path, fd, lambda raw: raw / 1000))
+        if not self._scan_complete():
+            self._thermal_zones = None
+
+    def _scan_rapl(self, zones):
+        self._close_rapl()
+        self._rapl_zones = zones
+        names = {}
+        # intel-rapl:N is a package (or psys), intel-rapl:N:M a subzone of it. The MMIO
+        # interface repeats the package zones, so it is only used for names not seen yet.
+        for zone in sorted(zones, key=lambda zone: ('mmio' in zone, zone.count(':'), alphanum_sort_key(zone))):
+            zone_dir = os.path.join(self.powercap_path, zone)
+            zone_name = self._read_label(os.path.join(zone_dir, 'name'))
+            if zone_name is None:
+                continue
+            control_type, _, index = zone.partition(':')
+            parent, _, sub = index.partition(':')
+            if sub:
+                package = names.get(f"{control_type}:{parent}")
+                if package is None:
+                    continue
+                sensor_name = f"{package}_{zone_name}"
+            else:
+                sensor_name = names[zone] = f"rapl_{zone_name}"
+            if any(sensor.name == sensor_name for sensor in self._rapl_sensors):
+                continue
+            try:
+                max_range = int(self._read_label(os.path.join(zone_dir, 'max_energy_range_uj')) or 0)
+            except ValueError:
+                max_range = 0
+            # energy_uj is root-only on kernels since 5.10; such zones are skipped
+            path = os.path.join(zone_dir, 'energy_uj')
+            fd, readable = self._open_input(path)
+            if readable:
+                self._rapl_sensors.append(_RaplInput(self.catalog.intern('power', sensor_name),
+                                                     sensor_name, path, fd, max_range))
+        if not self._scan_complete():
+            self._rapl_zones = None
+
+    def _poll_rapl(self, values):
+        """Write each zone's average power since its previous read into `values`; return whether a zone went away"""
+        vanished = False
+        monotonic = time.monotonic
+        pread = os.pread
+        reads = 0
+        for sensor in self._rapl_sensors:
+            fd = sensor.fd
+            try:
+                raw = pread(fd, 32, 0) if fd is not None else _pread_uncached(sensor.path, 32)
+            except OSError as e:
+                if e.errno in (errno.ENODEV, errno.EBADF, errno.ENOENT):
+                    vanished = True
+                continue
+            now = monotonic()
+            reads += 1
+            try:
+                energy = int(raw)
+            except ValueError:
+                continue
+            previous = sensor.energy
+            if previous is not None and now > sensor.read_at:
+                delta = energy - previous
+                if delta < 0:
+                    # The counter wrapped past max_energy_range_uj since the previous read
+                    delta += sensor.max_range
+                if delta >= 0:
+                    values[sensor.id] = delta / (now - sensor.read_at) / 1000000
+            sensor.energy = energy
+            sensor.read_at = now
+        INSTRUMENTATION.count_read(reads)
+        return vanished
+
+    @staticmethod
+    def _pooled_read(sensor):
+        with INSTRUMENTATION.stage('sensor_worker'):
+            return sensor.timed_read()
+
+    def _poll(self, inputs, values):
+        """Refresh sensor values into the `values` vector, indexed by sensor ID.
+
+        Returns (names left stale, whether a device went away).
+        """
+        vanished = False
+        slow = [sensor for sensor in inputs if sensor.slow]
+        pending = []
+        if slow:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=SENSOR_WORKERS,
+                                                thread_name_prefix='cpu-monitor-sensor')
+            for sensor in slow:
+                # Never queue a second read behind one that is still blocked
+                if sensor.future is None:
+                    sensor.countdown -= 1
+                    if sensor.countdown <= 0:
+                        sensor.future = self._pool.submit(self._pooled_read, sensor)
+                if sensor.future is not None:
+                    pending.append(sensor.future)
+        deadline = time.monotonic() + SENSOR_READ_TIMEOUT
+
+        # Fast sensors are read inline while the pool works on the slow ones
+        perf_counter = time.perf_counter
+        pread = os.pread
+        reads = 0
+        for sensor in inputs:
+            if sensor.slow:
+                continue
+            fd = sensor.fd
+            start = perf_counter()
+            try:
+                raw = pread(fd, 64, 0) if fd is not None else _pread_uncached(sensor.path, 64)
+            except OSError as e:
+                # ENODEV means the device went away under an open descriptor
+                if e.errno in (errno.ENODEV, errno.EBADF, errno.ENOENT):
+                    vanished = True
+                continue
+            elapsed = perf_counter() - start
+            reads += 1
+            try:
+                sensor.value = values[sensor.id] = sensor.convert(int(raw))
+            except ValueError:
+                sensor.value = None
+            if elapsed > SLOW_SENSOR_SECONDS or sensor.latency:
+                sensor.record_latency(elapsed)
+        INSTRUMENTATION.count_read(reads)
+
+        if pending:
+            futures_wait(pending, timeout=max(0.0, deadline - time.monotonic()))
+        stale = set()
+        for sensor in slow:
+            future = sensor.future
+            if future is not None and future.done():
+                sensor.future = None
+                try:
+                    sensor.value, elapsed = future.result()
+                except OSError as e:
+                    if e.errno in (errno.ENODEV, errno.EBADF, errno.ENOENT):
+                        vanished = True
+                    continue
+                sensor.record_latency(elapsed)
+            elif sensor.value is not None:
+                stale.add(sensor.name)
+            if sensor.value is not None:
+                values[sensor.id] = sensor.value
+        return stale, vanished
+
+    def read_sensors(self):
+        """Read hwmon sensors and RAPL power into a new SensorValues vector"""
+        try:
+            devices = tuple(sorted(os.listdir(self.hwmon_path)))
+        except OSError:
+            devices = ()
+        if devices != self._hwmon_devices:
+            self._scan_hwmon(devices)
+        try:
+            zones = tuple(sorted(item for item in os.listdir(self.powercap_path) if ':' in item))
+        except OSError:
+            zones = ()
+        if zones != self._rapl_zones:
+            self._scan_rapl(zones)
+
+        sensors = SensorValues(self.catalog)
+        stale, vanished = self._poll(self._hwmon_sensors, sensors.values)
+        if vanished:
+            self._hwmon_devices = None
+        if self._rapl_sensors and self._poll_rapl(sensors.values):
+            self._rapl_zones = None
+        self._stale_hwmon = frozenset(stale)
+        self.stale = self._stale_hwmon | self._stale_thermal
+        return sensors
+
+    def read_thermal_zones(self, sensors=None):
+        """Read thermal zone temperatures into `sensors` (a new SensorValues if None)"""
+        if sensors is None:
+            sensors = SensorValues(self.catalog)
+        try:
+            zones = tuple(sorted(item for item in os.listdir(self.thermal_path)
+                                 if item.startswith('thermal_zone')))
+        except OSError:
+            return sensors
+        if zones != self._thermal_zones:
+            self._scan_thermal(zones)
+            # Zones interned just now lie past the end of a vector sized before the scan
+            missing = len(self.catalog) - len(sensors.values)
+            if missing > 0:
+                sensors.values.extend(array('d', [math.nan]) * missing)
+
+        stale, vanished = self._poll(self._thermal_sensors, sensors.values)
+        if vanished:
+            self._thermal_zones = None
+        self._stale_thermal = frozenset(stale)
+        self.stale = self._stale_hwmon | self._stale_thermal
+        return sensors
+
+    def slow_sensors(self):
+        """[(name, latency seconds, poll period in ticks)] for sensors read on the pool"""
+        return [(sensor.name, sensor.latency, sensor.period())
+                for sensor in self._hwmon_sensors + self._thermal_sensors if sensor.slow]
+
+_sensor_registry = None
+
+def get_sensor_registry():
+    """Return the process-wide sensor registry, creating it on first use"""
+    global _sensor_registry
+    if _sensor_registry is None:
+        _sensor_registry = SensorRegistry()
+    return _sensor_registry
+
+def read_sensors():
+    return get_sensor_registry().read_sensors()
+
+def alphanum_sort_key(s):
+    return [int(t) if t.isdigit() else t.lower() for t in re.split('([0-9]+)', s)]
+
+def read_thermal_zones(sensors=None):
+    """Read Raspberry Pi thermal zones"""
+    return get_sensor_registry().read_thermal_zones(sensors)
+
+def essential_temperatures(sensors):
+    """Main temperature sensors, in display order, with implausible readings dropped.
+
+    `sensors` is a SensorValues whose catalog already marks the essential
+    sensors. Fan rows are not prepared here: the renderer formats them from
+    the catalog only when they are drawn.
+    """
+    essential_temps = {}
+
+    # Copy essential temperatures to main section, in display order
+    for info, temp_value in sensors.present('temps'):
+        # Filter out clearly invalid temperatures
+        if info.essential and 0 < temp_value < 150:  # Reasonable temperature range
+            essential_temps[info.name] = temp_value
+    return essential_temps
+
+def format_fan_text(label, rpm, pwm_percentage=None):
+    """One fan row: speed plus the duty cycle of its PWM output, if paired"""
+    if pwm_percentage is None:
+        return f"{label}: {rpm:4.0f}rpm"
+    # Show N/A for PWM when RPM is 0 (likely disconnected fan)
+    if rpm == 0:
+        return f"{label}: {rpm:4.0f}rpm (N/A)"
+    return f"{label}: {rpm:4.0f}rpm ({pwm_percentage:3.0f}%)"
+
+SPARK_CHARS = '▁▂▃▄▅▆▇█'
+
+# (label, seconds) windows for incremental history statistics
+HISTORY_WINDOWS = (('10s', 10), ('1m', 60), ('5m', 300))
+
+def sparkline(values, lo=None, hi=None):
+    """Render values as a block-character sparkline scaled to [lo, hi]"""
+    if not values:
+        return ''
+    lo = min(values) if lo is None else lo
+    hi = max(values) if hi is None else hi
+    span = hi - lo
+    top = len(SPARK_CHARS) - 1
+    if span <= 0:
+        return SPARK_CHARS[0] * len(values)
+    return ''.join(SPARK_CHARS[min(top, max(0, int((v - lo) / span * top + 0.5)))] for v in values)
+
+class WindowStats:
+    """Min/max/avg/p95 over the last `size` samples, updated incrementally.
+
+    Keeps a running sum and a sorted copy of the window; each push is one
+    insort and at most one removal, never a rescan of the ring buffer.
+    """
+
+    __slots__ = ('size', 'total', 'ordered')
+
+    def __init__(self, size):
+        self.size = size
+        self.total = 0.0
+        self.ordered = []
+
+    def push(self, value, evicted=None):
+        insort(self.ordered, value)
+        self.total += value
+        if evicted is not None:
+            del self.ordered[bisect_left(self.ordered, evicted)]
+            self.total -= evicted
+
+    def stats(self):
+        """Return (min, max, avg, p95) or None while empty"""
+        ordered = self.ordered
+        count = len(ordered)
+        if not count:
+            return None
+        p95 = ordered[min(count - 1, int(0.95 * (count - 1) + 0.5))]
+        return ordered[0], ordered[-1], self.total / count, p95
+
+class MetricHistory:
+    """Preallocated array-backed ring buffer for one metric plus its window statistics"""
+
+    __slots__ = ('capacity', 'values', 'head', 'count', 'windows')
+
+    def __init__(self, capacity, window_sizes):
+        # Evicted values are read back from the ring, so no window may exceed it
+        assert all(size <= capacity for size in window_sizes.values())
+        self.capacity = capacity
+        self.values = array('d', bytes(8 * self.capacity))
+        self.head = 0
+        self.count = 0
+        self.windows = {label: WindowStats(size) for label, size in window_sizes.items()}
+
+    def push(self, value):
+        for window in self.windows.values():
+            evicted = None
+            if self.count >= window.size:
+                evicted = self.values[(self.head - window.size) % self.capacity]
+            window.push(value, evicted)
+        self.values[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def recent(self, n):
+        """Return up to the last n values, oldest first"""
+        n = min(n, self.count)
+        start = (self.head - n) % self.capacity
+        if start + n <= self.capacity:
+            return self.values[start:start + n].tolist()
+        return self.values[start:].tolist() + self.values[:self.head].tolist()
+
+    def window_stats(self, label):
+        return self.windows[label].stats()
+
+class HistoryStore:
+    """Fixed-memory per-metric history fed from Snapshots.
+
+    Metrics are keyed as ('usage', cpu_id), ('freq', cpu_id) or
+    (sensor category, sensor name). Memory depends only on the depth and
+    the number of metrics, never on how long the monitor has been running.
+    Windows longer than the depth are left out rather than growing the ring.
+    """
+
+    def __init__(self, depth=300, interval=1.0):
+        self.depth = depth
+        sizes = ((label, max(1, round(seconds / interval))) for label, seconds in HISTORY_WINDOWS)
+        self.window_sizes = {label: size for label, size in sizes if size <= depth}
+        self.metrics = {}
+        self._lock = threading.Lock()
+
+    def _push(self, key, value):
+        metric = self.metrics.get(key)
+        if metric is None:
+            metric = self.metrics[key] = MetricHistory(self.depth, self.window_sizes)
+        metric.push(value)
+
+    def record(self, snapshot):
+        with self._lock:
+            for cpu_id, usage in snapshot.cpu_usage.items():
+                self._push(('usage', cpu_id), usage)
+            for cpu_id, freq in snapshot.freqs.items():
+                self._push(('freq', cpu_id), freq)
+            for category in ('temps', 'fans', 'voltages', 'power'):
+                for info, value in snapshot.sensors.present(category):
+                    self._push(info.key, value)
+
+    def sparkline(self, key, width, lo=None, hi=None):
+        with self._lock:
+            metric = self.metrics.get(key)
+            values = metric.recent(width) if metric else []
+        return sparkline(values, lo, hi)
+
+    def window_stats(self, key, label):
+        with self._lock:
+            metric = self.metrics.get(key)
+            return metric.window_stats(label) if metric else None
+
+# One row of the top-process panel; tid equals pid for whole processes
+TopTask = namedtuple('TopTask', ['pid', 'tid', 'name', 'cpu_percent'])
+
+# Ranked TopTask rows plus the mode ('processes' or 'threads') they were ranked in
+TopTasks = namedtuple('TopTasks', ['mode', 'tasks'])
+
+class _TaskState:
+    __slots__ = ('pid', 'tid', 'path', 'fd', 'name', 'ticks', 'polled_at', 'polls', 'cpu_percent', 'next_poll')
+
+    def __init__(self, pid, tid, path):
+        self.pid = pid
+        self.tid = tid
+        self.path = path
+        self.fd = None
+        self.name = ''
+        self.ticks = None
+        self.polled_at = 0.0
+        self.polls = 0
+        self.cpu_percent = 0.0
+        self.next_poll = 0
+
+PROCESS_PANEL_MODES = (None, 'processes', 'threads')
+
+class ProcessScanner:
+    """Top CPU consumers from /proc/[pid]/stat deltas, scanned incrementally.
+
+    - /proc is only listed when the last allocated PID in /proc/loadavg
+      changed, i.e. when tasks were created since the previous scan.
+    - Tasks that used CPU last time are polled every scan; idle ones are
+      polled round-robin every `idle_period` scans, so steady-state cost
+      follows the number of busy tasks rather than the task count.
+    - Tasks seen for a few scans keep their stat file open and are re-read
+      with pread, within a budget of descriptors under RLIMIT_NOFILE.
+    - Top-K selection uses heapq.nlargest instead of a full sort.
+    In 'threads' mode the threads of the busiest processes are ranked instead.
+    """
+
+    CACHE_AFTER_POLLS = 3
+
+    def __init__(self, top_k=10, interval=1.0, idle_period=8):
+        self.top_k = top_k
+        self.interval = interval
+        self.idle_period = idle_period
+        self.mode = None  # None (off), 'processes' or 'threads'
+        self.proc_path = host_path('/proc')
+        self.clk_tck = os.sysconf('SC_CLK_TCK')
+        soft_limit = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+        if soft_limit == resource.RLIM_INFINITY:
+            soft_limit = 65536
+        self.fd_budget = max(0, soft_limit // 2 - 256)
+        self.cached_fds = 0
+        self.polled = 0
+        self.top = None
+        self._processes = {}
+        self._threads = {}
+        self._last_pid = None
+        self._scans = 0
+        self._scanned_at = None
+
+    def _read_last_pid(self):
+        try:
+            INSTRUMENTATION.count_open(reads=1)
+            with open(os.path.join(self.proc_path, 'loadavg'), 'rb') as f:
+                return f.read().split()[-1]
+        except (OSError, IndexError):
+            return None
+
+    def _discover(self):
+        last_pid = self._read_last_pid()
+        if last_pid is not None and last_pid == self._last_pid:
+            return
+        self._last_pid = last_pid
+        try:
+            pids = {int(name) for name in os.listdir(self.proc_path) if name.isdigit()}
+        except OSError:
+            return
+        for pid in pids.difference(self._processes):
+            self._processes[pid] = _TaskState(pid, pid, os.path.join(self.proc_path, str(pid), 'stat'))
+        for pid in set(self._processes).difference(pids):
+            self._forget(self._processes.pop(pid))
+
+    def _forget(self, task):
+        if task.fd is not None:
+            try:
+                os.close(task.fd)
+            except OSError:
+                pass
+            self.cached_fds -= 1
+            task.fd = None
+
+    def _poll(self, task, now):
+        """Re-read one stat file; returns False once the task is gone"""
+        try:
+            if task.fd is not None:
+                INSTRUMENTATION.count_read()
+                data = os.pread(task.fd, 1024, 0)
+            else:
+                INSTRUMENTATION.count_open(reads=1)
+                with open(task.path, 'rb') as f:
+                    data = f.read(1024)
+        except OSError:
+            return False
+        end = data.rfind(b')')
+        fields = data[end + 2:].split()
+        try:
+            ticks = int(fields[11]) + int(fields[12])  # utime + stime
+        except (IndexError, ValueError):
+            return False
+        first_poll = task.ticks is None
+        if first_poll:
+            task.name = data[data.find(b'(') + 1:end].decode(errors='replace')
+            task.cpu_percent = 0.0
+        else:
+            elapsed = now - task.polled_at
+            delta = ticks - task.ticks
+            task.cpu_percent = delta * 100.0 / (elapsed * self.clk_tck) if elapsed > 0 else 0.0
+        task.ticks = ticks
+        task.polled_at = now
+        task.polls += 1
+
+        # New and busy tasks every scan; idle ones staggered across the idle period
+        if first_poll or task.cpu_percent > 0:
+            task.next_poll = self._scans + 1
+        else:
+            task.next_poll = self._scans + self.idle_period - (task.tid + self._scans) % self.idle_period
+
+        if task.fd is None and task.polls >= self.CACHE_AFTER_POLLS and self.cached_fds < self.fd_budget:
+            try:
+                INSTRUMENTATION.count_open()
+                task.fd = os.open(task.path, os.O_RDONLY)
+                self.cached_fds += 1
+            except OSError:
+                pass
+        return True
+
+    def _poll_all(self, tasks, now):
+        polled = 0
+        for key, task in list(tasks.items()):
+            if task.next_poll > self._scans:
+                continue
+            polled += 1
+            if not self._poll(task, now):
+                self._forget(tasks.pop(key))
+        return polled
+
+    def _scan_threads(self, now):
+        busy = heapq.nlargest(self.top_k * 3, self._processes.values(), key=lambda task: task.cpu_percent)
+        wanted = set()
+        for process in busy:
+            if process.cpu_percent <= 0:
+                break
+            task_dir = os.path.join(self.proc_path, str(process.pid), 'task')
+            try:
+                tids = [int(name) for name in os.listdir(task_dir) if name.isdigit()]
+            except OSError:
+                continue
+            for tid in tids:
+                key = (process.pid, tid)
+                wanted.add(key)
+                if key not in self._threads:
+                    self._threads[key] = _TaskState(process.pid, tid, os.path.join(task_dir, str(tid), 'stat'))
+        for key in set(self._threads).difference(wanted):
+            self._forget(self._threads.pop(key))
+        # Threads are few (busiest processes only), so poll them every scan
+        for task in self._threads.values():
+            task.next_poll = self._scans
+        return self._poll_all(self._threads, now)
+
+    def scan(self):
+        """Refresh the top list at most once per interval and return it"""
+        if self.mode is None:
+            if self._processes or self._threads:
+                self.close()
+            return None
+        now = time.monotonic()
+        if self._scanned_at is not None and now - self._scanned_at < self.interval:
+            return self.top
+        self._scanned_at = now
+        self._discover()
+        self.polled = self._poll_all(self._processes, now)
+        if self.mode == 'threads':
+            self.polled += self._scan_threads(now)
+            candidates = self._threads.values()
+        else:
+            candidates = self._processes.values()
+        self._scans += 1
+        self.top = TopTasks(self.mode, [
+            TopTask(task.pid, task.tid, task.name, task.cpu_percent)
+            for task in heapq.nlargest(self.top_k, candidates, key=lambda task: task.cpu_percent)
+            if task.cpu_percent > 0])
+        return self.top
+
+    def close(self):
+        for tasks in (self._processes, self._threads):
+            for task in tasks.values():
+                self._forget(task)
+            tasks.clear()
+        self._last_pid = None
+        self._scanned_at = None
+        self.top = None
+
+# One IRQ line's rate over the last scan and the CPU that took most of it
+IrqRate = namedtuple('IrqRate', ['label', 'description', 'rate', 'cpu'])
+
+# Per-CPU interrupt and softirq rates (/s), the busiest IRQ lines and softirq rates per type
+InterruptRates = namedtuple('InterruptRates', ['irqs', 'softirqs', 'top_irqs', 'softirq_types'])
+
+class _CounterRow:
+    """Last raw text and parsed per-CPU counters of one /proc/interrupts or /proc/softirqs row"""
+
+    __slots__ = ('raw', 'counts', 'description', 'fixed', 'dense')
+
+    def __init__(self, raw, counts, description):
+        self.raw = raw
+        self.counts = counts
+        self.description = description
+        # The kernel prints counters as %10u, so cell j sits at a fixed offset until one outgrows it
+        self.fixed = not counts or max(counts) < 10 ** 10
+        self.dense = False  # most cells moved last time: parse whole, without the XOR probe
+
+# Counter cells after the row label: the digits of CPU column j are raw[1 + 11j:11 + 11j]
+COUNTER_CELL_WIDTH = 11
+# Maps every nonzero byte to 1 so changed positions can be found with bytes.find()
+_NONZERO_TO_ONE = bytes([0]) + bytes([1]) * 255
+
+# Rows with at most ncpus / this many changed bytes are patched cell by cell
+COUNTER_SPARSE_FRACTION = 8
+
+class CounterRows:
+    """Incremental per-CPU deltas for /proc/interrupts-style counter tables.
+
+    Rows whose text is byte-identical to the previous scan are skipped after
+    one comparison. For a changed row, the old and new text are XORed as
+    big integers, and bytes.find() over the nonzero bytes locates the
+    changed cells. Only those cells are parsed. An MSI vector pinned to one CPU therefore costs
+    one int() per scan however many CPUs the host has. Rows with more than
+    1/COUNTER_SPARSE_FRACTION of their bytes changed (LOC, RES, busy queues)
+    skip the per-cell path and are parsed in one split into an array.
+    """
+
+    def __init__(self):
+        self.cpu_ids = ()
+        self._header = None
+        self._rows = {}
+
+    def update(self, data):
+        """Parse a new reading; return (per-CPU delta totals, [(row delta total, label, deltas)]).
+
+        deltas is a list over CPU columns, or a {column: delta} dict for sparsely changed rows.
+        """
+        lines = data.split(b'\n')
+        if lines[0] != self._header:
+            # CPUs went on/offline: start over, this reading only sets the baseline
+            self._header = lines[0]
+            try:
+                self.cpu_ids = tuple(int(token[3:]) for token in lines[0].split())
+            except ValueError:
+                self.cpu_ids = ()
+            self._rows = {}
+        ncpus = len(self.cpu_ids)
+        totals = [0] * ncpus
+        changed = []
+        dense = []   # delta lists of fully parsed rows, summed per column once at the end
+        rows = self._rows
+        width = COUNTER_CELL_WIDTH
+        sparse_limit = ncpus // COUNTER_SPARSE_FRACTION
+        for line in lines[1:] if ncpus else ():
+            label, sep, raw = line.partition(b':')
+            if not sep:
+                continue
+            label = label.strip()
+            row = rows.get(label)
+            if row is not None:
+                old = row.raw
+                if old == raw:
+                    continue
+                if not row.dense and row.fixed and len(old) == len(raw):
+                    diff = (int.from_bytes(raw, 'big') ^ int.from_bytes(old, 'big')).to_bytes(len(raw), 'big')
+                    # Each changed cell has at least one changed byte, so this bounds the cells to parse
+                    if len(diff) - diff.count(0) <= sparse_limit:
+                        marks = diff.translate(_NONZERO_TO_ONE)
+                        cells = []
+                        pos = marks.find(1)
+                        while pos >= 0:
+                            j = (pos - 1) // width
+                            cells.append(j)
+                            pos = marks.find(1, 1 + width * (j + 1))
+                        if cells and 0 <= cells[0] and cells[-1] < ncpus:
+                            deltas = {}
+                            counts = row.counts
+                            try:
+                                for j in cells:
+                                    value = int(raw[1 + width * j:width * (j + 1)])
+                                    deltas[j] = value - counts[j]
+                                    counts[j] = value
+                            except ValueError:
+                                del rows[label]
+                                continue
+                            row.raw = raw
+                            total = sum(deltas.values())
+                            if total:
+                                for j, delta in deltas.items():
+                                    totals[j] += delta
+                                changed.append((total, label, deltas))
+                            continue
+            parts = raw.split(None, ncpus)
+            if len(parts) < ncpus:
+                continue
+            description = parts.pop() if len(parts) > ncpus else b''
+            try:
+                values = list(map(int, parts))
+            except ValueError:
+                continue
+            if row is None:
+                rows[label] = _CounterRow(raw, array('q', values), description)
+                continue
+            deltas = list(map(operator.sub, values, row.counts))
+            row.raw = raw
+            row.description = description
+            # A row that went quiet again returns to the per-cell path on its next change.
+            # Dense rows keep the parsed list: packing it into an array costs as much as the parse.
+            row.dense = ncpus - deltas.count(0) > sparse_limit
+            if row.dense:
+                row.counts = values
+            else:
+                row.counts = array('q', values)
+                row.fixed = max(values) < 10 ** 10
+            total = sum(deltas)
+            if total:
+                dense.append(deltas)
+                changed.append((total, label, deltas))
+        if dense:
+            totals = list(map(operator.add, totals, map(sum, zip(*dense))))
+        return totals, changed
+
+    def labels(self):
+        return self._rows.keys()
+
+    def description(self, label):
+        row = self._rows.get(label)
+        return row.description.decode(errors='replace').strip() if row is not None else ''
+
+class InterruptScanner:
+    """Per-CPU interrupt and softirq rates from /proc/interrupts and /proc/softirqs.
+
+    Both files stay open and are re-read with one pread into a buffer sized
+    from the previous read. This matters on large hosts, where
+    /proc/interrupts is megabytes wide. CounterRows only parses the rows
+    that changed, and the top IRQs are picked from those with
+    heapq.nlargest. Like ProcessScanner, it does nothing until enabled.
+    """
+
+    def __init__(self, top_k=10, interval=1.0):
+        self.top_k = top_k
+        self.interval = interval
+        self.enabled = False
+        self.rates = None
+        self._paths = (host_path('/proc/interrupts'), host_path('/proc/softirqs'))
+        self._fds = [None, None]
+        self._sizes = [65536, 16384]
+        self._irqs = CounterRows()
+        self._softirqs = CounterRows()
+        self._scanned_at = None
+
+    def _read(self, index):
+        fd = self._fds[index]
+        if fd is None:
+            INSTRUMENTATION.count_open()
+            fd = self._fds[index] = os.open(self._paths[index], os.O_RDONLY)
+        while True:
+            INSTRUMENTATION.count_read()
+            data = os.pread(fd, self._sizes[index], 0)
+            if len(data) < self._sizes[index]:
+                return data
+            self._sizes[index] *= 2
+
+    def scan(self):
+        """Refresh the rates at most once per interval and return them"""
+        if not self.enabled:
+            if self._scanned_at is not None:
+                self.close()
+            return None
+        now = time.monotonic()
+        if self._scanned_at is not None and now - self._scanned_at < self.interval:
+            return self.rates
+        try:
+            irq_data, softirq_data = self._read(0), self._read(1)
+        except OSError as e:
+            print(f"Error reading interrupt counters: {e}", file=sys.stderr)
+            self.close()
+            return None
+        irq_totals, irq_rows = self._irqs.update(irq_data)
+        softirq_totals, softirq_rows = self._softirqs.update(softirq_data)
+        prev_at, self._scanned_at = self._scanned_at, now
+        if prev_at is None or now <= prev_at:
+            return self.rates
+
+        scale = 1.0 / (now - prev_at)
+        cpu_ids = self._irqs.cpu_ids
+        top = []
+        for total, label, deltas in heapq.nlargest(self.top_k, irq_rows, key=operator.itemgetter(0)):
+            if isinstance(deltas, dict):
+                busiest = max(deltas, key=deltas.get)
+            else:
+                busiest = max(range(len(deltas)), key=deltas.__getitem__)
+            top.append(IrqRate(label.decode(errors='replace'), self._irqs.description(label),
+                               total * scale, cpu_ids[busiest]))
+        softirq_types = {label.decode(errors='replace'): 0.0 for label in self._softirqs.labels()}
+        for total, label, _ in softirq_rows:
+            softirq_types[label.decode(errors='replace')] = total * scale
+        self.rates = InterruptRates(
+            {cpu_id: total * scale for cpu_id, total in zip(cpu_ids, irq_totals)},
+            {cpu_id: total * scale for cpu_id, total in zip(self._softirqs.cpu_ids, softirq_totals)},
+            top, softirq_types)
+        return self.rates
+
+    def close(self):
+        for i, fd in enumerate(self._fds):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+                self._fds[i] = None
+        self._irqs = CounterRows()
+        self._softirqs = CounterRows()
+        self._scanned_at = None
+        self.rates = None
+
+# One cgroup's CPU use over the last scan: usage and throttled time in % of one CPU,
+# throttling events per second and the cpu.pressure 'some' avg10 (None without PSI)
+CgroupUsage = namedtuple('CgroupUsage', ['path', 'cpu_percent', 'throttle_rate', 'throttled_percent', 'pressure'])
+
+# Busiest cgroups plus how many are tracked and how many cpu.stat files the scan read
+CgroupRates = namedtuple('CgroupRates', ['rows', 'tracked', 'read'])
+
+class _CgroupNode:
+    __slots__ = ('path', 'name', 'fd', 'tree_fd', 'pressure_fd', 'tree', 'children', 'usage', 'nr_throttled',
+                 'throttled_usec', 'polled_at', 'cpu_percent', 'throttle_rate', 'throttled_percent')
+
+    def __init__(self, path, name):
+        self.path = path
+        self.name = name            # relative to the cgroup root
+        self.fd = None              # cpu.stat, kept open within the descriptor budget
+        self.tree_fd = None         # cgroup.stat, likewise
+        self.pressure_fd = None     # cpu.pressure, opened once the cgroup ranks in the top K
+        self.tree = None            # cgroup.stat text when children were last listed
+        self.children = {}
+        self.usage = None
+        self.nr_throttled = 0
+        self.throttled_usec = 0
+        self.polled_at = 0.0
+        self.cpu_percent = 0.0
+        self.throttle_rate = 0.0
+        self.throttled_percent = 0.0
+
+class CgroupScanner:
+    """Per-cgroup CPU usage, throttling and pressure from cgroup v2 cpu.stat deltas.
+
+    The tree under /sys/fs/cgroup is cached. A parent's usage_usec includes
+    all of its descendants, so a cgroup whose usage did not move since the
+    last scan is not descended into: idle subtrees cost nothing, and a
+    subtree can only need a visit when its root shows activity. Throttling
+    implies running, so throttled cgroups are never pruned away. Children
+    are re-listed only when a visited cgroup's cgroup.stat (live and dying
+    descendant counts) changed, or a child disappeared; cgroupfs does not
+    update directory mtimes. cpu.stat and cgroup.stat stay open and are
+    re-read with pread; cpu.pressure is only read for the top K rows.
+    Like InterruptScanner, it does nothing until enabled.
+    """
+
+    def __init__(self, top_k=10, interval=1.0):
+        self.top_k = top_k
+        self.interval = interval
+        self.enabled = False
+        self.root_path = host_path('/sys/fs/cgroup')
+        soft_limit = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+        if soft_limit == resource.RLIM_INFINITY:
+            soft_limit = 65536
+        # ProcessScanner may take half the limit; stay within a quarter
+        self.fd_budget = max(0, soft_limit // 4)
+        self.cached_fds = 0
+        self.tracked = 0
+        self.rates = None
+        self._root = None
+        self._scanned_at = None
+
+    @property
+    def available(self):
+        """cgroup v2 (unified hierarchy) is mounted"""
+        return os.path.exists(os.path.join(self.root_path, 'cgroup.controllers'))
+
+    def _read(self, node, fd_attr, filename):
+        """pread one of the node's files, keeping it open within the budget; None once the cgroup is gone"""
+        fd = getattr(node, fd_attr)
+        try:
+            if fd is None:
+                INSTRUMENTATION.count_open()
+                fd = os.open(os.path.join(node.path, filename), os.O_RDONLY)
+                if self.cached_fds >= self.fd_budget:
+                    try:
+                        INSTRUMENTATION.count_read()
+                        return os.pread(fd, 4096, 0)
+                    finally:
+                        os.close(fd)
+                setattr(node, fd_attr, fd)
+                self.cached_fds += 1
+            INSTRUMENTATION.count_read()
+            return os.pread(fd, 4096, 0)
+        except OSError:
+            return None
+
+    def _update(self, node, now, idle_until=0.0):
+        """Refresh one node's rates; returns whether its subtree used CPU (None if it is gone).
+
+        `idle_until` is the last scan at which an ancestor was seen unchanged:
+        the node cannot have run before then, so its rate window starts there.
+        """
+        data = self._read(node, 'fd', 'cpu.stat')
+        if data is None:
+            return None
+        fields = data.split()
+        stats = dict(zip(fields[::2], fields[1::2]))
+        try:
+            usage = int(stats[b'usage_usec'])
+        except (KeyError, ValueError):
+            return True  # no usable cpu.stat (e.g. an old kernel's root): always descend
+        nr_throttled = int(stats.get(b'nr_throttled', 0))
+        throttled_usec = int(stats.get(b'throttled_usec', 0))
+        first_poll = node.usage is None
+        elapsed = now - max(node.polled_at, idle_until)
+        if first_poll or elapsed <= 0:
+            node.cpu_percent = node.throttle_rate = node.throttled_percent = 0.0
+        else:
+            scale = 1.0 / elapsed
+            node.cpu_percent = (usage - node.usage) * scale * 1e-4
+            node.throttle_rate = (nr_throttled - node.nr_throttled) * scale
+            node.throttled_percent = (throttled_usec - node.throttled_usec) * scale * 1e-4
+        changed = first_poll or usage != node.usage
+        node.usage = usage
+        node.nr_throttled = nr_throttled
+        node.throttled_usec = throttled_usec
+        node.polled_at = now
+        return changed
+
+    def _list_children(self, node, force=False):
+        """Re-list child cgroups if the descendant counts changed since the last listing"""
+        tree = self._read(node, 'tree_fd', 'cgroup.stat')
+        if tree is not None and tree == node.tree and not force:
+            return
+        node.tree = tree
+        try:
+            with os.scandir(node.path) as entries:
+                names = {entry.name for entry in entries if entry.is_dir(follow_symlinks=False)}
+        except OSError:
+            return
+        for name in names.difference(node.children):
+            node.children[name] = _CgroupNode(os.path.join(node.path, name),
+                                              f"{node.name}/{name}" if node.name else name)
+            self.tracked += 1
+        for name in set(node.children).difference(names):
+            self._forget(node.children.pop(name))
+
+    def _forget(self, node):
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            self.tracked -= 1
+            for fd_attr in ('fd', 'tree_fd', 'pressure_fd'):
+                fd = getattr(node, fd_attr)
+                if fd is not None:
+                    try:
+                        os.close(fd)
+                    except OSError:
+                        pass
+                    setattr(node, fd_attr, None)
+                    if fd_attr != 'pressure_fd':
+                        self.cached_fds -= 1
+            stack.extend(node.children.values())
+
+    def _pressure(self, node):
+        """cpu.pressure 'some avg10', or None when PSI is unavailable"""
+        try:
+            if node.pressure_fd is None:
+                INSTRUMENTATION.count_open()
+                node.pressure_fd = os.open(os.path.join(node.path, 'cpu.pressure'), os.O_RDONLY)
+            INSTRUMENTATION.count_read()
+            data = os.pread(node.pressure_fd, 256, 0)
+        except OSError:
+            return None
+        start = data.find(b'avg10=')
+        if start < 0:
+            return None
+        try:
+            return float(data[start + 6:data.index(b' ', start)])
+        except ValueError:
+            return None
+
+    def scan(self):
+        """Refresh the cgroup rates at most once per interval and return them"""
+        if not self.enabled:
+            if self._root is not None:
+                self.close()
+            return None
+        now = time.monotonic()
+        if self._scanned_at is not None and now - self._scanned_at < self.interval:
+            return self.rates
+        self._scanned_at = now
+        if self._root is None:
+            if not self.available:
+                return None
+            self._root = _CgroupNode(self.root_path, '')
+            self.tracked = 1
+
+        visited = []
+        stale_parents = []
+        stack = [(self._root, None, 0.0)]
+        while stack:
+            node, parent, idle_until = stack.pop()
+            # At its previous scan the node either was unchanged (its subtree idle up to then)
+            # or had its children polled as well, so no child window needs to start earlier
+            idle_until = max(idle_until, node.polled_at)
+            changed = self._update(node, now, idle_until)
+            if changed is None:
+                # Removed (possibly replaced within the same count); re-list its parent below
+                stale_parents.append(parent)
+                continue
+            if node is not self._root:
+                visited.append(node)
+            if changed:
+                self._list_children(node)
+                stack.extend((child, node, idle_until) for child in node.children.values())
+        for parent in stale_parents:
+            if parent is not None:
+                self._list_children(parent, force=True)
+        busiest = heapq.nlargest(self.top_k, visited,
+                                 key=lambda node: (node.cpu_percent, node.throttled_percent))
+        self.rates = CgroupRates([
+            CgroupUsage(node.name, node.cpu_percent, node.throttle_rate, node.throttled_percent,
+                        self._pressure(node))
+            for node in busiest if node.cpu_percent > 0 or node.throttle_rate > 0], self.tracked, len(visited) + 1)
+        return self.rates
+
+    def close(self):
+        if self._root is not None:
+            self._forget(self._root)
+        self._root = None
+        self.tracked = 0
+        self.cached_fds = 0
+        self._scanned_at = None
+        self.rates = None
+
+# Immutable view of one sampling pass; dict fields are never mutated after publishing.
+# `timestamp` is wall-clock time; `monotonic` is time.monotonic() at the same moment, when sampled locally
+Snapshot = namedtuple('Snapshot', ['seq', 'timestamp', 'freqs', 'cpu_usage', 'cpu_breakdown',
+                                   'sensors', 'essential_temps', 'freq_source',
+                                   'aggregate', 'top_tasks', 'since_boot', 'stale_sensors', 'interrupts',
+                                   'cgroups', 'monotonic'],
+                      defaults=(None, None, False, frozenset(), None, None, None))
+
+# Per-core peaks over the samples folded into an aggregated Snapshot
+AggregateStats = namedtuple('AggregateStats', ['samples', 'usage_max', 'freqs_max'])
+
+class SampleAggregator:
+    """Fold every sample taken between two display refreshes into mean/max per core.
+
+    At sub-second sample rates the display would otherwise drop most
+    samples (and /proc/stat has only jiffy resolution, so single short
+    samples are noisy). take() returns the latest Snapshot with usage,
+    frequency and the state breakdown replaced by means, plus the peaks.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.count = 0
+        self.latest = None
+        self._usage = {}   # cpu_id -> [sum, max, n]
+        self._freqs = {}
+        self._states = None
+        self._states_ids = None
+        self._states_n = 0
+
+    @staticmethod
+    def _fold(acc, values):
+        for key, value in values.items():
+            entry = acc.get(key)
+            if entry is None:
+                acc[key] = [value, value, 1]
+            else:
+                entry[0] += value
+                if value > entry[1]:
+                    entry[1] = value
+                entry[2] += 1
+
+    def add(self, snapshot):
+        with self._lock:
+            if self.latest is not None and self.latest.since_boot:
+                # Never average the since-boot first sample into live deltas
+                self._reset()
+            self.count += 1
+            self.latest = snapshot
+            self._fold(self._usage, snapshot.cpu_usage)
+            self._fold(self._freqs, snapshot.freqs)
+            breakdown = snapshot.cpu_breakdown
+            if breakdown is None:
+                return
+            if self._states is None or breakdown.cpu_ids != self._states_ids:
+                self._states = {name: list(column) for name, column in breakdown.states.items()}
+                self._states_ids = breakdown.cpu_ids
+                self._states_n = 1
+            else:
+                for name, column in breakdown.states.items():
+                    self._states[name] = list(map(operator.add, self._states[name], column))
+                self._states_n += 1
+
+    def take(self):
+        """Return the aggregated Snapshot since the last take(), or None if no new samples"""
+        with self._lock:
+            if not self.count:
+                return None
+            latest = self.latest
+            cpu_breakdown = latest.cpu_breakdown
+            if self._states is not None and self._states_n > 1:
+                scale = 1.0 / self._states_n
+                states = {name: [pct * scale for pct in column] for name, column in self._states.items()}
+                usage = [min(100.0, max(0.0, 100.0 - pct)) for pct in states['idle']]
+                cpu_breakdown = CpuBreakdown(self._states_ids, usage, states)
+            snapshot = latest._replace(
+                freqs={key: total / n for key, (total, _, n) in self._freqs.items()},
+                cpu_usage={key: total / n for key, (total, _, n) in self._usage.items()},
+                cpu_breakdown=cpu_breakdown,
+                aggregate=AggregateStats(self.count,
+                                         {key: peak for key, (_, peak, _) in self._usage.items()},
+                                         {key: peak for key, (_, peak, _) in self._freqs.items()}))
+            self._reset()
+            return snapshot
+
+# Collectors the overhead budget may run less often; /proc/stat usage is always sampled
+BUDGET_COLLECTORS = ('parse_cpu_frequencies', 'read_sensors', 'scan_processes', 'scan_interrupts', 'scan_cgroups')
+BUDGET_MAX_EVERY = 32
+# Seconds of process CPU time behind each budget decision
+BUDGET_WINDOW = 2.0
+
+class OverheadBudget:
+    """Keep the monitor's own CPU use under `percent` of one CPU.
+
+    Process CPU time (getrusage, all threads) is compared with the budget
+    every BUDGET_WINDOW seconds. Over budget, the collector costing the most
+    CPU per second (its thread CPU time per call times its call rate) is run
+    half as often, down to every BUDGET_MAX_EVERY-th sample; skipped samples
+    reuse its last result. Under budget, the cheapest slowed collector is
+    sped up again if doubling its rate still leaves 20% headroom.
+    """
+
+    def __init__(self, percent, interval):
+        self.percent = percent
+        self.interval = interval
+        self.every = dict.fromkeys(BUDGET_COLLECTORS, 1)
+        self.cost = dict.fromkeys(BUDGET_COLLECTORS, 0.0)  # thread CPU seconds per sample, moving average
+        self.usage = None  # process CPU % over the last window
+        self._spent = {}
+        self._ticks = 0
+        self._window = None
+
+    def due(self, name):
+        return self._ticks % self.every[name] == 0
+
+    @contextmanager
+    def measure(self, name):
+        start = time.thread_time()
+        try:
+            yield
+        finally:
+            self._spent[name] = self._spent.get(name, 0.0) + time.thread_time() - start
+
+    def _rate_cost(self, name):
+        """CPU % of one CPU the collector uses at its current rate"""
+        return self.cost[name] / (self.interval * self.every[name]) * 100
+
+    def tick(self):
+        """Fold the previous sample's costs in; re-plan once per window"""
+        for name, spent in self._spent.items():
+            cost = self.cost[name]
+            self.cost[name] = spent if not cost else cost * 0.8 + spent * 0.2
+        self._spent.clear()
+        self._ticks += 1
+        now = time.monotonic()
+        rusage = resource.getrusage(resource.RUSAGE_SELF)
+        cpu = rusage.ru_utime + rusage.ru_stime
+        if self._window is None:
+            self._window = (now, cpu)
+            return
+        start, start_cpu = self._window
+        if now - start < BUDGET_WINDOW:
+            return
+        self._window = (now, cpu)
+        self.usage = (cpu - start_cpu) / (now - start) * 100
+        if self.usage > self.percent:
+            candidates = [name for name in BUDGET_COLLECTORS
+                          if self.every[name] < BUDGET_MAX_EVERY and self.cost[name] > 0]
+            if candidates:
+                self.every[max(candidates, key=self._rate_cost)] *= 2
+        else:
+            slowed = [name for name in BUDGET_COLLECTORS if self.every[name] > 1]
+            if slowed:
+                # Halving the divisor doubles the rate: it adds as much again as it costs now
+                name = min(slowed, key=self._rate_cost)
+                if self.usage + self._rate_cost(name) < self.percent * 0.8:
+                    self.every[name] //= 2
+
+    def status(self):
+        """'cpu 1.4%/2% slowed read_sensors 1/4' for the status line"""
+        text = f"cpu {'-' if self.usage is None else f'{self.usage:.1f}'}%/{self.percent:g}%"
+        slowed = [f"{name} 1/{every}" for name, every in self.every.items() if every > 1]
+        if slowed:
+            text += " slowed " + ', '.join(slowed)
+        return text
+
+def print_self_report(collector):
+    """Headless exit report: per-stage timings plus the overhead budget state"""
+    lines = INSTRUMENTATION.format_lines()
+    if collector.budget is not None:
+        lines.append(f"overhead budget: {collector.budget.status()}")
+    print('\n'.join(lines), file=sys.stderr)
+
+class SampleCollector:
+    """Sample CPU and sensor data on a background thread and publish Snapshots.
+
+    The UI thread only ever reads `latest`, so slow sysfs reads never block
+    rendering and extra input events never trigger extra sampling.
+    """
+
+    def __init__(self, interval=1.0, freq_reader=None, aggregator=None, process_scanner=None,
+                 interrupt_scanner=None, cgroup_scanner=None, cpu_budget=None):
+        self.interval = interval
+        self.freq_reader = freq_reader if freq_reader is not None else FrequencyReader()
+        self.aggregator = aggregator
+        self.process_scanner = process_scanner
+        self.interrupt_scanner = interrupt_scanner
+        self.cgroup_scanner = cgroup_scanner
+        self.budget = OverheadBudget(cpu_budget, interval) if cpu_budget else None
+        self._last = {}     # collector name -> latest result, reused while the budget skips it
+        self.missed_deadlines = 0
+        self.latest = None
+        self._seq = 0
+        self._prev_cpu_stats = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._updated = threading.Condition()
+
+    def _due(self, name):
+        """Whether collector `name` runs this sample (the overhead budget may skip it)"""
+        return self.budget is None or name not in self._last or self.budget.due(name)
+
+    def _measure(self, name):
+        return self.budget.measure(name) if self.budget is not None else nullcontext()
+
+    def sample(self):
+        """Take one sample synchronously, publish it and return it"""
+        stage = INSTRUMENTATION.stage
+        last = self._last
+        if self.budget is not None:
+            self.budget.tick()
+        if self._due('parse_cpu_frequencies'):
+            with stage('parse_cpu_frequencies'), self._measure('parse_cpu_frequencies'):
+                last['parse_cpu_frequencies'] = self.freq_reader.read()
+        freqs = last['parse_cpu_frequencies']
+        active = self.freq_reader.active
+        freq_source = (active.name, active.cost) if active else None
+        if self._due('read_sensors'):
+            with stage('read_sensors'), self._measure('read_sensors'):
+                sensors = read_sensors()
+
+            # Add thermal zone temperatures for Raspberry Pi
+            with stage('read_thermal_zones'), self._measure('read_sensors'):
+                read_thermal_zones(sensors)
+
+            with stage('essential_temperatures'), self._measure('read_sensors'):
+                essential_temps = essential_temperatures(sensors)
+            last['read_sensors'] = (sensors, get_sensor_registry().stale, essential_temps)
+        sensors, stale_sensors, essential_temps = last['read_sensors']
+
+        # Get CPU stats and calculate usage for all cores at once
+        with stage('parse_cpu_stats'):
+            curr_cpu_stats = parse_cpu_stat_matrix()
+            # The first sample has no predecessor: report since-boot averages instead of waiting
+            since_boot = self._prev_cpu_stats is None
+            prev_cpu_stats = since_boot_baseline(curr_cpu_stats) if since_boot else self._prev_cpu_stats
+            cpu_breakdown = calculate_cpu_breakdown(prev_cpu_stats, curr_cpu_stats)
+        cpu_usage = dict(zip(cpu_breakdown.cpu_ids, cpu_breakdown.usage)) if cpu_breakdown else {}
+        self._prev_cpu_stats = curr_cpu_stats
+
+        # The panel scanners throttle themselves too; the budget can stretch that further
+        for name, scanner in (('scan_processes', self.process_scanner),
+                              ('scan_interrupts', self.interrupt_scanner),
+                              ('scan_cgroups', self.cgroup_scanner)):
+            if scanner is not None and self._due(name):
+                with stage(name), self._measure(name):
+                    last[name] = scanner.scan()
+        top_tasks = last.get('scan_processes')
+        interrupts = last.get('scan_interrupts')
+        cgroups = last.get('scan_cgroups')
+
+        self._seq += 1
+        snapshot = Snapshot(self._seq, time.time(), freqs, cpu_usage, cpu_breakdown,
+                            sensors, essential_temps, freq_source,
+                            top_tasks=top_tasks, since_boot=since_boot, stale_sensors=stale_sensors,
+                            interrupts=interrupts, cgroups=cgroups, monotonic=time.monotonic())
+        if self.aggregator is not None:
+            self.aggregator.add(snapshot)
+        with self._updated:
+            self.latest = snapshot
+            self._updated.notify_all()
+        return snapshot
+
+    def _run(self):
+        # Deadlines advance by whole intervals on the monotonic clock, so sampling
+        # cost and wall-clock jumps never accumulate into drift
+        deadline = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"Unexpected error in sampler: {e}", file=sys.stderr)
+            deadline += self.interval
+            now = time.monotonic()
+            if deadline <= now:
+                # Fell behind (e.g. a slow sensor); skip the missed slots but keep the phase
+                missed = int((now - deadline) / self.interval) + 1
+                deadline += missed * self.interval
+                self.missed_deadlines += missed
+            self._stop.wait(deadline - now)
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='cpu-monitor-sampler', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        with self._updated:
+            self._updated.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def wait_for_update(self, seq, timeout=None):
+        """Block until a snapshot newer than `seq` is published; return the latest snapshot"""
+        with self._updated:
+            self._updated.wait_for(
+                lambda: self._stop.is_set() or (self.latest is not None and self.latest.seq != seq),
+                timeout)
+            return self.latest
+
+RECORD_MAGIC = b'CPUMREC\x01'
+RECORD_VERSION = 2  # 2: row stamps are monotonic offsets from the header's 'start'
+RECORD_READABLE_VERSIONS = (1, 2)  # 1: row stamps are absolute wall-clock times
+RECORD_PREAMBLE = struct.Struct('<8sHI')  # magic, version, metadata length
+
+# Channel kind -> (struct code, scale); the code's extreme value marks a missing sample
+RECORD_ENCODINGS = {
+    'usage': ('H', 100),      # 0.01 %
+    'freq': ('H', 1),         # 1 MHz
+    'temps': ('h', 100),      # 0.01 °C
+    'fans': ('H', 1),         # 1 RPM
+    'pwm': ('H', 100),        # 0.01 %
+    'voltages': ('H', 1000),  # 1 mV
+    'power': ('I', 1000),     # 1 mW
+}
+RECORD_LIMITS = {'H': (0, 0xFFFF), 'h': (-0x8000, 0x7FFF), 'I': (0, 0xFFFFFFFF)}
+RECORD_MISSING = {'H': 0xFFFF, 'h': -0x8000, 'I': 0xFFFFFFFF}
+RECORD_SENSOR_KINDS = ('temps', 'fans', 'pwm', 'voltages', 'power')
+
+def snapshot_channels(snapshot):
+    """Stable (kind, key) channel list describing everything a Snapshot holds"""
+    channels = [('usage', cpu_id) for cpu_id in sorted(snapshot.freqs)]
+    channels += [('freq', cpu_id) for cpu_id in sorted(snapshot.freqs)]
+    for kind in RECORD_SENSOR_KINDS:
+        channels += [info.key for info, _ in snapshot.sensors.present(kind)]
+    return channels
+
+def record_row_struct(channels):
+    return struct.Struct('<d' + ''.join(RECORD_ENCODINGS[kind][0] for kind, _ in channels))
+
+class Recorder:
+    """Append Snapshots to a fixed-schema binary recording.
+
+    The file starts with RECORD_PREAMBLE and a JSON metadata block holding
+    the channel dictionary, written once. Every sample after that is one
+    struct-packed row: a float64 timestamp followed by one scaled integer
+    per channel. All rows are the same size, so a reader can index any
+    sample directly. Sensors that appear after recording starts are not
+    part of the schema; sensors that disappear are stored as missing.
+
+    Row timestamps are seconds since the wall-clock 'start' in the
+    metadata, measured on the monotonic clock, so a wall-clock step during
+    a recording cannot make them go backwards and break seeking.
+    """
+
+    def __init__(self, f, first_snapshot, model_name='', interval=1.0):
+        self.f = f
+        self.channels = snapshot_channels(first_snapshot)
+        self.row = record_row_struct(self.channels)
+        self.rows = 0
+        self.start = first_snapshot.timestamp
+        self._start_monotonic = first_snapshot.monotonic
+        self._last_offset = 0.0
+        self._encoders = []
+        catalog = first_snapshot.sensors.catalog
+        for kind, key in self.channels:
+            code, scale = RECORD_ENCODINGS[kind]
+            low, high = RECORD_LIMITS[code]
+            missing = RECORD_MISSING[code]
+            # Keep the missing marker out of the valid range
+            if missing == low:
+                low += 1
+            else:
+                high -= 1
+            # Sensors are looked up by catalog ID; cores by CPU number
+            key = catalog.lookup(kind, key) if kind in SENSOR_CATEGORIES else key
+            self._encoders.append((kind, key, scale, low, high, missing))
+
+        metadata = json.dumps({
+            'model': model_name,
+            'interval': interval,
+            'start': self.start,
+            'channels': [[kind, key] for kind, key in self.channels],
+        }).encode()
+        f.write(RECORD_PREAMBLE.pack(RECORD_MAGIC, RECORD_VERSION, len(metadata)))
+        f.write(metadata)
+
+    def write(self, snapshot):
+        if snapshot.monotonic is not None and self._start_monotonic is not None:
+            offset = snapshot.monotonic - self._start_monotonic
+        else:
+            offset = snapshot.timestamp - self.start
+        # Never step back, even for snapshots without a monotonic stamp
+        offset = self._last_offset = max(offset, self._last_offset)
+        values = [offset]
+        sensors = snapshot.sensors
+        for kind, key, scale, low, high, missing in self._encoders:
+            if kind == 'usage':
+                value = snapshot.cpu_usage.get(key)
+            elif kind == 'freq':
+                value = snapshot.freqs.get(key)
+            else:
+                value = sensors.value(key)
+            if value is None:
+                values.append(missing)
+            else:
+                values.append(min(high, max(low, round(value * scale))))
+        self.f.write(self.row.pack(*values))
+        self.rows += 1
+
+    def close(self):
+        self.f.close()
+
+class _RowTimestamps:
+    """Sequence view of row timestamps read straight from the mapping, for bisect"""
+
+    def __init__(self, reader):
+        self.reader = reader
+
+    def __len__(self):
+        return len(self.reader)
+
+    def __getitem__(self, index):
+        return self.reader.timestamp(index)
+
+class RecordingReader:
+    """Memory-mapped, random-access reader for files written by Recorder.
+
+    Nothing is loaded up front: rows are fixed-size, so sample i lives at a
+    computed offset, and seeking by time is a binary search over the row
+    timestamps that only touches O(log n) pages of the mapping.
+    """
+
+    _timestamp = struct.Struct('<d')
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"{path}: empty recording")
+        try:
+            magic, version, metadata_len = RECORD_PREAMBLE.unpack_from(self._mm, 0)
+        except struct.error:
+            magic = None  # shorter than the preamble
+        if magic != RECORD_MAGIC or version not in RECORD_READABLE_VERSIONS:
+            self.close()
+            raise ValueError(f"{path}: not a cpu_monitor recording")
+        metadata_start = RECORD_PREAMBLE.size
+        try:
+            metadata = json.loads(self._mm[metadata_start:metadata_start + metadata_len])
+            self.model_name = metadata.get('model', '')
+            self.interval = metadata.get('interval', 1.0)
+            self.start = float(metadata['start']) if version >= 2 else 0.0
+            self.channels = [(kind, key) for kind, key in metadata['channels']]
+            self.row = record_row_struct(self.channels)
+            self.catalog = SensorCatalog()
+            self._decoders = [(kind, self.catalog.intern(kind, key) if kind in SENSOR_CATEGORIES else key,
+                               RECORD_ENCODINGS[kind][1], RECORD_MISSING[RECORD_ENCODINGS[kind][0]])
+                              for kind, key in self.channels]
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            self.close()
+            raise ValueError(f"{path}: damaged recording metadata ({e})")
+        self.data_offset = metadata_start + metadata_len
+        self.timestamps = _RowTimestamps(self)
+
+    def __len__(self):
+        # A partially written trailing row is ignored
+        return (len(self._mm) - self.data_offset) // self.row.size
+
+    def timestamp(self, index):
+        """Wall-clock time of row `index`"""
+        return self.start + self._timestamp.unpack_from(self._mm, self.data_offset + index * self.row.size)[0]
+
+    def index_at(self, timestamp):
+        """Index of the last sample at or before `timestamp` (clamped to the recording)"""
+        index = bisect_right(self.timestamps, timestamp) - 1
+        return min(max(index, 0), len(self) - 1)
+
+    def snapshot(self, index):
+        """Decode row `index` into a Snapshot for the regular renderer"""
+        values = self.row.unpack_from(self._mm, self.data_offset + index * self.row.size)
+        freqs = {}
+        cpu_usage = {}
+        sensors = SensorValues(self.catalog)
+        vector = sensors.values
+        for (kind, key, scale, missing), raw in zip(self._decoders, values[1:]):
+            if raw == missing:
+                continue
+            if kind == 'usage':
+                cpu_usage[key] = raw / scale
+            elif kind == 'freq':
+                freqs[key] = raw / scale
+            else:
+                vector[key] = raw / scale
+        return Snapshot(index, self.start + values[0], freqs, cpu_usage, None, sensors,
+                        essential_temperatures(sensors), None)
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+def run_record(path, interval=1.0, freq_backend='auto', cpu_budget=None):
+    """Headless recording loop; runs until interrupted (Ctrl-C or SIGTERM)"""
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    lscpu_info = get_lscpu_info()
+    collector = SampleCollector(interval=interval, freq_reader=FrequencyReader(freq_backend), cpu_budget=cpu_budget)
+    recorder = None
+    try:
+        collector.start()
+        seq = None
+        last_flush = time.monotonic()
+        while True:
+            snapshot = collector.wait_for_update(seq)
+            seq = snapshot.seq
+            if snapshot.since_boot:
+                # The first sample is the since-boot average, not a live interval
+                continue
+            if recorder is None:
+                # Taken after a full interval, so RAPL zones (which need two reads) are in the schema
+                recorder = Recorder(open(path, 'wb', buffering=1 << 16), snapshot,
+                                    lscpu_info.get('Model name', 'Unknown CPU'), interval)
+            with INSTRUMENTATION.stage('record_write'):
+                recorder.write(snapshot)
+            now = time.monotonic()
+            if now - last_flush >= 1.0:
+                recorder.f.flush()
+                last_flush = now
+    except KeyboardInterrupt:
+        pass
+    finally:
+        collector.stop()
+        if recorder is not None:
+            recorder.close()
+            print(f"Recorded {recorder.rows} samples of {len(recorder.channels)} channels to {path}",
+                  file=sys.stderr)
+        print_self_report(collector)
+
+STREAM_FORMATS = ('json', 'csv')
+
+def _stream_value_format(kind):
+    """printf format showing a channel at its recording precision"""
+    return f"%.{len(str(RECORD_ENCODINGS[kind][1])) - 1}f"
+
+class StreamWriter:
+    """Serialize Snapshots as NDJSON or CSV lines with a fixed layout.
+
+    The columns (timestamp, usage and frequency per core, then every
+    sensor) come from the first snapshot, like Recorder. The header and one
+    %-template per line are built from them once, so a tick is a few
+    C-level lookups and a single string format. Sensors that appear
+    later are not part of the layout; missing values are written as null
+    (JSON) or an empty field (CSV).
+    """
+
+    def __init__(self, f, first_snapshot, fmt='json'):
+        self.f = f
+        self.fmt = fmt
+        self.rows = 0
+        self.channels = snapshot_channels(first_snapshot)
+        self._groups = []   # (kind, keys) in channel order
+        for kind, key in self.channels:
+            if not self._groups or self._groups[-1][0] != kind:
+                self._groups.append((kind, []))
+            self._groups[-1][1].append(key)
+        # Per tick, sensors are picked from the value vector by catalog ID in one C-level call
+        catalog = first_snapshot.sensors.catalog
+        self._sources = []
+        for kind, keys in self._groups:
+            if kind not in ('usage', 'freq'):
+                ids = [catalog.lookup(kind, key) for key in keys]
+                # One spare trailing ID keeps the result a tuple even for a single sensor
+                keys = operator.itemgetter(*ids, ids[0])
+            self._sources.append((kind, keys))
+
+        formats = ['%.3f'] + [_stream_value_format(kind) for kind, _ in self.channels]
+        if fmt == 'csv':
+            import csv
+            header = io.StringIO()
+            csv.writer(header, lineterminator='\n').writerow(
+                ['timestamp'] + [f"{kind}_cpu{key}" if kind in ('usage', 'freq') else f"{kind}_{key}"
+                                 for kind, key in self.channels])
+            f.write(header.getvalue())
+            literals = [''] + [','] * len(self.channels) + ['\n']
+            self._missing = ''
+        else:
+            # literals[i] is the text before value i; keys are escaped for JSON and for %
+            literals = ['{"timestamp":']
+            closing = ''
+            for kind, keys in self._groups:
+                opening = f'{closing},"{kind}":{{'
+                for key in keys:
+                    literals.append(f"{opening}{json.dumps(str(key)).replace('%', '%%')}:")
+                    opening = ','
+                closing = '}'
+            literals.append(closing + '}\n')
+            self._missing = 'null'
+        self._formats = formats
+        self._template = ''.join(map(operator.add, literals, formats)) + literals[-1]
+        # The slow path for rows with gaps: every slot becomes %s
+        self._text_template = '%s'.join(literals)
+
+    def format(self, snapshot):
+        values = [snapshot.timestamp]
+        sensors = snapshot.sensors
+        for kind, keys in self._sources:
+            if kind == 'usage':
+                values.extend(map(snapshot.cpu_usage.get, keys))
+            elif kind == 'freq':
+                values.extend(map(snapshot.freqs.get, keys))
+            else:
+                picked = keys(sensors.values)[:-1]
+                total = sum(picked)
+                if total != total:
+                    # NaN marks a sensor missing this tick
+                    picked = [None if value != value else value for value in picked]
+                values.extend(picked)
+        if None not in values:
+            return self._template % tuple(values)
+        missing = self._missing
+        return self._text_template % tuple(missing if value is None else code % value
+                                          for code, value in zip(self._formats, values))
+
+    def write_batch(self, snapshots):
+        self.f.write(''.join(map(self.format, snapshots)))
+        self.f.flush()
+        self.rows += len(snapshots)
+
+def run_stream(fmt='json', interval=1.0, count=None, freq_backend='auto', cpu_budget=None):
+    """Headless vmstat-style output: one NDJSON or CSV record per sample on stdout.
+
+    The since-boot first sample is not written, so every record covers one
+    interval. Lines are flushed in batches of about one second's worth of
+    samples. Runs until `count` records are written or it is interrupted.
+    """
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    collector = SampleCollector(interval=interval, freq_reader=FrequencyReader(freq_backend), cpu_budget=cpu_budget)
+    writer = None
+    batch = []
+    batch_size = max(1, round(1.0 / interval))
+    dropped = 0
+    try:
+        collector.start()
+        seq = None
+        while count is None or (writer.rows if writer else 0) + len(batch) < count:
+            snapshot = collector.wait_for_update(seq)
+            if seq is not None and snapshot.seq > seq + 1:
+                # The sampler published again before this loop came back for the previous one
+                dropped += snapshot.seq - seq - 1
+            seq = snapshot.seq
+            if snapshot.since_boot or not snapshot.cpu_usage:
+                continue
+            if writer is None:
+                writer = StreamWriter(sys.stdout, snapshot, fmt)
+            batch.append(snapshot)
+            if len(batch) >= batch_size:
+                with INSTRUMENTATION.stage('stream_write'):
+                    writer.write_batch(batch)
+                batch = []
+    except KeyboardInterrupt:
+        pass
+    except BrokenPipeError:
+        # The reader went away (e.g. `| head`); silence the flush at interpreter exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        batch = []
+    finally:
+        collector.stop()
+        if writer is not None and batch:
+            try:
+                with INSTRUMENTATION.stage('stream_write'):
+                    writer.write_batch(batch)
+            except BrokenPipeError:
+                os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        if dropped:
+            print(f"{dropped} samples were taken faster than they could be written and were skipped",
+                  file=sys.stderr)
+        print_self_report(collector)
+
+OPENMETRICS_CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Sensor category -> (metric name, help text, scale to base unit)
+EXPORTER_SENSOR_METRICS = (
+    ('temps', 'cpu_monitor_temperature_celsius', 'Sensor temperature', 1),
+    ('fans', 'cpu_monitor_fan_speed_rpm', 'Fan speed', 1),
+    ('pwm', 'cpu_monitor_fan_pwm_ratio', 'Fan PWM duty cycle', 0.01),
+    ('voltages', 'cpu_monitor_voltage_volts', 'Sensor voltage', 1),
+    ('power', 'cpu_monitor_power_watts', 'Sensor power draw', 1),
+)
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class MetricsExporter:
+    """Pre-render OpenMetrics exposition text from the latest Snapshot.
+
+    Rendering happens once per sample on the exporter thread; scrapes only
+    return the cached bytes, so any number of scrapers never trigger extra
+    sysfs reads. Series prefixes (name plus label set) are built once per
+    core or sensor and reused.
+    """
+
+    def __init__(self, collector):
+        self.collector = collector
+        self.body = b"# EOF\n"
+        self.scrapes = 0
+        self._series = {}
+        self._thread = None
+        self._stop = threading.Event()
+
+    def _prefix(self, metric, labels):
+        key = (metric, labels)
+        prefix = self._series.get(key)
+        if prefix is None:
+            label_text = ','.join(f'{name}="{_escape_label(value)}"' for name, value in labels)
+            prefix = self._series[key] = f"{metric}{{{label_text}}} "
+        return prefix
+
+    def _family(self, lines, metric, help_text, samples, unit=None):
+        lines.append(f"# TYPE {metric} gauge")
+        if unit:
+            lines.append(f"# UNIT {metric} {unit}")
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.extend(samples)
+
+    def render(self, snapshot):
+        lines = []
+        cpu_ids = sorted(snapshot.freqs)
+        self._family(lines, 'cpu_monitor_core_usage_ratio', "Per-core busy time ratio", [
+            f"{self._prefix('cpu_monitor_core_usage_ratio', (('cpu', cpu_id),))}{snapshot.cpu_usage[cpu_id] / 100:.4f}"
+            for cpu_id in cpu_ids if cpu_id in snapshot.cpu_usage])
+        if snapshot.cpu_breakdown is not None:
+            samples = []
+            for state, column in snapshot.cpu_breakdown.states.items():
+                for cpu_id, pct in zip(snapshot.cpu_breakdown.cpu_ids, column):
+                    samples.append(f"{self._prefix('cpu_monitor_core_state_ratio', (('cpu', cpu_id), ('state', state)))}"
+                                   f"{pct / 100:.4f}")
+            self._family(lines, 'cpu_monitor_core_state_ratio', "Per-core time ratio by CPU state", samples)
+        self._family(lines, 'cpu_monitor_core_frequency_hertz', "Per-core clock frequency", [
+            f"{self._prefix('cpu_monitor_core_frequency_hertz', (('cpu', cpu_id),))}{snapshot.freqs[cpu_id] * 1e6:.0f}"
+            for cpu_id in cpu_ids], unit='hertz')
+        for category, metric, help_text, scale in EXPORTER_SENSOR_METRICS:
+            values = snapshot.sensors.present(category)
+            if values:
+                self._family(lines, metric, help_text, [
+                    f"{self._prefix(metric, (('sensor', info.name),))}{value * scale:g}"
+                    for info, value in values])
+        self._family(lines, 'cpu_monitor_sample_timestamp_seconds', "Time the snapshot was sampled",
+                     [f"cpu_monitor_sample_timestamp_seconds {snapshot.timestamp:.3f}"], unit='seconds')
+        self._render_instrumentation(lines)
+        lines.append("# EOF\n")
+        self.body = '\n'.join(lines).encode()
+
+    def _render_instrumentation(self, lines):
+        """The monitor's own per-stage timings and I/O counts"""
+        metric = 'cpu_monitor_stage_duration_seconds'
+        lines.append(f"# TYPE {metric} summary")
+        lines.append(f"# UNIT {metric} seconds")
+        lines.append(f"# HELP {metric} Monitor stage duration over a rolling window")
+        counters = []
+        for name, stats in list(INSTRUMENTATION.stages.items()):
+            p50, p99 = stats.percentiles()
+            for quantile, value in (('0.5', p50), ('0.99', p99)):
+                lines.append(f"{self._prefix(metric, (('stage', name), ('quantile', quantile)))}{value:.6f}")
+            lines.append(f"{metric}_count{{stage=\"{_escape_label(name)}\"}} {stats.calls}")
+            lines.append(f"{metric}_sum{{stage=\"{_escape_label(name)}\"}} {stats.total_time:.6f}")
+            counters.append((name, stats))
+        for counter, attr, help_text in (('cpu_monitor_stage_file_opens', 'opens', "Files opened by stage"),
+                                         ('cpu_monitor_stage_file_reads', 'reads', "File reads by stage")):
+            lines.append(f"# TYPE {counter} counter")
+            lines.append(f"# HELP {counter} {help_text}")
+            lines.extend(f"{counter}_total{{stage=\"{_escape_label(name)}\"}} {getattr(stats, attr)}"
+                         for name, stats in counters)
+
+    def _run(self):
+        seq = None
+        while not self._stop.is_set():
+            snapshot = self.collector.wait_for_update(seq, timeout=1.0)
+            if snapshot is None or snapshot.seq == seq:
+                continue
+            seq = snapshot.seq
+            if snapshot.since_boot:
+                # Gauges would otherwise show the since-boot average for the first interval
+                continue
+            with INSTRUMENTATION.stage('export_render'):
+                self.render(snapshot)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='cpu-monitor-exporter', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+class MetricsHandler:
+    """Serve the exporter's cached exposition on /metrics.
+
+    A mixin for BaseHTTPRequestHandler; http.server is only imported by
+    run_serve() so it does not slow down the other modes' startup.
+    """
+
+    exporter = None
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.exporter.body
+        self.exporter.scrapes += 1
+        accept = self.headers.get('Accept', '')
+        self.send_response(200)
+        self.send_header('Content-Type', OPENMETRICS_CONTENT_TYPE if 'openmetrics' in accept
+                         else PROMETHEUS_CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def run_serve(port, bind='', interval=1.0, freq_backend='auto', cpu_budget=None):
+    """Headless OpenMetrics exporter; runs until interrupted (Ctrl-C or SIGTERM)"""
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    collector = SampleCollector(interval=interval, freq_reader=FrequencyReader(freq_backend),
+                                cpu_budget=cpu_budget).start()
+    exporter = MetricsExporter(collector).start()
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    handler = type('BoundMetricsHandler', (MetricsHandler, BaseHTTPRequestHandler), {'exporter': exporter})
+    server = ThreadingHTTPServer((bind, port), handler)
+    server.daemon_threads = True
+    print(f"Serving OpenMetrics on http://{bind or '0.0.0.0'}:{port}/metrics", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        # Stopping the collector first wakes the exporter thread immediately
+        collector.stop()
+        exporter.stop()
+        print_self_report(collector)
+
+SHARED_MAGIC = b'CPUMSHM\x01'
+SHARED_VERSION = 2
+# magic, version, metadata length, seqlock counter (odd while a write is in progress), payload length
+SHARED_HEADER = struct.Struct('<8sHxxIQI4x')
+SHARED_SEQ = struct.Struct('<Q')
+SHARED_SEQ_OFFSET = 16
+SHARED_LENGTH = struct.Struct('<I')
+SHARED_LENGTH_OFFSET = 24
+DEFAULT_SHARED_PATH = '/dev/shm/cpu_monitor'
+
+def encode_shared_snapshot(snapshot):
+    """Snapshot -> JSON-ready lists; dict keys such as CPU numbers are kept as pairs so they stay ints"""
+    breakdown = snapshot.cpu_breakdown
+    top_tasks = snapshot.top_tasks
+    interrupts = snapshot.interrupts
+    return {
+        'seq': snapshot.seq,
+        'timestamp': snapshot.timestamp,
+        'freqs': list(snapshot.freqs.items()),
+        'usage': list(snapshot.cpu_usage.items()),
+        'breakdown': None if breakdown is None else
+            [list(breakdown.cpu_ids), list(breakdown.usage),
+             {name: list(column) for name, column in breakdown.states.items()}],
+        'sensors': {category: [(info.name, value) for info, value in snapshot.sensors.present(category)]
+                    for category in SENSOR_CATEGORIES},
+        'essential_temps': list(snapshot.essential_temps.items()),
+        'freq_source': snapshot.freq_source,
+        'top_tasks': None if top_tasks is None else [top_tasks.mode, top_tasks.tasks],
+        'since_boot': snapshot.since_boot,
+        'stale': sorted(snapshot.stale_sensors),
+        'interrupts': None if interrupts is None else
+            [list(interrupts.irqs.items()), list(interrupts.softirqs.items()), interrupts.top_irqs,
+             list(interrupts.softirq_types.items())],
+        'cgroups': snapshot.cgroups,
+    }
+
+def decode_shared_snapshot(data, catalog):
+    """Inverse of encode_shared_snapshot(); sensors are interned into the viewer's `catalog`"""
+    breakdown = data['breakdown']
+    top_tasks = data['top_tasks']
+    interrupts = data['interrupts']
+    cgroups = data.get('cgroups')
+    return Snapshot(
+        data['seq'], data['timestamp'], dict(data['freqs']), dict(data['usage']),
+        None if breakdown is None else CpuBreakdown(tuple(breakdown[0]), breakdown[1], breakdown[2]),
+        SensorValues.from_dicts(catalog, {category: dict(pairs) for category, pairs in data['sensors'].items()}),
+        dict(data['essential_temps']),
+        tuple(data['freq_source']) if data['freq_source'] else None,
+        top_tasks=None if top_tasks is None else TopTasks(top_tasks[0], [TopTask(*task) for task in top_tasks[1]]),
+        since_boot=data['since_boot'], stale_sensors=frozenset(data['stale']),
+        interrupts=None if interrupts is None else
+            InterruptRates(dict(interrupts[0]), dict(interrupts[1]), [IrqRate(*irq) for irq in interrupts[2]],
+                           dict(interrupts[3])),
+        cgroups=None if cgroups is None else
+            CgroupRates([CgroupUsage(*row) for row in cgroups[0]], cgroups[1], cgroups[2]))
+
+class SnapshotPublisher:
+    """Publish the latest Snapshot into a memory-mapped file (normally on /dev/shm).
+
+    The file holds SHARED_HEADER, a JSON metadata block written once (model,
+    CPU info, interval, pid) and the JSON-encoded latest snapshot. Writes are
+    guarded by a seqlock: the counter in the header is odd while the payload
+    is being rewritten, so readers never take a lock and simply retry a copy
+    that overlapped a write. The file is created under a temporary name and
+    renamed into place, and an exclusive flock marks the publisher as alive.
+    """
+
+    def __init__(self, path, metadata):
+        self.path = path
+        self.seq = 0
+        try:
+            with open(path, 'rb') as existing:
+                fcntl.flock(existing.fileno(), fcntl.LOCK_SH | fcntl.LOCK_NB)
+        except FileNotFoundError:
+            pass
+        except BlockingIOError:
+            raise OSError(errno.EBUSY, "another publisher is running")
+        # mkstemp creates the file with O_EXCL under an unpredictable name, so a
+        # file or symlink planted in a shared directory like /dev/shm is never opened
+        self._fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.',
+                                              dir=os.path.dirname(path) or '.')
+        try:
+            os.fchmod(self._fd, 0o644)
+            fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            self._metadata = json.dumps(metadata).encode()
+            self.payload_offset = SHARED_HEADER.size + len(self._metadata)
+            size = max(mmap.PAGESIZE, -(-self.payload_offset // mmap.PAGESIZE) * mmap.PAGESIZE)
+            os.ftruncate(self._fd, size)
+            self._mm = mmap.mmap(self._fd, size)
+            SHARED_HEADER.pack_into(self._mm, 0, SHARED_MAGIC, SHARED_VERSION, len(self._metadata), 0, 0)
+            self._mm[SHARED_HEADER.size:self.payload_offset] = self._metadata
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.close(self._fd)
+            os.unlink(tmp_path)
+            raise
+
+    def publish(self, snapshot):
+        payload = json.dumps(encode_shared_snapshot(snapshot), separators=(',', ':')).encode()
+        end = self.payload_offset + len(payload)
+        if end > len(self._mm):
+            # Readers notice the longer payload and remap; tmpfs only backs the pages written
+            size = -(-end * 2 // mmap.PAGESIZE) * mmap.PAGESIZE
+            os.ftruncate(self._fd, size)
+            self._mm.resize(size)
+        mm = self._mm
+        self.seq += 1
+        SHARED_SEQ.pack_into(mm, SHARED_SEQ_OFFSET, self.seq)
+        SHARED_LENGTH.pack_into(mm, SHARED_LENGTH_OFFSET, len(payload))
+        mm[self.payload_offset:end] = payload
+        self.seq += 1
+        SHARED_SEQ.pack_into(mm, SHARED_SEQ_OFFSET, self.seq)
+
+    def close(self):
+        try:
+            # Only remove the file if it is still ours (not replaced by a newer publisher)
+            if os.stat(self.path).st_ino == os.fstat(self._fd).st_ino:
+                os.unlink(self.path)
+        except OSError:
+            pass
+        self._mm.close()
+        os.close(self._fd)
+
+class SharedSnapshotReader:
+    """Read-only view of a SnapshotPublisher file.
+
+    take() mirrors SampleAggregator.take() so draw() can use either: it
+    returns the newest published Snapshot, or None when nothing new was
+    published since the last call. A file replaced by a restarted publisher
+    is picked up by comparing inode numbers. The default path lives in the
+    world-writable /dev/shm, so a file there is only trusted when it belongs
+    to the current user or root.
+    """
+
+    RETRIES = 100
+
+    def __init__(self, path):
+        self.path = path
+        self.check_owner = os.path.abspath(path) == DEFAULT_SHARED_PATH
+        self.catalog = SensorCatalog()
+        self._file = None
+        self._mm = None
+        self._seq = None
+        self._open()
+
+    def _open(self):
+        # Validate the new file before dropping the old one, so a bad
+        # replacement leaves take() showing the last good snapshot
+        f = open(self.path, 'rb')
+        try:
+            st = os.fstat(f.fileno())
+            if self.check_owner and st.st_uid not in (0, os.getuid()):
+                raise ValueError(f"{self.path}: owned by uid {st.st_uid}, not by this user")
+            try:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise ValueError(f"{self.path}: not a cpu_monitor shared snapshot")
+            try:
+                magic, version, metadata_len, _, _ = SHARED_HEADER.unpack_from(mm, 0)
+                if magic != SHARED_MAGIC or version != SHARED_VERSION:
+                    raise struct.error
+                payload_offset = SHARED_HEADER.size + metadata_len
+                metadata = json.loads(mm[SHARED_HEADER.size:payload_offset])
+            except (ValueError, struct.error):
+                mm.close()
+                raise ValueError(f"{self.path}: not a cpu_monitor shared snapshot")
+        except BaseException:
+            f.close()
+            raise
+        self.close()
+        self._file, self._mm = f, mm
+        self.payload_offset = payload_offset
+        self.metadata = metadata
+        self._inode = st.st_ino
+        self._seq = None
+
+    def publisher_alive(self):
+        """Whether a publisher still holds the file's lock"""
+        try:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_SH | fcntl.LOCK_NB)
+        except OSError:
+            return True
+        fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        return False
+
+    def take(self):
+        try:
+            if os.stat(self.path).st_ino != self._inode:
+                self._open()
+        except (OSError, ValueError):
+            pass  # keep showing the last snapshot until a publisher is back
+        for _ in range(self.RETRIES):
+            seq = SHARED_SEQ.unpack_from(self._mm, SHARED_SEQ_OFFSET)[0]
+            if seq == self._seq or seq == 0:
+                return None
+            if seq & 1:
+                time.sleep(0.0005)
+                continue
+            length = SHARED_LENGTH.unpack_from(self._mm, SHARED_LENGTH_OFFSET)[0]
+            end = self.payload_offset + length
+            if end > len(self._mm):
+                self._mm.close()
+                self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+                continue
+            payload = self._mm[self.payload_offset:end]
+            if SHARED_SEQ.unpack_from(self._mm, SHARED_SEQ_OFFSET)[0] != seq:
+                continue
+            try:
+                data = json.loads(payload)
+            except ValueError:
+                continue  # a torn copy the counter did not catch; try again
+            self._seq = seq
+            return decode_shared_snapshot(data, self.catalog)
+        return None
 
-def parse_cpu_stats():
-    """Parse CPU usage statistics from /proc/stat"""
-    stats = {}
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+def run_publish(path, interval=1.0, freq_backend='auto', cpu_budget=None):
+    """Headless sampler that publishes every snapshot for --attach viewers"""
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    lscpu_info = get_lscpu_info()
+    # Panels are always on here so every viewer can show them; both scanners throttle themselves
+    process_scanner = ProcessScanner(interval=max(1.0, interval))
+    process_scanner.mode = 'processes'
+    interrupt_scanner = InterruptScanner(interval=max(1.0, interval))
+    interrupt_scanner.enabled = True
+    cgroup_scanner = CgroupScanner(interval=max(1.0, interval))
+    cgroup_scanner.enabled = cgroup_scanner.available
+    collector = SampleCollector(interval=interval, freq_reader=FrequencyReader(freq_backend),
+                                process_scanner=process_scanner, interrupt_scanner=interrupt_scanner,
+                                cgroup_scanner=cgroup_scanner, cpu_budget=cpu_budget)
     try:
-        with open('/proc/stat', 'r') as f:
-            for line in f:
-                if line.startswith('cpu') and line[3:4].isdigit():
-                    parts = line.split()
-                    cpu_id = int(parts[0][3:])  # Extract number from 'cpu0', 'cpu1', etc.
-                    times = [int(x) for x in parts[1:]]
-                    stats[cpu_id] = times
-    except (OSError, ValueError, IndexError) as e:
-        print(f"Error reading /proc/stat: {e}")
-    return stats
+        publisher = SnapshotPublisher(path, {
+            'model': lscpu_info.get('Model name', 'Unknown CPU'),
+            'cpu_info': get_cpu_info_items(lscpu_info, get_base_frequency()),
+            'interval': interval,
+            'pid': os.getpid(),
+        })
+    except OSError as e:
+        print(f"Cannot publish to {path}: {e}", file=sys.stderr)
+        return
+    print(f"Publishing snapshots to {path}; view with --attach {path}", file=sys.stderr)
+    try:
+        collector.start()
+        seq = None
+        while True:
+            snapshot = collector.wait_for_update(seq)
+            seq = snapshot.seq
+            with INSTRUMENTATION.stage('publish'):
+                publisher.publish(snapshot)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        collector.stop()
+        process_scanner.close()
+        interrupt_scanner.close()
+        cgroup_scanner.close()
+        publisher.close()
+        print_self_report(collector)
 
-def calculate_cpu_usage(prev_stats, curr_stats):
-    """Calculate CPU usage percentage for each core"""
-    usage = {}
-    for cpu_id in curr_stats:
-        if cpu_id not in prev_stats:
-            continue
+AGENT_FRAME = struct.Struct('<I')          # payload length
+AGENT_DELTA_HEADER = struct.Struct('<dH')  # timestamp, changed value count
+AGENT_DELTA_VALUE = struct.Struct('<Hf')   # channel id, value (NaN = gone)
 
-        prev_times = prev_stats[cpu_id]
-        curr_times = curr_stats[cpu_id]
+def parse_address(address):
+    """'unix:/path' or 'host:port' -> (socket family, socket address); an empty host is loopback"""
+    if address.startswith('unix:'):
+        return socket.AF_UNIX, address[5:]
+    host, _, port = address.rpartition(':')
+    return socket.AF_INET, (host or '127.0.0.1', int(port))
 
-        # Calculate deltas
-        prev_total = sum(prev_times)
-        curr_total = sum(curr_times)
+def _send_frame(sock, kind, payload):
+    sock.sendall(AGENT_FRAME.pack(len(payload) + 1) + kind + payload)
 
-        prev_idle = prev_times[3]  # idle is the 4th field (index 3)
-        curr_idle = curr_times[3]
+def _recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            raise ConnectionError("agent disconnected")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
 
-        total_delta = curr_total - prev_total
-        idle_delta = curr_idle - prev_idle
+def snapshot_values(snapshot):
+    """Yield ((kind, key), value) for everything streamed to an aggregator"""
+    for cpu_id, usage in snapshot.cpu_usage.items():
+        yield ('usage', cpu_id), usage
+    for cpu_id, freq in snapshot.freqs.items():
+        yield ('freq', cpu_id), freq
+    for kind in RECORD_SENSOR_KINDS:
+        for info, value in snapshot.sensors.present(kind):
+            yield info.key, value
 
-        if total_delta > 0:
-            usage_percent = ((total_delta - idle_delta) / total_delta) * 100
-            usage[cpu_id] = max(0, min(100, usage_percent))  # Clamp between 0-100
-        else:
-            usage[cpu_id] = 0
+class AgentEncoder:
+    """Delta-encode Snapshots into agent frames.
 
-    return usage
+    Frames are length-prefixed; the first byte after the length is the type:
+      H  hello (JSON: host, model, cpu_info)
+      C  new channels (JSON: [[id, kind, key], ...]), append-only
+      D  delta: timestamp, then (channel id, float32) for values that changed
+    Values are quantized with the recording scales before comparison, so
+    sensor jitter below display precision is never sent.
+    """
 
-def read_sensors():
-    sensors = {'temps': {}, 'fans': {}, 'voltages': {}, 'power': {}, 'pwm': {}}
-    hwmon_path = '/sys/class/hwmon'
-    try:
-        for hwmon in os.listdir(hwmon_path):
-            hwmon_dir = os.path.join(hwmon_path, hwmon)
-            name_path = os.path.join(hwmon_dir, 'name')
-            if os.path.exists(name_path):
-                with open(name_path) as f:
-                    device_name = f.read().strip()
-                
-                # Get all files in hwmon directory
-                for filename in os.listdir(hwmon_dir):
-                    file_path = os.path.join(hwmon_dir, filename)
-                    
-                    # Temperature sensors
-                    if filename.startswith('temp') and filename.endswith('_input'):
-                        try:
-                            with open(file_path) as f:
-                                temp_milli = int(f.read().strip())
-                                temp_id = filename[4:-6]  # Extract number from temp{N}_input
-                                
-                                # Try to get sensor label
-                                label_path = os.path.join(hwmon_dir, f'temp{temp_id}_label')
-                                if os.path.exists(label_path):
-                                    try:
-                                        with open(label_path) as label_f:
-                                            label = label_f.read().strip()
-                                            sensor_name = f"{device_name}_{label}"
-                                    except OSError:
-                                        sensor_name = f"{device_name}_temp{temp_id}"
-                                else:
-                                    sensor_name = f"{device_name}_temp{temp_id}"
-                                
-                                sensors['temps'][sensor_name] = temp_milli / 1000
-                        except (ValueError, OSError):
-                            continue
-                    
-                    # Fan sensors
-                    elif filename.startswith('fan') and filename.endswith('_input'):
-                        try:
-                            with open(file_path) as f:
-                                fan_rpm = int(f.read().strip())
-                                fan_id = filename[3:-6]  # Extract number from fan{N}_input
-                                
-                                # Try to get fan label
-                                label_path = os.path.join(hwmon_dir, f'fan{fan_id}_label')
-                                if os.path.exists(label_path):
-                                    try:
-                                        with open(label_path) as label_f:
-                                            label = label_f.read().strip()
-                                            sensor_name = f"{device_name}_{label}"
-                                    except OSError:
-                                        sensor_name = f"{device_name}_fan{fan_id}"
-                                else:
-                                    sensor_name = f"{device_name}_fan{fan_id}"
-                                
-                                sensors['fans'][sensor_name] = fan_rpm
-                        except (ValueError, OSError):
-                            continue
-                    
-                    # Voltage sensors
-                    elif filename.startswith('in') and filename.endswith('_input'):
-                        try:
-                            with open(file_path) as f:
-                                voltage_milli = int(f.read().strip())
-                                in_id = filename[2:-6]  # Extract number from in{N}_input
-                                
-                                # Try to get voltage label
-                                label_path = os.path.join(hwmon_dir, f'in{in_id}_label')
-                                if os.path.exists(label_path):
-                                    try:
-                                        with open(label_path) as label_f:
-                                            label = label_f.read().strip()
-                                            sensor_name = f"{device_name}_{label}"
-                                    except OSError:
-                                        sensor_name = f"{device_name}_in{in_id}"
-                                else:
-                                    sensor_name = f"{device_name}_in{in_id}"
-                                
-                                sensors['voltages'][sensor_name] = voltage_milli / 1000
-                        except (ValueError, OSError):
-                            continue
-                    
-                    # Power sensors
-                    elif filename.startswith('power') and filename.endswith('_input'):
-                        try:
-                            with open(file_path) as f:
-                                power_micro = int(f.read().strip())
-                                power_id = filename[5:-6]  # Extract number from power{N}_input
-                                
-                                # Try to get power label
-                                label_path = os.path.join(hwmon_dir, f'power{power_id}_label')
-                                if os.path.exists(label_path):
-                                    try:
-                                        with open(label_path) as label_f:
-                                            label = label_f.read().strip()
-                                            sensor_name = f"{device_name}_{label}"
-                                    except OSError:
-                                        sensor_name = f"{device_name}_power{power_id}"
-                                else:
-                                    sensor_name = f"{device_name}_power{power_id}"
-                                
-                                sensors['power'][sensor_name] = power_micro / 1000000
-                        except (ValueError, OSError):
-                            continue
-                    
-                    # PWM sensors (fan speed control)
-                    elif filename.startswith('pwm') and not '_' in filename:
-                        try:
-                            with open(file_path) as f:
-                                pwm_value = int(f.read().strip())
-                                pwm_id = filename[3:]  # Extract number from pwm{N}
-                                
-                                # Convert PWM value (0-255) to percentage
-                                pwm_percentage = (pwm_value / 255.0) * 100
-                                sensors['pwm'][f"{device_name}_pwm{pwm_id}"] = pwm_percentage
-                        except (ValueError, OSError):
-                            continue
-    except Exception:
-        pass
-    return sensors
+    def __init__(self):
+        self.channel_ids = {}
+        self.sent = {}
 
-def alphanum_sort_key(s):
-    return [int(t) if t.isdigit() else t.lower() for t in re.split('([0-9]+)', s)]
+    def encode(self, snapshot):
+        """Return the frames (kind, payload) needed to bring a peer up to date"""
+        frames = []
+        new_channels = []
+        changed = []
+        seen = set()
+        for channel, value in snapshot_values(snapshot):
+            channel_id = self.channel_ids.get(channel)
+            if channel_id is None:
+                channel_id = self.channel_ids[channel] = len(self.channel_ids)
+                new_channels.append([channel_id, channel[0], channel[1]])
+            seen.add(channel_id)
+            scale = RECORD_ENCODINGS[channel[0]][1]
+            quantized = round(value * scale)
+            if self.sent.get(channel_id) != quantized:
+                self.sent[channel_id] = quantized
+                changed.append((channel_id, quantized / scale))
+        for channel_id in [cid for cid in self.sent if cid not in seen]:
+            del self.sent[channel_id]
+            changed.append((channel_id, math.nan))
+        if new_channels:
+            frames.append((b'C', json.dumps(new_channels).encode()))
+        payload = [AGENT_DELTA_HEADER.pack(snapshot.timestamp, len(changed))]
+        payload.extend(AGENT_DELTA_VALUE.pack(channel_id, value) for channel_id, value in changed)
+        frames.append((b'D', b''.join(payload)))
+        return frames
 
-def read_thermal_zones():
-    """Read Raspberry Pi thermal zones"""
-    thermal_temps = {}
-    thermal_path = '/sys/class/thermal'
+def run_agent(address, interval=1.0, freq_backend='auto', hostname=None, cpu_budget=None):
+    """Stream delta-encoded snapshots to an aggregator, reconnecting as needed"""
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    family, sockaddr = parse_address(address)
+    lscpu_info = get_lscpu_info()
+    hello = json.dumps({
+        'host': hostname or socket.gethostname(),
+        'model': lscpu_info.get('Model name', 'Unknown CPU'),
+        'cpu_info': get_cpu_info_items(lscpu_info, get_base_frequency()),
+    }).encode()
+    collector = SampleCollector(interval=interval, freq_reader=FrequencyReader(freq_backend),
+                                cpu_budget=cpu_budget).start()
+    backoff = 1.0
     try:
-        if os.path.exists(thermal_path):
-            for item in os.listdir(thermal_path):
-                if item.startswith('thermal_zone'):
-                    zone_path = os.path.join(thermal_path, item)
-                    temp_path = os.path.join(zone_path, 'temp')
-                    type_path = os.path.join(zone_path, 'type')
-                    
-                    if os.path.exists(temp_path) and os.path.exists(type_path):
-                        try:
-                            with open(temp_path, 'r') as f:
-                                temp_milli = int(f.read().strip())
-                            with open(type_path, 'r') as f:
-                                zone_type = f.read().strip()
-                            thermal_temps[f"thermal_{zone_type}"] = temp_milli / 1000
-                        except (ValueError, OSError):
+        while True:
+            try:
+                with socket.socket(family, socket.SOCK_STREAM) as sock:
+                    sock.connect(sockaddr)
+                    backoff = 1.0
+                    _send_frame(sock, b'H', hello)
+                    encoder = AgentEncoder()  # fresh peer state: the first delta is complete
+                    seq = None
+                    while True:
+                        snapshot = collector.wait_for_update(seq)
+                        seq = snapshot.seq
+                        if snapshot.since_boot:
                             continue
-    except OSError:
+                        with INSTRUMENTATION.stage('agent_send'):
+                            for kind, payload in encoder.encode(snapshot):
+                                _send_frame(sock, kind, payload)
+            except OSError as e:
+                print(f"Agent connection to {address} failed: {e}; retrying in {backoff:.0f}s", file=sys.stderr)
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+    except KeyboardInterrupt:
         pass
-    return thermal_temps
+    finally:
+        collector.stop()
 
-def organize_fan_data(sensors):
-    """Organize fan data with associated temperatures and filter main temp sensors"""
-    fan_cooling_data = []
-    essential_temps = {}
-    
-    # Essential temperature sensors to keep in main temp section
-    essential_keywords = ['k10temp', 'nvme', 'amdgpu', 'spd5118', 'r8169', 'coretemp', 
-                         'systin', 'cputin', 'tsi0_temp', 'smbusmaster', 'auxtin', 'thermal_cpu']
-    
-    # Copy essential temperatures to main section (filter out invalid readings)
-    for temp_name, temp_value in sensors['temps'].items():
-        if any(keyword in temp_name.lower() for keyword in essential_keywords):
-            # Filter out clearly invalid temperatures
-            if temp_value > 0 and temp_value < 150:  # Reasonable temperature range
-                essential_temps[temp_name] = temp_value
-    
-    # Group fans by device and try to associate with temps
-    fan_devices = {}
-    for fan_name, fan_rpm in sensors['fans'].items():
-        # Extract device name (e.g., 'nct6799' from 'nct6799_fan1')
-        if '_fan' in fan_name:
-            device_name = fan_name.split('_fan')[0]
-            fan_id = fan_name.split('_fan')[1]
-            
-            if device_name not in fan_devices:
-                fan_devices[device_name] = []
-            
-            # Look for corresponding PWM percentage
-            pwm_percentage = None
-            pwm_key = f"{device_name}_pwm{fan_id}"
-            if pwm_key in sensors['pwm']:
-                pwm_percentage = sensors['pwm'][pwm_key]
-            
-            fan_devices[device_name].append({
-                'name': f"Fan{fan_id}",
-                'rpm': fan_rpm,
-                'pwm_percentage': pwm_percentage
-            })
-    
-    # Convert to display format with PWM percentages
-    for device_name, fans in fan_devices.items():
-        for fan_data in sorted(fans, key=lambda x: x['name']):
-            if fan_data['pwm_percentage'] is not None:
-                # Show N/A for PWM when RPM is 0 (likely disconnected fan)
-                if fan_data['rpm'] == 0:
-                    display_text = f"{fan_data['name']}: {fan_data['rpm']:4.0f}rpm (N/A)"
+# Channel kinds an agent may declare; frames naming anything else are ignored
+AGENT_CHANNEL_KINDS = frozenset(('usage', 'freq') + RECORD_SENSOR_KINDS)
+
+class RemoteHost:
+    """Aggregator-side state of one agent, rebuilt from its delta stream.
+
+    Everything in the stream comes from the network, so channel
+    declarations of an unknown kind and values for undeclared channel ids
+    are dropped rather than trusted.
+    """
+
+    def __init__(self, peer, address):
+        self.peer = peer
+        self.address = address  # peer IP (or 'unix'), stable across reconnects
+        self.name = peer
+        self.model = ''
+        self.cpu_info_items = []
+        self.channels = {}
+        self.values = {}
+        self.catalog = SensorCatalog()
+        self.timestamp = 0.0
+        self.received_at = 0.0
+        self.bytes_received = 0
+        self.connected = True
+        self._lock = threading.Lock()
+
+    def apply(self, kind, payload):
+        with self._lock:
+            self.bytes_received += len(payload) + AGENT_FRAME.size + 1
+            if kind == b'H':
+                hello = json.loads(payload)
+                self.name = hello.get('host', self.peer)
+                self.model = hello.get('model', '')
+                self.cpu_info_items = hello.get('cpu_info', [])
+                self.channels.clear()
+                self.values.clear()
+            elif kind == b'C':
+                for channel_id, channel_kind, key in json.loads(payload):
+                    key_type = int if channel_kind in ('usage', 'freq') else str
+                    if (channel_kind in AGENT_CHANNEL_KINDS and isinstance(channel_id, int)
+                            and isinstance(key, key_type)):
+                        self.channels[channel_id] = (channel_kind, key)
+            elif kind == b'D':
+                self.timestamp, count = AGENT_DELTA_HEADER.unpack_from(payload, 0)
+                offset = AGENT_DELTA_HEADER.size
+                for _ in range(count):
+                    channel_id, value = AGENT_DELTA_VALUE.unpack_from(payload, offset)
+                    offset += AGENT_DELTA_VALUE.size
+                    if math.isnan(value):
+                        self.values.pop(channel_id, None)
+                    elif channel_id in self.channels:
+                        self.values[channel_id] = value
+                self.received_at = time.monotonic()
+
+    def snapshot(self):
+        """Current values as a Snapshot for the regular per-host view"""
+        with self._lock:
+            freqs = {}
+            cpu_usage = {}
+            sensors = {kind: {} for kind in RECORD_SENSOR_KINDS}
+            for channel_id, value in self.values.items():
+                kind, key = self.channels[channel_id]
+                if kind == 'usage':
+                    cpu_usage[key] = value
+                elif kind == 'freq':
+                    freqs[key] = value
                 else:
-                    display_text = f"{fan_data['name']}: {fan_data['rpm']:4.0f}rpm ({fan_data['pwm_percentage']:3.0f}%)"
+                    sensors[kind][key] = value
+            timestamp = self.timestamp
+        sensors = SensorValues.from_dicts(self.catalog, sensors)
+        return Snapshot(0, timestamp, freqs, cpu_usage, None, sensors,
+                        essential_temperatures(sensors), None)
+
+    @property
+    def key(self):
+        return (self.address, self.name)
+
+    def summary(self):
+        """(cores, avg usage, max usage, avg MHz, max temp, total power W)"""
+        snapshot = self.snapshot()
+        usage = list(snapshot.cpu_usage.values())
+        freqs = list(snapshot.freqs.values())
+        temps = list(snapshot.essential_temps.values()) or list(snapshot.sensors['temps'].values())
+        return (len(snapshot.freqs),
+                sum(usage) / len(usage) if usage else 0.0,
+                max(usage, default=0.0),
+                sum(freqs) / len(freqs) if freqs else 0.0,
+                max(temps, default=None),
+                total_power(snapshot.sensors['power']) if snapshot.sensors['power'] else None)
+
+class AggregatorServer:
+    """Accept agent connections and keep one RemoteHost per agent.
+
+    Hosts are keyed by (peer address, name in the hello frame), so an agent
+    that reconnects replaces its previous entry instead of adding a row,
+    while another machine claiming the same name gets a row of its own.
+    An address without a host part binds to loopback only.
+    """
+
+    def __init__(self, address):
+        self.address = address
+        self.hosts = {}
+        self._lock = threading.Lock()
+        family, sockaddr = parse_address(address)
+        if family == socket.AF_UNIX and os.path.exists(sockaddr):
+            os.unlink(sockaddr)
+        self._sock = socket.socket(family, socket.SOCK_STREAM)
+        if family != socket.AF_UNIX:
+            self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(sockaddr)
+        self._sock.listen(64)
+        self._thread = None
+
+    def _serve_agent(self, conn, peer, address):
+        host = RemoteHost(peer, address)
+        registered = False
+        try:
+            with conn:
+                while True:
+                    size, = AGENT_FRAME.unpack(_recv_exact(conn, AGENT_FRAME.size))
+                    frame = _recv_exact(conn, size)
+                    host.apply(frame[:1], frame[1:])
+                    if not registered:
+                        # The first frame is the hello naming the host (the peer address otherwise)
+                        with self._lock:
+                            self.hosts[host.key] = host
+                        registered = True
+        except (OSError, ValueError, TypeError, struct.error):
+            pass  # malformed frames end the connection; the agent reconnects
+        finally:
+            host.connected = False
+
+    def _accept_loop(self):
+        while True:
+            try:
+                conn, peer = self._sock.accept()
+            except OSError:
+                return
+            if isinstance(peer, tuple):
+                address, peer = peer[0], f"{peer[0]}:{peer[1]}"
             else:
-                display_text = f"{fan_data['name']}: {fan_data['rpm']:4.0f}rpm"
-            fan_cooling_data.append(display_text)
-    
-    return fan_cooling_data, essential_temps
+                address, peer = 'unix', f"unix-{id(conn):x}"
+            threading.Thread(target=self._serve_agent, args=(conn, peer, address),
+                             name=f'cpu-monitor-agent-{peer}', daemon=True).start()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._accept_loop, name='cpu-monitor-aggregator', daemon=True)
+        self._thread.start()
+        return self
+
+    def current(self, host):
+        """The live entry for `host`'s key; the agent may have reconnected since"""
+        with self._lock:
+            return self.hosts.get(host.key, host)
+
+    def sorted_hosts(self):
+        with self._lock:
+            hosts = list(self.hosts.values())
+        return sorted(hosts, key=lambda host: (alphanum_sort_key(host.name), host.address))
+
+    def close(self):
+        self._sock.close()
+        family, sockaddr = parse_address(self.address)
+        if family == socket.AF_UNIX and os.path.exists(sockaddr):
+            os.unlink(sockaddr)
+
+class FrameBuffer:
+    """Off-screen frame exposing the stdscr calls the renderer uses.
+
+    Rows are composed in memory and refresh() diffs them against the
+    previous frame, writing only the changed span of each changed row. When
+    nothing changed the terminal is not touched at all. `bytes_written`
+    holds the text bytes sent for the last frame.
+
+    Text is drawn in color pair 1. Other attributes (e.g. A_REVERSE for a
+    selection) are kept per row as (start, end, attr) spans, which take part
+    in the diff.
+    """
+
+    def __init__(self, stdscr):
+        self.stdscr = stdscr
+        self.size = stdscr.getmaxyx()
+        self.rows = []
+        self.spans = []
+        self._prev_rows = None
+        self._prev_spans = None
+        self.bytes_written = 0
+        self.frames = 0
+        self.total_bytes = 0
+
+    def invalidate(self):
+        """Force a full repaint on the next refresh (e.g. after a resize)"""
+        self._prev_rows = None
+
+    def getmaxyx(self):
+        return self.size
+
+    def erase(self):
+        size = self.stdscr.getmaxyx()
+        if size != self.size:
+            self.size = size
+            self.invalidate()
+        self.rows = [''] * size[0]
+        self.spans = [()] * size[0]
+
+    def addstr(self, y, x, text, attr=0):
+        max_y, max_x = self.size
+        if y < 0 or y >= max_y or x < 0 or x >= max_x:
+            raise curses.error("addstr() returned ERR")
+        text = text[:max_x - x]
+        row = self.rows[y]
+        if len(row) < x:
+            row = row.ljust(x)
+        self.rows[y] = row[:x] + text + row[x + len(text):]
+        attr &= ~curses.A_COLOR   # every cell is drawn in color pair 1
+        spans = self.spans[y]
+        if spans or attr:
+            end = x + len(text)
+            # Text drawn over a span replaces its attribute for those cells
+            kept = []
+            for span_start, span_end, span_attr in spans:
+                if span_start < x:
+                    kept.append((span_start, min(span_end, x), span_attr))
+                if span_end > end:
+                    kept.append((max(span_start, end), span_end, span_attr))
+            if attr and text:
+                kept.append((x, end, attr))
+            self.spans[y] = tuple(sorted(kept))
+
+    def _write(self, y, row, start, end, spans, attr):
+        """addstr row[start:end], switching attributes at span boundaries"""
+        for span_start, span_end, span_attr in spans:
+            if span_end <= start or span_start >= end:
+                continue
+            if span_start > start:
+                self.stdscr.addstr(y, start, row[start:span_start], attr)
+                start = span_start
+            stop = min(span_end, end)
+            self.stdscr.addstr(y, start, row[start:stop], attr | span_attr)
+            start = stop
+        if start < end:
+            self.stdscr.addstr(y, start, row[start:end], attr)
+
+    def refresh(self):
+        attr = curses.color_pair(1)
+        prev_rows = self._prev_rows
+        prev_spans = self._prev_spans
+        if prev_rows is None:
+            self.stdscr.erase()
+            prev_rows = [''] * len(self.rows)
+            prev_spans = [()] * len(self.rows)
+        written = 0
+        changed = self._prev_rows is None
+        for y, (old, new, old_spans, new_spans) in enumerate(zip(prev_rows, self.rows, prev_spans, self.spans)):
+            if old == new and old_spans == new_spans:
+                continue
+            changed = True
+            start = len(os.path.commonprefix((old, new)))
+            end = len(new)
+            if len(old) == len(new):
+                # Same length: also skip the unchanged tail
+                while end > start and old[end - 1] == new[end - 1]:
+                    end -= 1
+            if old_spans != new_spans:
+                # Repaint every cell whose attribute changed as well
+                moved = set(old_spans).symmetric_difference(new_spans)
+                start = min(start, min(span[0] for span in moved))
+                end = min(len(new), max(end, max(span[1] for span in moved)))
+                start = min(start, end)
+            segment = new[start:end]
+            try:
+                if segment:
+                    self._write(y, new, start, end, new_spans, attr)
+                if len(new) < len(old):
+                    self.stdscr.move(y, len(new))
+                    self.stdscr.clrtoeol()
+            except curses.error:
+                pass
+            written += len(segment.encode())
+        self._prev_rows = self.rows
+        self._prev_spans = self.spans
+        self.bytes_written = written
+        if changed:
+            self.frames += 1
+            self.total_bytes += written
+            self.stdscr.refresh()
+        return changed
 
 def safe_addstr(stdscr, y, x, text, max_y, max_x):
     """Safely add string to screen with bounds checking"""
@@ -406,10 +3866,435 @@ def display_two_column_sections(stdscr, sections_data, start_line, max_y, max_x)
     # Return the line after the longest column
     return current_line + max(len(left_lines), len(right_lines))
 
-def draw(stdscr):
+def get_cpu_info_items(lscpu_info, base_freq):
+    """Build the static Additional CPU Info section items"""
+    # Additional CPU Info (place after fans, before voltages for better grouping)
+    additional_fields = [
+        "Thread(s) per core",
+        "Core(s) per socket", 
+        "Stepping",
+        "Frequency boost",
+        "CPU(s) scaling MHz",
+        "CPU max MHz",
+        "CPU base MHz",  # Position between max and min
+        "CPU min MHz"
+    ]
+    
+    cpu_info_items = []
+    for field in additional_fields:
+        if field == "CPU base MHz":
+            # Insert base frequency here if available
+            if base_freq:
+                cpu_info_items.append(f"{field}: {base_freq}")
+        elif field in lscpu_info:
+            cpu_info_items.append(f"{field}: {lscpu_info[field]}")
+    return cpu_info_items
+
+class ViewState:
+    """Display toggles driven by key presses; affects rendering only"""
+
+    # None (off), sparklines, then min/avg/max/p95 over each history window
+    HISTORY_MODES = (None, 'spark') + tuple(label for label, _ in HISTORY_WINDOWS)
+
+    LIVE_HELP = ("Press 'q' to exit | b: breakdown  h: history  m: mean/peak  p: top tasks"
+                 "  r: irqs  c: cgroups  t/g: topology  i: timings")
+
+    # None picks the per-core list when it fits on screen and topology groups otherwise
+    CORE_VIEWS = (None, 'list', 'groups', 'heatmap')
+
+    def __init__(self, help_text=LIVE_HELP):
+        self.show_breakdown = False
+        self.show_peaks = False
+        self.show_instrumentation = False
+        self.history_mode = None
+        self.core_view = None
+        self.group_level = 'cluster'
+        self.selected_group = 0
+        self.expanded = set()
+        self.help_text = help_text
+        self.status = ''
+        self.overhead = ''  # overhead budget state, when --cpu-budget is set
+
+    def cycle_history(self, windows=None):
+        """Advance to the next history mode, skipping windows not in `windows` when given"""
+        modes = [mode for mode in self.HISTORY_MODES
+                 if windows is None or mode in (None, 'spark') or mode in windows]
+        self.history_mode = modes[(modes.index(self.history_mode) + 1) % len(modes)]
+
+    def cycle_core_view(self):
+        views = self.CORE_VIEWS
+        self.core_view = views[(views.index(self.core_view) + 1) % len(views)]
+
+    def cycle_group_level(self):
+        levels = TOPOLOGY_LEVELS
+        self.group_level = levels[(levels.index(self.group_level) + 1) % len(levels)]
+        self.selected_group = 0
+        self.expanded.clear()
+
+    def toggle_selected_group(self, topology, cpu_ids):
+        groups = (topology or CpuTopology({})).groups(self.group_level, cpu_ids)
+        if groups:
+            key = groups[min(self.selected_group, len(groups) - 1)][0]
+            self.expanded.symmetric_difference_update({key})
+
+    def footer(self):
+        text = f"{self.status} | {self.help_text}" if self.status else self.help_text
+        if self.show_peaks:
+            text += " [peak]"
+        if self.history_mode == 'spark':
+            text += " [sparklines]"
+        elif self.history_mode:
+            text += f" [{self.history_mode} min/avg/max/p95]"
+        if self.core_view in ('groups', 'heatmap'):
+            text += f" [{self.core_view} by {self.group_level}]"
+        if self.overhead:
+            text += f" [{self.overhead}]"
+        return text
+
+def history_suffix(history, mode, key, fmt='.1f', lo=None, hi=None, width=12):
+    """Sparkline or window statistics to append to a display row"""
+    if history is None or mode is None:
+        return ''
+    if mode == 'spark':
+        return ' ' + history.sparkline(key, width, lo, hi)
+    stats = history.window_stats(key, mode)
+    if stats is None:
+        return ''
+    low, high, avg, p95 = stats
+    return f" {low:{fmt}}/{avg:{fmt}}/{high:{fmt}}/{p95:{fmt}}"
+
+def core_history_suffix(history, mode, cpu_id):
+    """Usage history, then a narrower frequency history, for one core row"""
+    return (history_suffix(history, mode, ('usage', cpu_id), lo=0, hi=100)
+            + history_suffix(history, mode, ('freq', cpu_id), fmt='.0f', lo=0, width=8))
+
+def format_rate(rate):
+    """Compact events-per-second figure: 950, 12.3k, 4.1M"""
+    if rate >= 1e6:
+        return f"{rate / 1e6:.1f}M"
+    if rate >= 1e4:
+        return f"{rate / 1e3:.0f}k"
+    if rate >= 1e3:
+        return f"{rate / 1e3:.1f}k"
+    return f"{rate:.0f}"
+
+def format_cgroup_text(row):
+    """One cgroup row; the path is cut from the left so the leaf name stays visible"""
+    path = row.path if len(row.path) <= 28 else '…' + row.path[-27:]
+    text = f"{path:<28} {row.cpu_percent:6.1f}%"
+    if row.throttle_rate > 0:
+        text += f" thr {format_rate(row.throttle_rate)}/s {row.throttled_percent:.0f}%"
+    if row.pressure is not None:
+        text += f" psi {row.pressure:.1f}"
+    return text
+
+def format_core_text(cpu_id, freqs, cpu_usage, breakdown_row=None, suffix='', interrupts=None):
+    """Format one core row, optionally with the user/system/iowait/steal breakdown and IRQ rates"""
+    freq_text = f"Core {cpu_id:2}: {freqs[cpu_id]:7.2f} MHz"
+    if cpu_id in cpu_usage:
+        freq_text += f" ({cpu_usage[cpu_id]:5.1f}%)"
+    if breakdown_row is not None:
+        states = breakdown_row
+        freq_text += (f" us{states['user']:5.1f} sy{states['system']:5.1f}"
+                      f" io{states['iowait']:5.1f} st{states['steal']:5.1f}")
+    if interrupts is not None:
+        freq_text += (f" irq{format_rate(interrupts.irqs.get(cpu_id, 0.0)):>6}"
+                      f" si{format_rate(interrupts.softirqs.get(cpu_id, 0.0)):>6}")
+    return freq_text + suffix
+
+def breakdown_rows(cpu_breakdown):
+    """Map cpu_id -> {state: percentage} for display"""
+    if cpu_breakdown is None:
+        return {}
+    rows = {cpu_id: {} for cpu_id in cpu_breakdown.cpu_ids}
+    for name, column in cpu_breakdown.states.items():
+        for cpu_id, pct in zip(cpu_breakdown.cpu_ids, column):
+            rows[cpu_id][name] = pct
+    return rows
+
+def stale_mark(snapshot, name):
+    """Marker for a slow sensor showing its last value rather than a fresh read"""
+    return ' (stale)' if name in snapshot.stale_sensors else ''
+
+def render_instrumentation(stdscr, max_y, max_x):
+    """Overlay the self-timing panel in the top right corner"""
+    lines = ["Monitor self-timing (rolling):"] + INSTRUMENTATION.format_lines()
+    slow = get_sensor_registry().slow_sensors() if _sensor_registry is not None else []
+    if slow:
+        lines.append("Slow sensors (latency, polled every N ticks):")
+        lines.extend(f"  {name:28.28} {latency * 1000:7.1f} ms  every {period}" for name, latency, period in slow)
+    if getattr(stdscr, 'frames', 0):
+        # Kept out of the footer: a changing byte count would redraw an otherwise idle screen
+        lines.append(f"Terminal: {stdscr.bytes_written} B last frame, "
+                     f"{stdscr.total_bytes // stdscr.frames} B avg over {stdscr.frames} frames")
+    width = max(len(text) for text in lines) + 2
+    x = max(0, max_x - width - 1)
+    for i, text in enumerate(lines):
+        safe_addstr(stdscr, 2 + i, x, f" {text}".ljust(width), max_y, max_x)
+
+def group_summary_text(label, members, freqs, cpu_usage, expanded, width):
+    """One collapsed/expanded group row: aggregates plus a usage heat strip"""
+    usage = [cpu_usage.get(cpu_id, 0.0) for cpu_id in members]
+    mhz = [freqs[cpu_id] for cpu_id in members if cpu_id in freqs]
+    text = (f"{'-' if expanded else '+'} {label:<18} {len(members):3} cpus"
+            f"  avg {sum(usage) / len(usage):5.1f}%  max {max(usage):5.1f}%"
+            f"  {sum(mhz) / len(mhz) if mhz else 0.0:7.1f} MHz  ")
+    room = width - len(text)
+    if room > 0:
+        text += sparkline(usage[:room], 0, 100)
+    return text
+
+def render_core_groups(stdscr, line, topology, cpu_ids, freqs, cpu_usage, view, breakdown, max_y, max_x,
+                       interrupts=None):
+    """Topology groups with aggregates; expanded groups list their cores.
+
+    Rows are planned as cheap (group, cpu) references and only those inside
+    the scrolled window are formatted.
+    """
+    groups = topology.groups(view.group_level, cpu_ids)
+    if not groups:
+        return line
+    view.selected_group = min(view.selected_group, len(groups) - 1)
+    rows = []
+    selected_row = 0
+    for index, (key, _, members) in enumerate(groups):
+        if index == view.selected_group:
+            selected_row = len(rows)
+        rows.append((index, None))
+        if key in view.expanded:
+            rows.extend((index, cpu_id) for cpu_id in members)
+    # When the groups do not fit, scroll them and keep a third of the screen for the sensor sections
+    available = max_y - line - 2
+    visible = len(rows) if len(rows) <= available else max(1, available * 2 // 3)
+    first = min(max(0, selected_row - visible // 2), len(rows) - visible)
+    for index, cpu_id in rows[first:first + visible]:
+        if line >= max_y - 2:
+            break
+        key, label, members = groups[index]
+        if cpu_id is None:
+            text = group_summary_text(label, members, freqs, cpu_usage, key in view.expanded, max_x - 3)
+            try:
+                stdscr.addstr(line, 0, ('>' if index == view.selected_group else ' ') + ' ' + text[:max_x - 3],
+                              curses.A_REVERSE if index == view.selected_group else 0)
+            except curses.error:
+                pass
+        else:
+            safe_addstr(stdscr, line, 6, format_core_text(cpu_id, freqs, cpu_usage, breakdown.get(cpu_id),
+                                                            interrupts=interrupts),
+                        max_y, max_x)
+        line += 1
+    return line
+
+def render_core_heatmap(stdscr, line, topology, cpu_ids, cpu_usage, view, max_y, max_x):
+    """One usage block per CPU, laid out as a grid of topology groups"""
+    groups = topology.groups(view.group_level, cpu_ids)
+    if not groups:
+        return line
+    label_width = max(len(label) for _, label, _ in groups) + 1
+    strip_width = max(1, min(max(len(members) for _, _, members in groups), max_x - label_width - 5))
+    per_row = max(1, (max_x - 3) // (label_width + strip_width + 2))
+    for start in range(0, len(groups), per_row):
+        if line >= max_y - 2:
+            break
+        row = groups[start:start + per_row]
+        # Groups wider than the screen wrap onto continuation lines
+        for offset in range(0, max(len(members) for _, _, members in row), strip_width):
+            if line >= max_y - 2:
+                break
+            parts = []
+            for _, label, members in row:
+                strip = sparkline([cpu_usage.get(cpu_id, 0.0) for cpu_id in members[offset:offset + strip_width]],
+                                  0, 100)
+                parts.append(f"{label if not offset else '':<{label_width}}{strip:<{strip_width}}")
+            safe_addstr(stdscr, line, 2, '  '.join(parts), max_y, max_x)
+            line += 1
+    return line
+
+def render_snapshot(stdscr, snapshot, model_name, cpu_info_items, view=None, history=None, topology=None):
+    """Render one Snapshot; performs no sysfs or procfs I/O.
+
+    `stdscr` is normally a FrameBuffer so only changed cells reach the terminal.
+    """
+    view = view if view is not None else ViewState()
+    mode = view.history_mode
+    freqs = snapshot.freqs
+    cpu_usage = snapshot.cpu_usage
+    if view.show_peaks and snapshot.aggregate is not None:
+        freqs = snapshot.aggregate.freqs_max
+        cpu_usage = snapshot.aggregate.usage_max
+    sensors = snapshot.sensors
+    essential_temps = snapshot.essential_temps
+    breakdown = breakdown_rows(snapshot.cpu_breakdown) if view.show_breakdown else {}
+
+    # Always redraw the screen
+    stdscr.erase()
+    max_y, max_x = stdscr.getmaxyx()
+
+    line = 0
+    safe_addstr(stdscr, line, 0, f"CPU Model: {model_name}", max_y, max_x)
+    line += 1
+
+    safe_addstr(stdscr, line, 0, "-" * min(40, max_x-1), max_y, max_x)
+    line += 1
+    
+    # Use two-column layout for CPU cores if more than 8 cores; topology views past a screenful
+    sorted_cpu_ids = sorted(freqs.keys())
+    core_view = view.core_view
+    if core_view is None:
+        core_view = 'list' if (len(sorted_cpu_ids) + 1) // 2 <= max(8, (max_y - line) // 2) else 'groups'
+    if core_view in ('groups', 'heatmap'):
+        topology = topology if topology is not None else CpuTopology({})
+        if core_view == 'groups':
+            line = render_core_groups(stdscr, line, topology, sorted_cpu_ids, freqs, cpu_usage, view,
+                                      breakdown, max_y, max_x, snapshot.interrupts)
+        else:
+            line = render_core_heatmap(stdscr, line, topology, sorted_cpu_ids, cpu_usage, view, max_y, max_x)
+    elif len(sorted_cpu_ids) > 8:
+        # Two-column CPU layout
+        left_col_width = max_x // 2 - 2
+        right_col_x = max_x // 2 + 1
+        
+        # Split cores evenly between columns
+        mid_point = (len(sorted_cpu_ids) + 1) // 2
+        left_cores = sorted_cpu_ids[:mid_point]
+        right_cores = sorted_cpu_ids[mid_point:]
+        
+        start_line = line
+        max_cores_per_column = max(len(left_cores), len(right_cores))
+        
+        # Display left column cores
+        for i, cpu_id in enumerate(left_cores):
+            if start_line + i >= max_y - 2:
+                break
+            freq_text = format_core_text(cpu_id, freqs, cpu_usage, breakdown.get(cpu_id),
+                                         core_history_suffix(history, mode, cpu_id),
+                                         snapshot.interrupts)
+            # Truncate if too long for left column
+            if len(freq_text) > left_col_width:
+                freq_text = freq_text[:left_col_width-3] + "..."
+            safe_addstr(stdscr, start_line + i, 2, freq_text, max_y, max_x)
+        
+        # Display right column cores
+        for i, cpu_id in enumerate(right_cores):
+            if start_line + i >= max_y - 2:
+                break
+            freq_text = format_core_text(cpu_id, freqs, cpu_usage, breakdown.get(cpu_id),
+                                         core_history_suffix(history, mode, cpu_id),
+                                         snapshot.interrupts)
+            # Truncate if too long for right column
+            available_width = max_x - right_col_x - 1
+            if len(freq_text) > available_width:
+                freq_text = freq_text[:available_width-3] + "..."
+            safe_addstr(stdscr, start_line + i, right_col_x, freq_text, max_y, max_x)
+        
+        line = start_line + max_cores_per_column
+    else:
+        # Single column layout for 8 or fewer cores
+        for cpu_id in sorted_cpu_ids:
+            if line >= max_y - 2:  # Leave room for exit message
+                break
+            freq_text = format_core_text(cpu_id, freqs, cpu_usage, breakdown.get(cpu_id),
+                                         core_history_suffix(history, mode, cpu_id),
+                                         snapshot.interrupts)
+            safe_addstr(stdscr, line, 2, freq_text, max_y, max_x)
+            line += 1
+
+    # Prepare sections for two-column display
+    sections_for_columns = []
+    
+    # Essential temperatures
+    # Already in display order: essential_temperatures() walks the catalog order
+    if essential_temps:
+        temp_items = [f"{name}: {value:5.1f}{stale_mark(snapshot, name)}" + history_suffix(history, mode, ('temps', name))
+                      for name, value in essential_temps.items()]
+        sections_for_columns.append(("Temperatures (°C):", temp_items))
+    
+    # Fan Speeds, formatted from the catalog only here where they are drawn
+    fan_items = []
+    for info, pwm_id, label in sensors.catalog.fan_rows():
+        rpm = sensors.value(info.id)
+        if rpm is not None:
+            fan_items.append(format_fan_text(label, rpm, sensors.value(pwm_id)) + stale_mark(snapshot, info.name)
+                             + history_suffix(history, mode, info.key, fmt='.0f', lo=0))
+    if fan_items:
+        sections_for_columns.append(("Fan Speeds (RPM):", fan_items))
+    
+    if snapshot.freq_source:
+        backend_name, backend_cost = snapshot.freq_source
+        cpu_info_items = cpu_info_items + [f"Freq backend: {backend_name} ({backend_cost * 1000:.2f} ms)"]
+    if cpu_info_items:
+        sections_for_columns.append(("Additional CPU Info:", cpu_info_items))
+    
+    # Voltages
+    voltages = sensors.present('voltages')
+    if voltages:
+        voltage_items = [f"{info.name}: {value:5.3f}{stale_mark(snapshot, info.name)}" + history_suffix(history, mode, info.key, fmt='.3f')
+                         for info, value in voltages]
+        sections_for_columns.append(("Voltages (V):", voltage_items))
+    
+    # Power
+    power = sensors.present('power')
+    if power:
+        power_items = [f"{info.name}: {value:6.3f}{stale_mark(snapshot, info.name)}" + history_suffix(history, mode, info.key, fmt='.3f')
+                       for info, value in power]
+        sections_for_columns.append(("Power (W):", power_items))
+    
+    # Top processes or threads by CPU
+    if snapshot.top_tasks and snapshot.top_tasks.tasks:
+        if snapshot.top_tasks.mode == 'threads':
+            title = "Top Threads (CPU%):"
+            task_items = [f"{task.pid:>7}/{task.tid:<7} {task.name:<15.15} {task.cpu_percent:6.1f}%"
+                          for task in snapshot.top_tasks.tasks]
+        else:
+            title = "Top Processes (CPU%):"
+            task_items = [f"{task.pid:>7} {task.name:<15.15} {task.cpu_percent:6.1f}%"
+                          for task in snapshot.top_tasks.tasks]
+        sections_for_columns.append((title, task_items))
+
+    # Busiest IRQ lines and softirq rates by type
+    interrupts = snapshot.interrupts
+    if interrupts is not None:
+        irq_items = [f"{irq.label:>5} {irq.description:<22.22} {format_rate(irq.rate):>6} cpu{irq.cpu}"
+                     for irq in interrupts.top_irqs]
+        sections_for_columns.append(("Top IRQs (/s):", irq_items or ["(none)"]))
+        softirq_items = [f"{name}: {format_rate(rate)}" for name, rate
+                         in sorted(interrupts.softirq_types.items(), key=lambda item: -item[1]) if rate > 0]
+        if softirq_items:
+            sections_for_columns.append(("Softirqs (/s):", softirq_items))
+
+    # Busiest cgroups with throttling and CPU pressure
+    cgroups = snapshot.cgroups
+    if cgroups is not None:
+        cgroup_items = [format_cgroup_text(row) for row in cgroups.rows]
+        sections_for_columns.append((f"Cgroups (CPU%, {cgroups.read}/{cgroups.tracked} read):",
+                                     cgroup_items or ["(idle)"]))
+
+    # Display all sensor sections in two columns
+    if sections_for_columns:
+        line += 1
+        line = display_two_column_sections(stdscr, sections_for_columns, line, max_y, max_x)
+
+    if view.show_instrumentation:
+        render_instrumentation(stdscr, max_y, max_x)
+
+    # Always show exit message at bottom - ensure it's visible
+    try:
+        stdscr.addstr(max_y - 1, 0, view.footer()[:max_x - 1],
+                      curses.color_pair(1))
+    except curses.error:
+        # If bottom line fails, try one line up
+        try:
+            stdscr.addstr(max_y - 2, 0, view.footer()[:max_x - 1],
+                          curses.color_pair(1))
+        except curses.error:
+            pass
+
+    stdscr.refresh()
+
+def init_screen(stdscr, timeout_ms=100):
     curses.curs_set(0)
     stdscr.nodelay(False)  # Block until input or timeout
-    stdscr.timeout(1000)   # 1 second timeout
+    stdscr.timeout(timeout_ms)  # Poll for new snapshots between key presses
 
     # Initialize colors
     curses.start_color()
@@ -423,190 +4308,494 @@ def draw(stdscr):
     except:
         pass
 
-    lscpu_info = get_lscpu_info()
-    model_name = lscpu_info.get('Model name', 'Unknown CPU')
+def draw(stdscr, freq_backend='auto', history_depth=300, interval=1.0, refresh=1.0, shared=None, cpu_budget=None):
+    """Live view; with `shared` (a SharedSnapshotReader) it renders a --publish daemon's snapshots instead of sampling"""
+    init_screen(stdscr)
 
-    # Take initial readings and wait 1 second to have data ready immediately
-    prev_cpu_stats = parse_cpu_stats()
-    time.sleep(1)
+    if shared is not None:
+        # Read-only viewer: take() has the same contract as SampleAggregator.take()
+        aggregator = shared
+        collector = process_scanner = interrupt_scanner = cgroup_scanner = None
+        model_name = shared.metadata.get('model', 'Unknown CPU')
+        cpu_info_items = shared.metadata.get('cpu_info', []) + [f"Attached: {shared.path}"]
+        interval = shared.metadata.get('interval', interval)
+    else:
+        aggregator = SampleAggregator()
+        process_scanner = ProcessScanner(interval=refresh)
+        interrupt_scanner = InterruptScanner(interval=refresh)
+        cgroup_scanner = CgroupScanner(interval=refresh)
+        collector = SampleCollector(interval=interval, freq_reader=FrequencyReader(freq_backend),
+                                    aggregator=aggregator, process_scanner=process_scanner,
+                                    interrupt_scanner=interrupt_scanner, cgroup_scanner=cgroup_scanner,
+                                    cpu_budget=cpu_budget).start()
 
-    last_update = 0
-    freqs = {}
-    sensors = {'temps': {}, 'fans': {}, 'voltages': {}, 'power': {}}
-    cpu_usage = {}
+        # Static info is read while the sampler takes its first (since-boot) sample
+        lscpu_info = get_lscpu_info()
+        model_name = lscpu_info.get('Model name', 'Unknown CPU')
+        cpu_info_items = get_cpu_info_items(lscpu_info, get_base_frequency())
+    # One entry is recorded per new aggregate, i.e. at most once per refresh and
+    # once per sample, so window sizes follow the slower of the two
+    history = HistoryStore(depth=history_depth, interval=max(interval, refresh))
+    topology = CpuTopology.read()
+    frame = FrameBuffer(stdscr)
+    # An attached viewer cannot switch the publisher's panels, only hide them
+    show_tasks = show_interrupts = show_cgroups = True
+    try:
+        displayed = None
+        need_refresh = True
+        view = ViewState()
+        if collector is not None:
+            collector.wait_for_update(None, timeout=refresh)
+        next_refresh = time.monotonic()
+        while True:
+            now = time.monotonic()
+            if now >= next_refresh:
+                aggregated = aggregator.take()
+                if aggregated is not None:
+                    displayed = aggregated
+                    if not aggregated.since_boot:
+                        history.record(aggregated)
+                    view.status = 'since boot' if aggregated.since_boot else ''
+                    need_refresh = True
+                if shared is not None and not shared.publisher_alive():
+                    view.status = 'publisher stopped'
+                    need_refresh = True
+                if collector is not None and collector.budget is not None:
+                    view.overhead = collector.budget.status()
+                next_refresh += refresh
+                if next_refresh <= now:
+                    next_refresh = now + refresh
+                if displayed is not None and displayed.since_boot:
+                    # Switch to live deltas as soon as the second sample lands
+                    next_refresh = min(next_refresh, now + interval)
+            if displayed is not None and need_refresh:
+                shown = displayed
+                if not (show_tasks and show_interrupts and show_cgroups):
+                    shown = displayed._replace(top_tasks=displayed.top_tasks if show_tasks else None,
+                                               interrupts=displayed.interrupts if show_interrupts else None,
+                                               cgroups=displayed.cgroups if show_cgroups else None)
+                with INSTRUMENTATION.stage('render'):
+                    render_snapshot(frame, shown, model_name, cpu_info_items, view, history, topology)
+            need_refresh = False
 
-    while True:
-        current_time = time.time()
+            # Sleep in getch() until the next display deadline (poll until the first sample)
+            wait = next_refresh - time.monotonic() if displayed is not None else 0.05
+            stdscr.timeout(max(1, int(wait * 1000)))
 
-        # Only update data every second, regardless of input events
-        if current_time - last_update >= 1.0:
-            freqs = parse_cpu_frequencies()
-            sensors = read_sensors()
+            # Handle input - only check for quit
+            try:
+                key = stdscr.getch()
+                if key in (ord('q'), ord('Q')):
+                    break
+                # Explicitly ignore mouse wheel and other events
+                elif key in MOUSE_SCROLL_CODES:
+                    continue
+                elif key in (ord('b'), ord('B')):
+                    view.show_breakdown = not view.show_breakdown
+                    need_refresh = True
+                elif key in (ord('h'), ord('H')):
+                    view.cycle_history(history.window_sizes)
+                    need_refresh = True
+                elif key in (ord('m'), ord('M')):
+                    view.show_peaks = not view.show_peaks
+                    need_refresh = True
+                elif key in (ord('i'), ord('I')):
+                    view.show_instrumentation = not view.show_instrumentation
+                    need_refresh = True
+                elif key in (ord('r'), ord('R')):
+                    # Like the process panel, the sampler thread picks this up on its next pass
+                    if interrupt_scanner is not None:
+                        interrupt_scanner.enabled = not interrupt_scanner.enabled
+                    else:
+                        show_interrupts = not show_interrupts
+                    need_refresh = True
+                elif key in (ord('c'), ord('C')):
+                    if cgroup_scanner is None:
+                        show_cgroups = not show_cgroups
+                    elif cgroup_scanner.available:
+                        cgroup_scanner.enabled = not cgroup_scanner.enabled
+                    else:
+                        view.status = 'cgroup v2 not mounted'
+                    need_refresh = True
+                elif key in (ord('t'), ord('T')):
+                    view.cycle_core_view()
+                    need_refresh = True
+                elif key in (ord('g'), ord('G')):
+                    view.cycle_group_level()
+                    need_refresh = True
+                elif key in (curses.KEY_UP, curses.KEY_DOWN):
+                    view.selected_group = max(0, view.selected_group + (1 if key == curses.KEY_DOWN else -1))
+                    need_refresh = True
+                elif key in (curses.KEY_ENTER, 10, 13) and displayed is not None:
+                    view.toggle_selected_group(topology, sorted(displayed.freqs))
+                    need_refresh = True
+                elif key in (ord('p'), ord('P')):
+                    # Scanning happens on the sampler thread; it picks up the new mode on its next pass
+                    if process_scanner is not None:
+                        modes = PROCESS_PANEL_MODES
+                        process_scanner.mode = modes[(modes.index(process_scanner.mode) + 1) % len(modes)]
+                    else:
+                        show_tasks = not show_tasks
+                    need_refresh = True
+                elif key == curses.KEY_RESIZE:
+                    frame.invalidate()
+                    need_refresh = True
+            except curses.error:
+                continue
+    finally:
+        if collector is not None:
+            collector.stop()
 
-            # Get CPU stats and calculate usage
-            curr_cpu_stats = parse_cpu_stats()
-            cpu_usage = calculate_cpu_usage(prev_cpu_stats, curr_cpu_stats)
-            prev_cpu_stats = curr_cpu_stats
+REPLAY_SPEEDS = (1, 2, 5, 10, 20, 50, 100)
+REPLAY_HELP = "Press 'q' to exit | space: play/pause  +/-: speed  left/right: seek  j: jump  i: timings"
 
-            last_update = current_time
-            need_refresh = True
-        else:
-            need_refresh = False
+class ReplayClock:
+    """Maps monotonic wall time onto recording time for play/pause, speed and seeking"""
 
-        # Always redraw the screen
-        stdscr.erase()
-        max_y, max_x = stdscr.getmaxyx()
+    def __init__(self, position, speed=1):
+        self.position = position
+        self.speed = speed
+        self.playing = True
+        self._anchor = time.monotonic()
 
-        line = 0
-        safe_addstr(stdscr, line, 0, f"CPU Model: {model_name}", max_y, max_x)
-        line += 1
+    def now(self):
+        if not self.playing:
+            return self.position
+        return self.position + (time.monotonic() - self._anchor) * self.speed
 
-        safe_addstr(stdscr, line, 0, "-" * min(40, max_x-1), max_y, max_x)
-        line += 1
-        
-        # Use two-column layout for CPU cores if more than 8 cores
-        sorted_cpu_ids = sorted(freqs.keys())
-        if len(sorted_cpu_ids) > 8:
-            # Two-column CPU layout
-            left_col_width = max_x // 2 - 2
-            right_col_x = max_x // 2 + 1
-            
-            # Split cores evenly between columns
-            mid_point = (len(sorted_cpu_ids) + 1) // 2
-            left_cores = sorted_cpu_ids[:mid_point]
-            right_cores = sorted_cpu_ids[mid_point:]
-            
-            start_line = line
-            max_cores_per_column = max(len(left_cores), len(right_cores))
-            
-            # Display left column cores
-            for i, cpu_id in enumerate(left_cores):
-                if start_line + i >= max_y - 2:
-                    break
-                freq_text = f"Core {cpu_id:2}: {freqs[cpu_id]:7.2f} MHz"
-                if cpu_id in cpu_usage:
-                    freq_text += f" ({cpu_usage[cpu_id]:5.1f}%)"
-                # Truncate if too long for left column
-                if len(freq_text) > left_col_width:
-                    freq_text = freq_text[:left_col_width-3] + "..."
-                safe_addstr(stdscr, start_line + i, 2, freq_text, max_y, max_x)
-            
-            # Display right column cores
-            for i, cpu_id in enumerate(right_cores):
-                if start_line + i >= max_y - 2:
-                    break
-                freq_text = f"Core {cpu_id:2}: {freqs[cpu_id]:7.2f} MHz"
-                if cpu_id in cpu_usage:
-                    freq_text += f" ({cpu_usage[cpu_id]:5.1f}%)"
-                # Truncate if too long for right column
-                available_width = max_x - right_col_x - 1
-                if len(freq_text) > available_width:
-                    freq_text = freq_text[:available_width-3] + "..."
-                safe_addstr(stdscr, start_line + i, right_col_x, freq_text, max_y, max_x)
-            
-            line = start_line + max_cores_per_column
-        else:
-            # Single column layout for 8 or fewer cores
-            for cpu_id in sorted_cpu_ids:
-                if line >= max_y - 2:  # Leave room for exit message
-                    break
-                freq_text = f"Core {cpu_id:2}: {freqs[cpu_id]:7.2f} MHz"
-                if cpu_id in cpu_usage:
-                    freq_text += f" ({cpu_usage[cpu_id]:5.1f}%)"
-                safe_addstr(stdscr, line, 2, freq_text, max_y, max_x)
-                line += 1
-
-        # Add thermal zone temperatures for Raspberry Pi
-        thermal_temps = read_thermal_zones()
-        for name, temp in thermal_temps.items():
-            sensors['temps'][name] = temp
-        
-        # Organize fan data and filter temperatures
-        fan_cooling_data, essential_temps = organize_fan_data(sensors)
-        
-        # Prepare sections for two-column display
-        sections_for_columns = []
-        
-        # Essential temperatures
-        if essential_temps:
-            temp_items = [f"{name}: {value:5.1f}" for name, value in sorted(essential_temps.items(), key=lambda x: alphanum_sort_key(x[0]))]
-            sections_for_columns.append(("Temperatures (°C):", temp_items))
-        
-        # Fan Speeds  
-        if fan_cooling_data:
-            sections_for_columns.append(("Fan Speeds (RPM):", fan_cooling_data))
-        
-        # Additional CPU Info (place after fans, before voltages for better grouping)
-        additional_fields = [
-            "Thread(s) per core",
-            "Core(s) per socket", 
-            "Stepping",
-            "Frequency boost",
-            "CPU(s) scaling MHz",
-            "CPU max MHz",
-            "CPU base MHz",  # Position between max and min
-            "CPU min MHz"
-        ]
-        
-        cpu_info_items = []
-        base_freq = get_base_frequency()
-        
-        for field in additional_fields:
-            if field == "CPU base MHz":
-                # Insert base frequency here if available
-                if base_freq:
-                    cpu_info_items.append(f"{field}: {base_freq}")
-            elif field in lscpu_info:
-                cpu_info_items.append(f"{field}: {lscpu_info[field]}")
-        
-        if cpu_info_items:
-            sections_for_columns.append(("Additional CPU Info:", cpu_info_items))
-        
-        # Voltages
-        if sensors['voltages']:
-            voltage_items = [f"{name}: {value:5.3f}" for name, value in sorted(sensors['voltages'].items(), key=lambda x: alphanum_sort_key(x[0]))]
-            sections_for_columns.append(("Voltages (V):", voltage_items))
-        
-        # Power
-        if sensors['power']:
-            power_items = [f"{name}: {value:6.3f}" for name, value in sorted(sensors['power'].items(), key=lambda x: alphanum_sort_key(x[0]))]
-            sections_for_columns.append(("Power (W):", power_items))
-        
-        # Display all sensor sections in two columns
-        if sections_for_columns:
-            line += 1
-            line = display_two_column_sections(stdscr, sections_for_columns, line, max_y, max_x)
+    def _reanchor(self):
+        self.position = self.now()
+        self._anchor = time.monotonic()
+
+    def toggle(self):
+        self._reanchor()
+        self.playing = not self.playing
+
+    def change_speed(self, step):
+        self._reanchor()
+        index = REPLAY_SPEEDS.index(self.speed) + step
+        self.speed = REPLAY_SPEEDS[min(max(index, 0), len(REPLAY_SPEEDS) - 1)]
 
-        # Always show exit message at bottom - ensure it's visible
+    def seek(self, position):
+        self.position = position
+        self._anchor = time.monotonic()
+
+def parse_jump_target(text, current):
+    """Parse '+SECONDS', '-SECONDS', 'HH:MM[:SS]' (same day) or 'YYYY-MM-DD HH:MM[:SS]'"""
+    text = text.strip()
+    if not text:
+        return None
+    if text[0] in '+-':
         try:
-            stdscr.addstr(max_y - 1, 0, "Press 'q' to exit", curses.color_pair(1))
-        except curses.error:
-            # If bottom line fails, try one line up
+            return current + float(text)
+        except ValueError:
+            return None
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M'):
+        try:
+            return time.mktime(time.strptime(text, fmt))
+        except ValueError:
+            pass
+    day = time.strftime('%Y-%m-%d', time.localtime(current))
+    for fmt in ('%H:%M:%S', '%H:%M'):
+        try:
+            return time.mktime(time.strptime(f"{day} {text}", f'%Y-%m-%d {fmt}'))
+        except ValueError:
+            pass
+    return None
+
+def prompt(stdscr, text, timeout_ms=100):
+    """Read one line of input on the bottom row"""
+    max_y, max_x = stdscr.getmaxyx()
+    stdscr.timeout(-1)
+    curses.echo()
+    curses.curs_set(1)
+    try:
+        stdscr.move(max_y - 1, 0)
+        stdscr.clrtoeol()
+        stdscr.addstr(max_y - 1, 0, text[:max_x - 1], curses.color_pair(1))
+        return stdscr.getstr(max_y - 1, min(len(text), max_x - 1), 64).decode(errors='replace')
+    except curses.error:
+        return ''
+    finally:
+        curses.noecho()
+        curses.curs_set(0)
+        stdscr.timeout(timeout_ms)
+
+def replay(stdscr, reader, path):
+    """Drive the regular layout from an open RecordingReader instead of live sysfs"""
+    init_screen(stdscr, timeout_ms=50)
+    try:
+        if not len(reader):
+            return
+        first, last = reader.timestamp(0), reader.timestamp(len(reader) - 1)
+        clock = ReplayClock(first)
+        cpu_info_items = [f"Recording: {os.path.basename(path)}",
+                          f"Samples: {len(reader)} every {reader.interval:g}s",
+                          f"Channels: {len(reader.channels)}"]
+        view = ViewState(REPLAY_HELP)
+        frame = FrameBuffer(stdscr)
+        rendered = None
+        while True:
+            position = clock.now()
+            if position >= last and clock.playing:
+                clock.seek(last)
+                clock.toggle()
+                position = last
+            index = reader.index_at(position)
+            status = (f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(reader.timestamp(index)))}"
+                      f" {'playing' if clock.playing else 'paused'} {clock.speed}x")
+            if (index, status) != rendered:
+                view.status = status
+                with INSTRUMENTATION.stage('render'):
+                    render_snapshot(frame, reader.snapshot(index), reader.model_name, cpu_info_items, view)
+                rendered = (index, status)
+
             try:
-                stdscr.addstr(max_y - 2, 0, "Press 'q' to exit", curses.color_pair(1))
+                key = stdscr.getch()
             except curses.error:
-                pass
+                continue
+            if key in (ord('q'), ord('Q')):
+                break
+            elif key in (ord('i'), ord('I')):
+                view.show_instrumentation = not view.show_instrumentation
+                rendered = None
+            elif key == ord(' '):
+                if not clock.playing and position >= last:
+                    clock.seek(first)
+                clock.toggle()
+            elif key in (ord('+'), ord('=')):
+                clock.change_speed(1)
+            elif key in (ord('-'), ord('_')):
+                clock.change_speed(-1)
+            elif key in (curses.KEY_RIGHT, curses.KEY_LEFT):
+                step = 10 * clock.speed * reader.interval
+                target = position + (step if key == curses.KEY_RIGHT else -step)
+                clock.seek(min(max(target, first), last))
+            elif key in (ord('j'), ord('J')):
+                target = parse_jump_target(prompt(stdscr, "Jump to (+/-SECONDS, HH:MM:SS, YYYY-MM-DD HH:MM:SS): "),
+                                           position)
+                if target is not None:
+                    clock.seek(min(max(target, first), last))
+                frame.invalidate()
+                rendered = None
+            elif key == curses.KEY_RESIZE:
+                frame.invalidate()
+                rendered = None
+    finally:
+        reader.close()
 
-        stdscr.refresh()
+AGGREGATE_HELP = "Press 'q' to exit | up/down: select  enter: host details  i: timings"
+HOST_HELP = "Press 'q' to exit | esc/backspace: all hosts  b: breakdown  m: mean/peak  i: timings"
 
-        # Handle input - only check for quit
+def render_hosts(stdscr, hosts, selected, address, view):
+    """One summary row per agent; the selected row is highlighted"""
+    stdscr.erase()
+    max_y, max_x = stdscr.getmaxyx()
+    safe_addstr(stdscr, 0, 0, f"Aggregator: {address} ({len(hosts)} hosts)", max_y, max_x)
+    safe_addstr(stdscr, 1, 0, "-" * min(40, max_x - 1), max_y, max_x)
+    safe_addstr(stdscr, 2, 0, f"  {'Host':<24} {'Address':<15} {'Cores':>5} {'Avg%':>6} {'Max%':>6} {'MHz':>6}"
+                f" {'Temp':>7} {'Power':>8} {'Age':>6}", max_y, max_x)
+    now = time.monotonic()
+    for row, host in enumerate(hosts):
+        cores, avg, peak, mhz, temp, power = host.summary()
+        temp_text = f"{temp:.1f}°C" if temp is not None else '-'
+        power_text = f"{power:.1f}W" if power is not None else '-'
+        age_text = f"{now - host.received_at:.0f}s" if host.connected and host.received_at else 'gone'
+        text = (f"{'>' if row == selected else ' '} {host.name:<24.24} {host.address:<15.15} {cores:>5} {avg:6.1f} {peak:6.1f}"
+                f" {mhz:6.0f} {temp_text:>7} {power_text:>8} {age_text:>6}")
+        y = row + 3
+        if y >= max_y - 1:
+            break
         try:
-            key = stdscr.getch()
+            stdscr.addstr(y, 0, text[:max_x - 1], curses.A_REVERSE if row == selected else 0)
+        except curses.error:
+            pass
+    if view.show_instrumentation:
+        render_instrumentation(stdscr, max_y, max_x)
+    try:
+        stdscr.addstr(max_y - 1, 0, view.footer()[:max_x - 1],
+                      curses.color_pair(1))
+    except curses.error:
+        pass
+    stdscr.refresh()
+
+def aggregate(stdscr, address, refresh=1.0):
+    """Summary of all connected agents, with drill-down into the regular per-host view"""
+    init_screen(stdscr)
+    server = AggregatorServer(address).start()
+    frame = FrameBuffer(stdscr)
+    hosts_view = ViewState(AGGREGATE_HELP)
+    host_view = ViewState(HOST_HELP)
+    selected = 0
+    detail = None
+    try:
+        next_refresh = time.monotonic()
+        while True:
+            hosts = server.sorted_hosts()
+            selected = min(selected, max(len(hosts) - 1, 0))
+            if detail is not None:
+                detail = server.current(detail)
+            if time.monotonic() >= next_refresh:
+                with INSTRUMENTATION.stage('render'):
+                    if detail is not None:
+                        render_snapshot(frame, detail.snapshot(), f"{detail.name}: {detail.model}",
+                                        detail.cpu_info_items, host_view)
+                    else:
+                        render_hosts(frame, hosts, selected, address, hosts_view)
+                next_refresh = time.monotonic() + refresh
+            stdscr.timeout(max(1, int((next_refresh - time.monotonic()) * 1000)))
+
+            try:
+                key = stdscr.getch()
+            except curses.error:
+                continue
+            if key == -1:
+                continue
             if key in (ord('q'), ord('Q')):
                 break
-            # Explicitly ignore mouse wheel and other events
-            elif key in MOUSE_SCROLL_CODES:
+            elif key in (ord('i'), ord('I')):
+                hosts_view.show_instrumentation = not hosts_view.show_instrumentation
+                host_view.show_instrumentation = hosts_view.show_instrumentation
+            elif detail is None and key == curses.KEY_UP:
+                selected = max(selected - 1, 0)
+            elif detail is None and key == curses.KEY_DOWN:
+                selected = min(selected + 1, max(len(hosts) - 1, 0))
+            elif detail is None and key in (curses.KEY_ENTER, 10, 13) and hosts:
+                detail = hosts[selected]
+                frame.invalidate()
+            elif detail is not None and key in (27, curses.KEY_BACKSPACE, 127, 8):
+                detail = None
+                frame.invalidate()
+            elif detail is not None and key in (ord('b'), ord('B')):
+                host_view.show_breakdown = not host_view.show_breakdown
+            elif detail is not None and key in (ord('m'), ord('M')):
+                host_view.show_peaks = not host_view.show_peaks
+            elif key == curses.KEY_RESIZE:
+                frame.invalidate()
+            else:
                 continue
-        except curses.error:
-            continue
+            next_refresh = time.monotonic()
+    finally:
+        server.close()
+
+def interval_arg(value):
+    """argparse type for sampling/display intervals (10 ms minimum)"""
+    seconds = float(value)
+    if seconds < 0.01:
+        raise argparse.ArgumentTypeError("interval must be at least 0.01 seconds")
+    return seconds
+
+def history_depth_arg(value):
+    """argparse type for --history-depth (at least one sample)"""
+    depth = int(value)
+    if depth < 1:
+        raise argparse.ArgumentTypeError("history depth must be at least 1 sample")
+    return depth
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Real-time per-core CPU and sensor monitor")
+    parser.add_argument('--freq-backend', choices=['auto'] + list(FREQUENCY_BACKENDS), default='auto',
+                        help="per-core frequency source; others are used as fallback (default: auto, cheapest accurate)")
+    parser.add_argument('--history-depth', type=history_depth_arg, default=300, metavar='SAMPLES',
+                        help="samples of history kept per metric (default: 300); min/avg/max windows "
+                             "longer than this are not offered")
+    parser.add_argument('--record', metavar='FILE',
+                        help="record samples headless to FILE in the binary recording format")
+    parser.add_argument('--replay', metavar='FILE',
+                        help="view a recording made with --record instead of live data")
+    parser.add_argument('--stream', choices=STREAM_FORMATS, metavar='FORMAT',
+                        help="write one record per sample to stdout headless, as json (NDJSON) or csv")
+    parser.add_argument('--count', type=int, metavar='N',
+                        help="with --stream, stop after N records (default: run until interrupted)")
+    parser.add_argument('--publish', nargs='?', const=DEFAULT_SHARED_PATH, metavar='PATH',
+                        help=f"sample headless and publish snapshots to PATH for --attach viewers (default: {DEFAULT_SHARED_PATH})")
+    parser.add_argument('--attach', nargs='?', const=DEFAULT_SHARED_PATH, metavar='PATH',
+                        help=f"view the snapshots of a --publish daemon read-only instead of sampling (default: {DEFAULT_SHARED_PATH})")
+    parser.add_argument('--serve', type=int, metavar='PORT',
+                        help="serve OpenMetrics on PORT (/metrics) headless instead of the TUI")
+    parser.add_argument('--bind', default='', metavar='ADDRESS',
+                        help="address for --serve to listen on (default: all interfaces)")
+    parser.add_argument('--agent', metavar='ADDRESS',
+                        help="stream delta-encoded samples headless to an aggregator at HOST:PORT or unix:PATH")
+    parser.add_argument('--aggregate', metavar='ADDRESS',
+                        help="listen on HOST:PORT or unix:PATH for agents and show a per-host summary")
+    parser.add_argument('--name', metavar='NAME',
+                        help="host name reported by --agent (default: this machine's hostname)")
+    parser.add_argument('--root', metavar='DIR',
+                        help="read /proc, /sys and /dev under DIR instead of / (e.g. a synthetic tree)")
+    parser.add_argument('--cpu-budget', type=float, metavar='PERCENT',
+                        help="keep the monitor's own CPU use under PERCENT of one CPU by sampling its costliest "
+                             "collectors less often")
+    parser.add_argument('--interval', type=interval_arg, default=1.0, metavar='SECONDS',
+                        help="sampling interval, down to 0.01 (default: 1.0)")
+    parser.add_argument('--refresh', type=interval_arg, default=1.0, metavar='SECONDS',
+                        help="screen refresh interval; samples in between are aggregated (default: 1.0)")
+    return parser.parse_args(argv)
+
+# Soft RLIMIT_NOFILE raised to at most this at startup; the collectors' descriptor budgets scale with it
+FD_LIMIT_TARGET = 65536
+
+def raise_fd_limit():
+    """Raise the soft descriptor limit toward the hard limit (often 1024 against 512K)"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    target = FD_LIMIT_TARGET if hard == resource.RLIM_INFINITY else min(hard, FD_LIMIT_TARGET)
+    if soft != resource.RLIM_INFINITY and soft < target:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+        except (ValueError, OSError):
+            pass
 
 def main():
-    if not os.path.exists('/proc/cpuinfo'):
+    args = parse_args()
+    if args.root:
+        set_root(args.root)
+    raise_fd_limit()
+    if not os.path.exists(host_path('/proc/cpuinfo')):
         print("This script only works on Linux with /proc/cpuinfo")
         return
 
+    if args.record:
+        run_record(args.record, args.interval, args.freq_backend, args.cpu_budget)
+        return
+    if args.publish:
+        run_publish(args.publish, args.interval, args.freq_backend, args.cpu_budget)
+        return
+    if args.stream:
+        run_stream(args.stream, args.interval, args.count, args.freq_backend, args.cpu_budget)
+        return
+    if args.serve is not None:
+        run_serve(args.serve, args.bind, args.interval, args.freq_backend, args.cpu_budget)
+        return
+    if args.agent:
+        run_agent(args.agent, args.interval, args.freq_backend, args.name, args.cpu_budget)
+        return
+
     # Use curses.wrapper to safely initialize and clean up the curses environment
-    curses.wrapper(draw)
+    load_curses()
+    if args.replay:
+        try:
+            reader = RecordingReader(args.replay)
+        except (OSError, ValueError, struct.error) as e:
+            print(f"Cannot replay: {e}", file=sys.stderr)
+            return
+        curses.wrapper(replay, reader, args.replay)
+        return
+    if args.aggregate:
+        curses.wrapper(aggregate, args.aggregate, args.refresh)
+        return
+    if args.attach:
+        try:
+            shared = SharedSnapshotReader(args.attach)
+        except (OSError, ValueError) as e:
+            print(f"Cannot attach to {args.attach}: {e}", file=sys.stderr)
+            return
+        try:
+            curses.wrapper(draw, args.freq_backend, args.history_depth, args.interval, args.refresh, shared)
+        finally:
+            shared.close()
+        return
+    curses.wrapper(draw, args.freq_backend, args.history_depth, args.interval, args.refresh,
+                   cpu_budget=args.cpu_budget)
 
 if __name__ == "__main__":
     main()